@@ -6,6 +6,7 @@ from .api_client_factory import (
     APIClientFactory,
     Provider
 )
+from .hedging import HedgePolicy, HedgeBudget
 
 __version__ = "0.1.0"
 __author__ = "Moises-Tohias"
\ No newline at end of file
@@ -1,11 +1,14 @@
 """ API Client Factory System with Provider Configuration """
 
-import os, json
+import os, json, logging
 from dataclasses import dataclass, field
 from enum import Enum
 from typing import Dict, List, Optional, Type, Union, Any, Callable
 
 from .top import SyncAPIClient, AsyncAPIClient # import BaseSyncHTTPAPIClient, BaseAsyncHTTPAPIClient
+from .hedging import HedgePolicy
+
+logger = logging.getLogger(__name__)
 
 
 class Provider(Enum):
@@ -13,6 +16,7 @@ class Provider(Enum):
     CEREBRAS = "cerebras"
     GROQ = "groq"
     OPENROUTER = "openrouter"
+    MOCK = "mock"  # Local stub server, see LLMConnect.mock_server
 
 @dataclass
 class ProviderConfig:
@@ -26,6 +30,10 @@ class ProviderConfig:
     default_temperature: float = 0.7
     default_max_tokens: int = 100
     default_timeout: float = 30.0
+    hedge_targets: List[Dict[str, str]] = field(default_factory=list)  # [{"provider": ..., "model": ...}]
+    default_api_key: Optional[str] = None  # Used when the env var is unset (keyless local servers)
+    requests_per_minute: Optional[float] = None  # Pace of batch jobs (None: only back off on 429s)
+    enabled_env_var: Optional[str] = None  # Dev/test providers: only loaded when this env var is "1"
     
     def __post_init__(self):
         """Validate that default model is in available models."""
@@ -41,12 +49,18 @@ class ProviderConfig:
         if provided_key:
             return provided_key
         
-        api_key = os.getenv(self.api_key_env_var)
+        api_key = os.getenv(self.api_key_env_var) or self.default_api_key
         if not api_key:
             raise ValueError(f"API key not found. Please provide it or set {self.api_key_env_var} environment variable.")
         return api_key
 
 
+def provider_enabled(config_data: Dict[str, Any]) -> bool:
+    """Whether a raw providers_config.json entry is switched on in this environment."""
+    env_var = config_data.get("enabled_env_var")
+    return not env_var or os.getenv(env_var) == "1"
+
+
 def load_provider_configs() -> Dict[Provider, ProviderConfig]:
     """Load provider configurations from JSON file."""
     config_file_path = os.path.join(os.path.dirname(__file__), 'providers_config.json')
@@ -60,6 +74,8 @@ def load_provider_configs() -> Dict[Provider, ProviderConfig]:
     
     provider_configs = {}
     for provider_key, config_data in raw_configs.items():
+        if not provider_enabled(config_data):
+            continue
         try:
             provider_type = Provider(provider_key)
             provider_configs[provider_type] = ProviderConfig(**config_data)
@@ -123,9 +139,13 @@ class APIClientFactory:
         temperature: Optional[float] = None,
         max_completion_tokens: Optional[int] = None,
         timeout: Optional[float] = None,
+        hedge_policy: Optional[HedgePolicy] = None,
         **kwargs
     ) -> AsyncAPIClient:
-        """Create an asynchronous API client for the specified provider."""
+        """
+        Create an asynchronous API client for the specified provider.
+        Passing a `hedge_policy` turns on hedged streaming against the provider's `hedge_targets`.
+        """
         config = PROVIDER_CONFIGS[provider]
         
         # Use default model if not provided
@@ -133,6 +153,12 @@ class APIClientFactory:
         
         # Validate model
         APIClientFactory._validate_model_for_provider(provider, model)
+
+        if hedge_policy is not None:
+            kwargs["hedge_policy"] = hedge_policy
+            kwargs["hedge_targets"] = APIClientFactory._create_hedge_targets(
+                provider, model, timeout, middleware=kwargs.get("middleware")
+            )
         
         return AsyncAPIClient(
             api_key=config.get_api_key(api_key),
@@ -145,6 +171,29 @@ class APIClientFactory:
             **kwargs
         )
     
+    @staticmethod
+    def _create_hedge_targets(provider: Provider, model: str,
+                              timeout: Optional[float] = None,
+                              middleware: Optional[list] = None) -> List[AsyncAPIClient]:
+        """Build clients for the hedge targets configured on a provider (skipping unusable ones)."""
+        targets = []
+        for target in PROVIDER_CONFIGS[provider].hedge_targets:
+            try:
+                target_provider = Provider(target["provider"])
+                target_model = target.get("model")
+                if target_provider == provider and (target_model or PROVIDER_CONFIGS[provider].default_model) == model:
+                    continue  # Hedging against ourselves only doubles the load on the slow path
+                targets.append(APIClientFactory.create_async_client(
+                    provider=target_provider,
+                    model=target_model,
+                    timeout=timeout,
+                    middleware=middleware
+                ))
+            except (KeyError, ValueError) as e:
+                # Unknown provider/model or missing API key: that target just isn't available
+                logger.warning(f"Skipping hedge target {target}: {e}")
+        return targets
+
     @staticmethod
     def get_available_models(provider: Provider) -> List[str]:
         """Get list of available models for a provider."""
@@ -163,7 +212,8 @@ class APIClientFactory:
             "default_model": config.default_model,
             "default_temperature": config.default_temperature,
             "default_max_tokens": config.default_max_tokens,
-            "default_timeout": config.default_timeout
+            "default_timeout": config.default_timeout,
+            "hedge_targets": [dict(target) for target in config.hedge_targets]
         }
 
 
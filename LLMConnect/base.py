@@ -1,11 +1,60 @@
-import asyncio, time, ssl, socket, http.client, threading, random
+import asyncio, os, time, ssl, socket, http.client, threading, random
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 
 from typing import List, AsyncIterator, Tuple
 
 from .exceptions import * 
 from .middlewares import *  # this also imports models
-
+from .tracing import tracer, NOOP_SPAN
+
+
+# Blocking socket work (connect, send, every streaming read) runs on threads, and a stream holds
+# its thread for its whole lifetime. The loop's default executor (cpu_count + 4 workers) would cap
+# the number of concurrent streams, so use a dedicated and much wider pool.
+IO_MAX_WORKERS = 256
+_io_pool: Optional[ThreadPoolExecutor] = None
+_io_pool_lock = threading.Lock()
+
+def _io_executor() -> ThreadPoolExecutor:
+    """Shared thread pool for blocking HTTP I/O."""
+    global _io_pool
+    if _io_pool is None:
+        with _io_pool_lock:
+            if _io_pool is None:
+                _io_pool = ThreadPoolExecutor(max_workers=IO_MAX_WORKERS, thread_name_prefix="llmconnect-io")
+    return _io_pool
+
+# SyncHTTPClient runs the async executor on one long-lived loop in a daemon thread, shared by all
+# sync clients: no loop setup per call, and streams are handed over chunk by chunk as they arrive.
+_sync_loop_instance: Optional[asyncio.AbstractEventLoop] = None
+_sync_loop_thread: Optional[threading.Thread] = None
+_sync_loop_lock = threading.Lock()
+
+def _sync_loop() -> asyncio.AbstractEventLoop:
+    """Background event loop for sync clients (started on first use)."""
+    global _sync_loop_instance, _sync_loop_thread
+    if _sync_loop_instance is None:
+        with _sync_loop_lock:
+            if _sync_loop_instance is None:
+                loop = asyncio.new_event_loop()
+                _sync_loop_thread = threading.Thread(target=loop.run_forever, name="llmconnect-sync-loop", daemon=True)
+                _sync_loop_thread.start()
+                _sync_loop_instance = loop
+    if threading.current_thread() is _sync_loop_thread:
+        raise RuntimeError("Sync LLMConnect clients can't be called from an async client's callbacks, await the async client instead")
+    return _sync_loop_instance
+
+def _reset_after_fork():
+    # A forked child doesn't inherit the threads of the loop and of the I/O pool (whose idle workers
+    # would take its jobs and never run them), it starts its own on first use
+    global _sync_loop_instance, _sync_loop_thread, _sync_loop_lock, _io_pool, _io_pool_lock
+    _sync_loop_instance = _sync_loop_thread = _io_pool = None
+    _sync_loop_lock = threading.Lock()
+    _io_pool_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
 
 # Connection Management
 class ConnectionPool:
@@ -50,8 +99,14 @@ class ConnectionPool:
         if connection is None:
             connection = self._create_connection(parsed_url)
 
+        reusable = True
         try:
             yield connection
+        except BaseException:
+            # The request died half-way (error, cancellation, abandoned stream) so the
+            # connection state is unknown - never hand it out again
+            reusable = False
+            raise
         finally:
             # Return connection to pool
             with self._lock:
@@ -59,24 +114,27 @@ class ConnectionPool:
                     self._connections[pool_key] = []
 
                 # Only return to pool if not full and connection is still good
-                if len(self._connections[pool_key]) < self.max_connections_per_host:
+                if not reusable:
+                    connection.close()
+                elif len(self._connections[pool_key]) < self.max_connections_per_host:
                     try:
                         # Check if connection is still good
-                        if hasattr(connection, 'sock') and connection.sock:
-                            # Try to get connection state
-                            connection.sock.settimeout(0.1)
+                        if isinstance(connection.sock, ssl.SSLSocket):
+                            # TLS sockets can't be peeked (and may hold unread session tickets):
+                            # pool them, a connection the server closed meanwhile is retried on send
+                            connection.sock.settimeout(None)
+                            self._connections[pool_key].append(connection)
+                        elif hasattr(connection, 'sock') and connection.sock:
+                            # Non-blocking peek: an idle keep-alive socket has nothing to read
+                            connection.sock.setblocking(False)
                             try:
-                                data = connection.sock.recv(1, socket.MSG_PEEK)
-                                # If we get here without exception, connection might be dead
-                                if not data:
-                                    connection.close()
-                                else:
-                                    self._connections[pool_key].append(connection)
-                            except socket.error:
+                                connection.sock.recv(1, socket.MSG_PEEK)
+                                # EOF (closed by the server) or stray bytes, either way not reusable
+                                connection.close()
+                            except BlockingIOError:
                                 # Connection is still alive (would block)
-                                self._connections[pool_key].append(connection)
-                            finally:
                                 connection.sock.settimeout(None)
+                                self._connections[pool_key].append(connection)
                         else:
                             # Connection not established yet, can reuse
                             self._connections[pool_key].append(connection)
@@ -167,35 +225,43 @@ class RequestExecutor:
         for middleware in self.middleware:
             request = await middleware.process_request(request)
 
-        last_error = None
-        for attempt in range(self.retry_config.max_retries + 1):
-            try:
-                response = await self._execute_single_request(request)
+        with tracer.span("llm.request", url=request.url) as request_span:
+            last_error = None
+            for attempt in range(self.retry_config.max_retries + 1):
+                attempt_span = request.context['trace_span'] = tracer.start("llm.attempt", attempt=attempt + 1)
+                try:
+                    response = await self._execute_single_request(request)
+                    attempt_span.set_attribute("status_code", response.status_code)
+                    attempt_span.end()
 
-                # Process response through middleware
-                for middleware in reversed(self.middleware):
-                    response = await middleware.process_response(response)
+                    # Process response through middleware
+                    for middleware in reversed(self.middleware):
+                        response = await middleware.process_response(response)
 
-                return response
+                    return response
 
-            except Exception as error:
-                # Process error through middleware
-                for middleware in self.middleware:
-                    error = await middleware.process_error(error, request)
+                except Exception as error:
+                    attempt_span.record_error(error)
+                    attempt_span.end()
 
-                last_error = error
+                    # Process error through middleware
+                    for middleware in self.middleware:
+                        error = await middleware.process_error(error, request)
 
-                if not self.retry_config.should_retry(attempt, error):
-                    break
+                    last_error = error
 
-                if attempt < self.retry_config.max_retries:
-                    delay = self.retry_config.get_delay(attempt, error)
-                    logger.debug(f"Retrying request in {delay:.2f}s (attempt {attempt + 1})")
-                    await asyncio.sleep(delay)
+                    if not self.retry_config.should_retry(attempt, error):
+                        break
 
-        if last_error is not None:
-            raise last_error
-        raise RuntimeError("No attempts were made")
+                    if attempt < self.retry_config.max_retries:
+                        delay = self.retry_config.get_delay(attempt, error)
+                        logger.debug(f"Retrying request in {delay:.2f}s (attempt {attempt + 1})")
+                        request_span.add_event("retry", attempt=attempt + 1, delay=delay)
+                        await asyncio.sleep(delay)
+
+            if last_error is not None:
+                raise last_error
+            raise RuntimeError("No attempts were made")
 
     async def execute_streaming_request(self, request: HTTPRequest, chunk_size: int = 8192) -> AsyncIterator[bytes]:
         """Execute a streaming HTTP request with retry logic."""
@@ -206,27 +272,81 @@ class RequestExecutor:
         for middleware in self.middleware:
             request = await middleware.process_request(request)
 
+        # Only call the streaming hooks a middleware actually implements, they run per chunk
+        first_byte_hooks = [m for m in self.middleware if m.overrides('process_first_byte')]
+        chunk_hooks = [m for m in reversed(self.middleware) if m.overrides('process_chunk')]
+        end_hooks = [m for m in reversed(self.middleware) if m.overrides('process_stream_end')]
+
+        start_time = time.monotonic()
+        ended = False
+
+        # Spans are started without being activated: this generator's steps may run in different contexts
+        stream_span = tracer.start("llm.stream", url=request.url)
+        attempt_span = NOOP_SPAN
+
+        async def end_stream(error: Optional[BaseException] = None):
+            nonlocal ended
+            if not ended:
+                ended = True
+                if error is not None:
+                    attempt_span.record_error(error)
+                    stream_span.record_error(error)
+                attempt_span.end()
+                stream_span.end()
+                for middleware in end_hooks:
+                    await middleware.process_stream_end(request, time.monotonic() - start_time, error)
+
         last_error = None
-        for attempt in range(self.retry_config.max_retries + 1):
-            try:
-                async for chunk in self._execute_single_streaming_request(request, chunk_size):
-                    yield chunk
-                return  # Successfully completed streaming
+        try:
+            for attempt in range(self.retry_config.max_retries + 1):
+                attempt_span = request.context['trace_span'] = tracer.start(
+                    "llm.attempt", parent=stream_span, attempt=attempt + 1)
+                try:
+                    attempt_start = time.monotonic()
+                    first_chunk = True
+                    async for chunk in self._execute_single_streaming_request(request, chunk_size):
+                        if first_chunk:
+                            first_chunk = False
+                            sent_ns = request.context.get('timings', {}).get('sent')
+                            if sent_ns:
+                                tracer.record("llm.first_byte", sent_ns, time.time_ns(), parent=attempt_span)
+                            for middleware in first_byte_hooks:
+                                await middleware.process_first_byte(request, time.monotonic() - attempt_start)
+                        for middleware in chunk_hooks:
+                            chunk = await middleware.process_chunk(request, chunk)
+                        if chunk.startswith(b'data: [DONE]'):
+                            # Consumers stop reading at the SSE end marker, so that's the end of the stream
+                            await end_stream()
+                        yield chunk
+
+                    await end_stream()
+                    return  # Successfully completed streaming
+
+                except Exception as error:
+                    # Process error through middleware
+                    for middleware in self.middleware:
+                        error = await middleware.process_error(error, request)
+
+                    last_error = error
 
-            except Exception as error:
-                # Process error through middleware
-                for middleware in self.middleware:
-                    error = await middleware.process_error(error, request)
+                    if not self.retry_config.should_retry(attempt, error):
+                        break
 
-                last_error = error
+                    attempt_span.record_error(error)
+                    attempt_span.end()
 
-                if not self.retry_config.should_retry(attempt, error):
-                    break
+                    if attempt < self.retry_config.max_retries:
+                        delay = self.retry_config.get_delay(attempt, error)
+                        logger.debug(f"Retrying streaming request in {delay:.2f}s (attempt {attempt + 1})")
+                        stream_span.add_event("retry", attempt=attempt + 1, delay=delay)
+                        await asyncio.sleep(delay)
 
-                if attempt < self.retry_config.max_retries:
-                    delay = self.retry_config.get_delay(attempt, error)
-                    logger.debug(f"Retrying streaming request in {delay:.2f}s (attempt {attempt + 1})")
-                    await asyncio.sleep(delay)
+        except (asyncio.CancelledError, GeneratorExit) as abandoned:
+            # Consumer went away mid-stream, still close the books on it
+            await end_stream(abandoned)
+            raise
+
+        await end_stream(last_error)
 
         if last_error is not None:
             raise last_error
@@ -238,9 +358,12 @@ class RequestExecutor:
         loop = asyncio.get_event_loop()
 
         try:
-            status_code, headers, body = await loop.run_in_executor(
-                None, self._sync_request, request
-            )
+            try:
+                status_code, headers, body = await loop.run_in_executor(
+                    _io_executor(), self._sync_request, request
+                )
+            finally:
+                self._trace_phases(request)
 
             elapsed = time.time() - start_time
 
@@ -303,90 +426,87 @@ class RequestExecutor:
 
         try:
             with self.connection_pool.get_connection(parsed_url) as conn:
-                conn.timeout = request.timeout
-                conn.connect()
-
-                # Send request with headers and body
-                conn.putrequest(request.method, path)
-
-                # Send headers
-                for header_name, header_value in request.headers.items():
-                    conn.putheader(header_name, header_value)
-
-                # End headers and send body if present
-                if request.body:
-                    conn.putheader('Content-Length', str(len(request.body)))
-                    conn.endheaders()
-                    conn.send(request.body)
-                else:
-                    conn.endheaders()
-
-                # Get response
-                response = conn.getresponse()
-
-                # Check status code
-                if response.status >= 400:
-                    error_body = response.read().decode('utf-8', errors='ignore')
-                    headers = dict(response.headers)
-
-                    if response.status == 401:
-                        raise AuthenticationError(
-                            f"Authentication failed: {response.status}",
-                            status_code=response.status,
-                            headers=headers,
-                            body=error_body
-                        )
-                    elif response.status == 429:
-                        raise RateLimitError(
-                            f"Rate limit exceeded: {response.status}",
-                            status_code=response.status,
-                            headers=headers,
-                            body=error_body
-                        )
-                    else:
-                        raise APIError(
-                            f"HTTP error: {response.status}",
-                            status_code=response.status,
-                            headers=headers,
-                            body=error_body
-                        )
-
-                # Check if this is an SSE stream
-                content_type = response.headers.get('content-type', '')
-                is_sse = 'text/event-stream' in content_type
-                
-                # For SSE, we need to read line by line to properly handle events
-                if is_sse:
-                    buffer = b''
-                    while True:
-                        # Read a smaller chunk for SSE to avoid buffering issues
-                        chunk = await loop.run_in_executor(None, response.read, 1024)
-                        if not chunk:
-                            # Yield any remaining buffer
-                            if buffer:
+                try:
+                    # Connect/send/wait-for-headers are blocking calls, keep them off the event loop
+                    # so a slow upstream can't stall every other stream (or a hedge timer)
+                    try:
+                        response = await loop.run_in_executor(_io_executor(), self._send_request, conn, request, path)
+                    finally:
+                        self._trace_phases(request)
+
+                    # Check status code
+                    if response.status >= 400:
+                        error_body = (await loop.run_in_executor(_io_executor(), response.read)).decode('utf-8', errors='ignore')
+                        headers = dict(response.headers)
+
+                        if response.status == 401:
+                            raise AuthenticationError(
+                                f"Authentication failed: {response.status}",
+                                status_code=response.status,
+                                headers=headers,
+                                body=error_body
+                            )
+                        elif response.status == 429:
+                            raise RateLimitError(
+                                f"Rate limit exceeded: {response.status}",
+                                status_code=response.status,
+                                headers=headers,
+                                body=error_body
+                            )
+                        else:
+                            raise APIError(
+                                f"HTTP error: {response.status}",
+                                status_code=response.status,
+                                headers=headers,
+                                body=error_body
+                            )
+
+                    # Check if this is an SSE stream
+                    content_type = response.headers.get('content-type', '')
+                    is_sse = 'text/event-stream' in content_type
+
+                    # For SSE, we need to read line by line to properly handle events
+                    if is_sse:
+                        buffer = b''
+                        while True:
+                            # Read a smaller chunk for SSE to avoid buffering issues
+                            chunk = await loop.run_in_executor(_io_executor(), response.read1, 1024)
+                            if not chunk:
+                                # Yield any remaining buffer
+                                if buffer:
+                                    yield buffer
+                                break
+
+                            # Add to buffer
+                            buffer += chunk
+
+                            # Process complete lines
+                            while b'\n' in buffer:
+                                line, buffer = buffer.split(b'\n', 1)
+                                # Yield complete line with newline
+                                yield line + b'\n'
+
+                            # Check if we have a complete SSE end marker in buffer
+                            if b'data: [DONE]' in buffer:
                                 yield buffer
-                            break
-                        
-                        # Add to buffer
-                        buffer += chunk
-                        
-                        # Process complete lines
-                        while b'\n' in buffer:
-                            line, buffer = buffer.split(b'\n', 1)
-                            # Yield complete line with newline
-                            yield line + b'\n'
-                        
-                        # Check if we have a complete SSE end marker in buffer
-                        if b'data: [DONE]' in buffer:
-                            yield buffer
-                            break
-                else:
-                    # For non-SSE streams, use the original chunking approach
-                    while True:
-                        chunk = await loop.run_in_executor(None, response.read, chunk_size)
-                        if not chunk:
-                            break
-                        yield chunk
+                                break
+                    else:
+                        # For non-SSE streams, use the original chunking approach
+                        while True:
+                            chunk = await loop.run_in_executor(_io_executor(), response.read, chunk_size)
+                            if not chunk:
+                                break
+                            yield chunk
+
+                    if not response.isclosed():
+                        # Stopped at [DONE] before the body terminator, the socket isn't clean for reuse
+                        conn.close()
+
+                except (asyncio.CancelledError, GeneratorExit):
+                    # The consumer walked away mid-stream (cancelled task, lost hedge race, closed
+                    # generator). Kill the socket so the reader thread unblocks right away.
+                    self._abort_connection(conn)
+                    raise
 
         except socket.timeout:
             raise TimeoutError(f"Streaming request timed out after {request.timeout} seconds")
@@ -397,6 +517,86 @@ class RequestExecutor:
                 raise APIError(f"Streaming request failed: {str(e)}")
             raise
 
+    @staticmethod
+    def _send_request(conn: http.client.HTTPConnection, request: HTTPRequest, path: str) -> http.client.HTTPResponse:
+        """Connect (unless the pooled connection is still open), send the request and wait for the response headers (blocking)."""
+        # Wall-clock phase timestamps, turned into spans by _trace_phases back on the event loop
+        timings = request.context['timings'] = {'start': time.time_ns()}
+
+        # Set timeout
+        conn.timeout = request.timeout
+
+        reused = conn.sock is not None
+        if reused:
+            conn.sock.settimeout(request.timeout)
+        else:
+            conn.connect()
+        timings['connected'] = time.time_ns()
+
+        try:
+            response = RequestExecutor._send_and_wait(conn, request, path, timings)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError, ssl.SSLEOFError):
+            if not reused:
+                raise
+            # The server closed the idle keep-alive connection under us, nothing was processed: retry on a new one
+            conn.close()
+            conn.connect()
+            timings['connected'] = time.time_ns()
+            response = RequestExecutor._send_and_wait(conn, request, path, timings)
+
+        # Lets a middleware see the raw body reads (cassette recording)
+        tap = request.context.get('response_tap')
+        return tap(response) if tap is not None else response
+
+    @staticmethod
+    def _send_and_wait(conn: http.client.HTTPConnection, request: HTTPRequest, path: str,
+                       timings: Dict[str, int]) -> http.client.HTTPResponse:
+        # Send request with headers and body
+        conn.putrequest(request.method, path)
+
+        # Send headers
+        for header_name, header_value in request.headers.items():
+            conn.putheader(header_name, header_value)
+
+        # End headers and send body if present (one write, so Nagle doesn't hold the body back)
+        if request.body:
+            conn.putheader('Content-Length', str(len(request.body)))
+        conn.endheaders(request.body)
+        timings['sent'] = time.time_ns()
+
+        # Get response
+        response = conn.getresponse()
+        timings['headers'] = time.time_ns()
+        return response
+
+    @staticmethod
+    def _trace_phases(request: HTTPRequest):
+        """Record the connect / send / wait-for-headers phases of the current attempt as spans."""
+        parent = request.context.get('trace_span')
+        timings = request.context.get('timings')
+        if parent is None or parent is NOOP_SPAN or not timings:
+            return
+        for name, begin, end in (("llm.connect", 'start', 'connected'),
+                                 ("llm.send", 'connected', 'sent'),
+                                 ("llm.wait_headers", 'sent', 'headers')):
+            if begin in timings and end in timings:
+                tracer.record(name, timings[begin], timings[end], parent=parent)
+
+    @staticmethod
+    def _abort_connection(conn: http.client.HTTPConnection):
+        """Tear down a connection that may still be in use by a reader thread."""
+        sock = conn.sock
+        if sock is not None:
+            try:
+                # shutdown() wakes up a thread blocked in recv(), close() alone doesn't
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+
     def _sync_request(self, request: HTTPRequest) -> Tuple[int, Dict[str, str], bytes]:
         """Execute synchronous HTTP request using connection pool."""
         parsed_url = request.parsed_url
@@ -406,29 +606,7 @@ class RequestExecutor:
 
         try:
             with self.connection_pool.get_connection(parsed_url) as conn:
-                # Set timeout
-                conn.timeout = request.timeout
-
-                # Connect explicitly to ensure connection is established
-                conn.connect()
-
-                # Send request with headers and body
-                conn.putrequest(request.method, path)
-
-                # Send headers
-                for header_name, header_value in request.headers.items():
-                    conn.putheader(header_name, header_value)
-
-                # End headers and send body if present
-                if request.body:
-                    conn.putheader('Content-Length', str(len(request.body)))
-                    conn.endheaders()
-                    conn.send(request.body)
-                else:
-                    conn.endheaders()
-
-                # Get response
-                response = conn.getresponse()
+                response = self._send_request(conn, request, path)
 
                 # Read response data
                 body = response.read()
@@ -458,7 +636,6 @@ class SyncHTTPClient:
                  retry_config: Optional[RetryConfig] = None,
                  middleware: Optional[List[BaseMiddleware]] = None):
         self._executor = RequestExecutor(connection_pool, retry_config, middleware)
-        pass
 
     def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
                 body: Optional[bytes] = None, timeout: float = 30.0) -> HTTPResponse:
@@ -492,64 +669,27 @@ class SyncHTTPClient:
         return self._run_async_generator(async_generator())
 
     def _run_async(self, coro):
-        """Run an async coroutine in sync context."""
+        """Run an async coroutine on the background loop and wait for its result."""
+        future = asyncio.run_coroutine_threadsafe(coro, _sync_loop())
         try:
-            asyncio.get_running_loop()
-            # If we're already in an event loop, we need to use a different approach
-            import concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(asyncio.run, coro)
-                return future.result()
-        except RuntimeError:
-            # No event loop running, we can use asyncio.run
-            return asyncio.run(coro)
+            return future.result()
+        except BaseException:
+            # KeyboardInterrupt and friends: don't leave the request running behind our back
+            future.cancel()
+            raise
 
     def _run_async_generator(self, async_gen):
-        """Convert async generator to sync iterator."""
+        """Convert an async generator to a sync iterator, one item at a time as they arrive."""
         try:
-            asyncio.get_running_loop()
-            # We're in an event loop - collect all items in a thread
-            import queue
-            import threading
-
-            result_queue = queue.Queue()
-
-            def collect_in_thread():
-                try:
-                    async def collect():
-                        async for item in async_gen:
-                            result_queue.put(('item', item))
-                        result_queue.put(('done', None))
-                    asyncio.run(collect())
-                except Exception as e:
-                    result_queue.put(('error', e))
-
-            thread = threading.Thread(target=collect_in_thread)
-            thread.start()
-
             while True:
-                msg_type, value = result_queue.get()
-                if msg_type == 'item':
-                    yield value
-                elif msg_type == 'done':
-                    break
-                elif msg_type == 'error':
-                    raise value
-
-            thread.join()
-
-        except RuntimeError:
-            # No event loop - can run directly
-            items = []
-
-            async def collect():
-                async for item in async_gen:
-                    items.append(item)
-
-            asyncio.run(collect())
-
-            for item in items:
+                try:
+                    item = self._run_async(async_gen.__anext__())
+                except StopAsyncIteration:
+                    return
                 yield item
+        finally:
+            # Consumer stopped early (break, [DONE], error): close the stream where it runs
+            self._run_async(async_gen.aclose())
 
     def close(self):
         """Close the client and all connections."""
@@ -0,0 +1,273 @@
+"""
+Batch completions for offline jobs (re-titling, summarizing archives, eval runs).
+
+`batch_complete(client, items)` (also `AsyncAPIClient.batch`) runs the non-streaming, stateless
+`complete` call over an iterable of message lists, consumed lazily, with at most `concurrency`
+requests in flight, and yields a `BatchResult` per item in completion order. Failed items are
+retried up to `max_retries` times with exponential backoff; an item that still fails is reported
+with its error instead of stopping the batch.
+
+Rate awareness is shared by the whole batch: an optional `requests_per_minute` pace, and on a
+429 every worker waits out the Retry-After while the concurrency window halves, then grows back
+by one per success. The client's own retries should be off (`RetryConfig(max_retries=0)`, as the
+CLI does) so that 429s reach the batch instead of being slept through per request.
+
+CLI, JSONL in and out (one {"id", "messages", optional "model"/"temperature"/"max_completion_tokens"}
+object or bare message list per input line):
+
+    python -m LLMConnect.batch --provider groq --input titles.jsonl --output out.jsonl --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Union
+
+from .exceptions import APIError, AuthenticationError, RateLimitError
+
+Item = Union[List[Dict[str, str]], Dict[str, Any]]
+
+# Per-item parameters accepted in dict items, forwarded to `complete`
+ITEM_PARAMETERS = ("model", "temperature", "max_completion_tokens", "timeout")
+
+
+@dataclass
+class BatchResult:
+    index: int                     # Position of the item in the input
+    id: Any                        # The item's "id" (its index when it has none)
+    content: Optional[str] = None
+    error: Optional[str] = None
+    status_code: Optional[int] = None
+    attempts: int = 0
+    elapsed: float = 0.0           # Seconds, all attempts and waits included
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class RateWindow:
+    """Concurrency window and pacing shared by the workers of a batch."""
+
+    def __init__(self, concurrency: int, requests_per_minute: Optional[float] = None):
+        self.max_concurrency = concurrency
+        self.limit = concurrency
+        self.in_flight = 0
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_start = 0.0
+        self._paused_until = 0.0
+        self._changed = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._changed:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.in_flight >= self.limit:
+                    wait = None
+                elif now < self._next_start:
+                    wait = self._next_start - now
+                else:
+                    break
+                try:
+                    await asyncio.wait_for(self._changed.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            self.in_flight += 1
+            self._next_start = max(now, self._next_start) + self.interval
+
+    async def release(self, rate_limited: Optional[RateLimitError] = None):
+        async with self._changed:
+            self.in_flight -= 1
+            if rate_limited is not None:
+                self.limit = max(1, self.limit // 2)
+                pause = rate_limited.retry_after or 1.0
+                self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            elif self.limit < self.max_concurrency:
+                self.limit += 1
+            self._changed.notify_all()
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, AuthenticationError):
+        return False
+    if isinstance(error, APIError) and error.status_code:
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return isinstance(error, (APIError, asyncio.TimeoutError, OSError))
+
+
+def _unpack(item: Item) -> tuple:
+    if isinstance(item, dict):
+        return item["messages"], {k: item[k] for k in ITEM_PARAMETERS if item.get(k) is not None}, item.get("id")
+    return item, {}, None
+
+
+async def batch_complete(client, items: Iterable[Item], concurrency: int = 8, max_retries: int = 2,
+                         base_delay: float = 1.0, requests_per_minute: Optional[float] = None,
+                         **params) -> AsyncIterator[BatchResult]:
+    """Run `client.complete` over `items`, yielding results in completion order (see module docstring)."""
+    window = RateWindow(concurrency, requests_per_minute)
+    results: asyncio.Queue = asyncio.Queue()
+    source = enumerate(items)
+
+    async def run_item(index: int, item: Item) -> BatchResult:
+        start = time.monotonic()
+        try:
+            messages, item_params, item_id = _unpack(item)
+        except (KeyError, TypeError) as e:
+            item_id = item.get("id") if isinstance(item, dict) else None
+            return BatchResult(index, index if item_id is None else item_id, error=f"Invalid item: {e!r}")
+        result = BatchResult(index, index if item_id is None else item_id)
+        while True:
+            result.attempts += 1
+            await window.acquire()
+            try:
+                result.content = await client.complete(messages, **{**params, **item_params})
+                result.error = result.status_code = None
+            except Exception as e:
+                result.error = f"{type(e).__name__}: {e}"
+                result.status_code = getattr(e, "status_code", None)
+                await window.release(e if isinstance(e, RateLimitError) else None)
+                if result.attempts > max_retries or not _is_retryable(e):
+                    break
+                if not isinstance(e, RateLimitError):  # 429s already wait on the shared pause
+                    await asyncio.sleep(base_delay * 2 ** (result.attempts - 1) * (0.5 + random.random() * 0.5))
+                continue
+            await window.release()
+            break
+        result.elapsed = round(time.monotonic() - start, 3)
+        return result
+
+    async def worker():
+        # Items are pulled lazily, one at a time per worker: a 10k-line input is never held in memory
+        for index, item in source:
+            await results.put(await run_item(index, item))
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    done = asyncio.gather(*workers)
+    done.add_done_callback(lambda _: results.put_nowait(None))
+    try:
+        while (result := await results.get()) is not None:
+            yield result
+        await done  # Surfaces an exception raised by the input iterable
+    finally:
+        for task in workers:
+            task.cancel()
+
+
+# --- CLI ---
+
+def _read_jsonl(path: str, skip_ids: set) -> Iterable[Item]:
+    stream = sys.stdin if path == "-" else open(path)
+    with stream:
+        for index, line in enumerate(stream):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, list):
+                item = {"messages": item}
+            item.setdefault("id", index)  # Line number: stable across --resume runs
+            if item["id"] not in skip_ids:
+                yield item
+
+
+def _keep_successes(path: str) -> set:
+    """
+    For --resume: rewrite an existing output file with only its successful results, so the ids
+    retried now appear once, and return those ids. The file is replaced atomically; a line cut
+    short by an interrupted run is dropped with the failures.
+    """
+    if not os.path.exists(path):
+        return set()
+    kept, done = [], set()
+    with open(path) as f:
+        for line in filter(str.strip, f):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("error") is None:
+                kept.append(line if line.endswith("\n") else line + "\n")
+                done.add(record["id"])
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.writelines(kept)
+    os.replace(tmp, path)
+    return done
+
+
+async def _run_cli(args) -> int:
+    from .api_client_factory import APIClientFactory, PROVIDER_CONFIGS, Provider
+    from .base import RetryConfig
+
+    provider = Provider(args.provider)
+    rpm = args.rpm if args.rpm is not None else PROVIDER_CONFIGS[provider].requests_per_minute
+    skip_ids = _keep_successes(args.output) if args.resume and args.output != "-" else set()
+    params = {k: v for k, v in (("temperature", args.temperature),
+                                ("max_completion_tokens", args.max_tokens)) if v is not None}
+
+    out = sys.stdout if args.output == "-" else open(args.output, "a" if args.resume else "w")
+    ok = failed = 0
+    failures = []
+    start = time.monotonic()
+    client = APIClientFactory.create_async_client(provider, model=args.model, timeout=args.timeout,
+                                                  retry_config=RetryConfig(max_retries=0))
+    try:
+        async for result in client.batch(_read_jsonl(args.input, skip_ids), concurrency=args.concurrency,
+                                         max_retries=args.retries, requests_per_minute=rpm, **params):
+            record = asdict(result)
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if result.ok:
+                ok += 1
+            else:
+                failed += 1
+                failures.append(result.id)
+            if args.progress and (ok + failed) % args.progress == 0:
+                print(f"{ok + failed} done ({failed} failed)", file=sys.stderr)
+    finally:
+        await client.close()
+        if out is not sys.stdout:
+            out.close()
+
+    elapsed = time.monotonic() - start
+    print(f"{ok} ok, {failed} failed, {len(skip_ids)} skipped in {elapsed:.1f}s "
+          f"({(ok + failed) / elapsed if elapsed else 0:.1f} items/s)", file=sys.stderr)
+    if failures:
+        shown = ", ".join(map(str, failures[:20])) + (" ..." if len(failures) > 20 else "")
+        print(f"Failed ids: {shown}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", required=True)
+    parser.add_argument("--model", help="default: the provider's default model")
+    parser.add_argument("--input", default="-", help="JSONL input file (default: stdin)")
+    parser.add_argument("--output", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum requests in flight")
+    parser.add_argument("--retries", type=int, default=2, help="retries per item")
+    parser.add_argument("--rpm", type=float, help="requests per minute (default: the provider's requests_per_minute)")
+    parser.add_argument("--temperature", type=float)
+    parser.add_argument("--max-tokens", type=int)
+    parser.add_argument("--timeout", type=float)
+    parser.add_argument("--resume", action="store_true",
+                        help="skip the ids --output already has a successful result for: its failed results "
+                             "are dropped and the retries appended")
+    parser.add_argument("--progress", type=int, default=0, help="report progress every N items")
+    parser.add_argument("--verbose", action="store_true", help="log every failed request, not just the summary")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.getLogger("LLMConnect").setLevel(logging.CRITICAL)  # Failures are in the output and summary
+    sys.exit(asyncio.run(_run_cli(args)))
+
+
+if __name__ == "__main__":
+    main()
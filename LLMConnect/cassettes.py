@@ -0,0 +1,290 @@
+"""
+Record/replay cassettes of upstream HTTP exchanges (SSE streams included), for deterministic,
+offline performance tests against real provider byte patterns.
+
+Recording: add `CassetteRecorder(path)` to a client's middleware. Every attempt it sees is
+appended to the cassette as one JSON line:
+
+    {"fp": "<sha1>", "method": "POST", "url": "...", "status": 200, "headers": {...},
+     "ttfb": 0.2311, "chunks": [[0.2313, "data: {...}\\n\\n"], [0.2410, {"b64": "..."}], ...]}
+
+`chunks` holds the exact reads of the response body (so bursty multi-event chunks, comment
+keep-alives and events split across reads stay as they were), each with its offset in seconds
+from when the request was sent. Reads that are not valid UTF-8 on their own are stored base64.
+Request headers are never stored (API keys), only the fingerprint: a hash of the method, URL
+and canonical JSON body. A path ending in `.gz` writes a gzip cassette.
+
+Replay: `ReplayExecutor` (or the `ReplayHTTPClient` / `SyncReplayHTTPClient` wrappers, to pass as
+an API client's `http_client`) serves requests from a cassette instead of the network, at the
+recorded pace (`speed=1.0`), scaled (`speed=4.0` is four times faster) or as fast as possible
+(`speed=None`). Requests are matched by fingerprint, or by URL alone with `match="url"`, and
+several recorded interactions for the same key are served in turn.
+
+    client = APIClientFactory.create_async_client(Provider.GROQ, middleware=[CassetteRecorder("groq.jsonl.gz")])
+    client = APIClientFactory.create_async_client(Provider.GROQ, http_client=ReplayHTTPClient("groq.jsonl.gz", speed=None))
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional
+
+from .base import AsyncHTTPClient, RequestExecutor, SyncHTTPClient
+from .exceptions import APIError
+from .middlewares import BaseMiddleware
+from .models import HTTPRequest, HTTPResponse
+
+# Response headers that are per-connection or identify the account, not worth replaying
+SKIPPED_HEADERS = {"set-cookie", "date", "connection", "keep-alive", "transfer-encoding", "content-length"}
+
+
+def fingerprint(method: str, url: str, body: Optional[bytes]) -> str:
+    """Identity of a request for matching: method, URL and body (JSON bodies canonicalized)."""
+    if body:
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode()
+        except ValueError:
+            pass
+    digest = hashlib.sha1(f"{method.upper()} {url}\n".encode())
+    digest.update(body or b"")
+    return digest.hexdigest()
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _encode_chunk(data: bytes):
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(data).decode("ascii")}
+
+
+def _decode_chunk(data) -> bytes:
+    if isinstance(data, dict):
+        return base64.b64decode(data["b64"])
+    return data.encode("utf-8")
+
+
+# --- Recording ---
+
+class RecordingResponse:
+    """Wraps an http.client response and keeps every body read with its timing."""
+
+    def __init__(self, response, request: HTTPRequest):
+        self._response = response
+        self._sent = request.context["timings"]["sent"]
+        self.status = response.status
+        self.headers = response.headers
+        self.record = {
+            "fp": request.context.get("cassette_fp") or fingerprint(request.method, request.url, request.body),
+            "method": request.method,
+            "url": request.url,
+            "status": response.status,
+            "headers": {k.lower(): v for k, v in response.headers.items() if k.lower() not in SKIPPED_HEADERS},
+            "ttfb": self._offset(),
+            "chunks": [],
+        }
+
+    def _offset(self) -> float:
+        return round((time.time_ns() - self._sent) / 1e9, 4)
+
+    def _keep(self, data: bytes) -> bytes:
+        if data:
+            self.record["chunks"].append([self._offset(), _encode_chunk(data)])
+        return data
+
+    def read1(self, n: int = -1) -> bytes:
+        return self._keep(self._response.read1(n))
+
+    def read(self, n: Optional[int] = None) -> bytes:
+        return self._keep(self._response.read(n))
+
+    def isclosed(self) -> bool:
+        return self._response.isclosed()
+
+    def close(self):
+        self._response.close()
+
+
+class CassetteRecorder(BaseMiddleware):
+    """Appends every upstream exchange of the client to a cassette file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    async def process_request(self, request: HTTPRequest) -> HTTPRequest:
+        request.context["cassette_fp"] = fingerprint(request.method, request.url, request.body)
+        pending: List[RecordingResponse] = request.context.setdefault("cassette_pending", [])
+
+        def tap(response):
+            recording = RecordingResponse(response, request)
+            pending.append(recording)
+            return recording
+
+        request.context["response_tap"] = tap
+        return request
+
+    def _flush(self, request: HTTPRequest):
+        pending = request.context.get("cassette_pending")
+        if not pending:
+            return
+        lines = "".join(json.dumps(r.record, separators=(",", ":")) + "\n" for r in pending)
+        pending.clear()
+        with self._lock, _open(self.path, "a") as f:
+            f.write(lines)
+
+    async def process_response(self, response: HTTPResponse) -> HTTPResponse:
+        self._flush(response.request)
+        return response
+
+    async def process_error(self, error: Exception, request: HTTPRequest) -> Exception:
+        # Failed attempts are kept too, so a replay goes through the same retries
+        self._flush(request)
+        return error
+
+    async def process_stream_end(self, request: HTTPRequest, elapsed: float,
+                                 error: Optional[BaseException] = None) -> None:
+        self._flush(request)
+
+
+# --- Replay ---
+
+class Cassette:
+    """The interactions of a cassette file, looked up by fingerprint or URL."""
+
+    def __init__(self, interactions: List[dict]):
+        self.interactions = interactions
+        self._by_key: Dict[str, Dict[str, List[dict]]] = {"body": defaultdict(list), "url": defaultdict(list)}
+        for interaction in interactions:
+            self._by_key["body"][interaction["fp"]].append(interaction)
+            self._by_key["url"][f"{interaction['method']} {interaction['url']}"].append(interaction)
+        self._served: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        with _open(path, "r") as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    def match(self, request: HTTPRequest, on: str = "body") -> Optional[dict]:
+        """Next recorded interaction for the request, cycling when they have all been served."""
+        if on == "body":
+            key = fingerprint(request.method, request.url, request.body)
+        else:
+            key = f"{request.method} {request.url}"
+        candidates = self._by_key[on].get(key)
+        if not candidates:
+            return None
+        with self._lock:
+            index = self._served[key]
+            self._served[key] = index + 1
+        return candidates[index % len(candidates)]
+
+
+class ReplayResponse:
+    """Serves a recorded body with the recorded read boundaries, paced by the recorded offsets."""
+
+    def __init__(self, interaction: dict, sent: float, speed: Optional[float]):
+        self.status = interaction["status"]
+        self.headers = dict(interaction["headers"])
+        self._chunks = [(offset, _decode_chunk(data)) for offset, data in interaction["chunks"]]
+        self._sent = sent
+        self._speed = speed
+        self._next = 0
+        self._leftover = b""
+
+    def _wait(self, offset: float):
+        if self._speed:
+            delay = self._sent + offset / self._speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def _pop(self) -> bytes:
+        offset, data = self._chunks[self._next]
+        self._next += 1
+        self._wait(offset)
+        return data
+
+    def read1(self, n: int = -1) -> bytes:
+        if not self._leftover:
+            if self._next == len(self._chunks):
+                return b""
+            self._leftover = self._pop()
+        if n is None or n < 0:
+            n = len(self._leftover)
+        data, self._leftover = self._leftover[:n], self._leftover[n:]
+        return data
+
+    def read(self, n: Optional[int] = None) -> bytes:
+        if n is None or n < 0:
+            data = self._leftover + b"".join(self._pop() for _ in range(self._next, len(self._chunks)))
+            self._leftover = b""
+            return data
+        parts, size = [], 0
+        while size < n and (data := self.read1(n - size)):
+            parts.append(data)
+            size += len(data)
+        return b"".join(parts)
+
+    def isclosed(self) -> bool:
+        return not self._leftover and self._next == len(self._chunks)
+
+    def close(self):
+        self._next = len(self._chunks)
+        self._leftover = b""
+
+
+class ReplayExecutor(RequestExecutor):
+    """RequestExecutor that answers from a cassette instead of the network."""
+
+    def __init__(self, cassette, speed: Optional[float] = 1.0, match: str = "body", *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cassette = cassette if isinstance(cassette, Cassette) else Cassette.load(cassette)
+        self.speed = speed
+        self.match = match
+
+    def _send_request(self, conn, request: HTTPRequest, path: str):
+        now = time.time_ns()
+        request.context["timings"] = {"start": now, "connected": now, "sent": now}
+        sent = time.monotonic()
+        interaction = self.cassette.match(request, self.match)
+        if interaction is None:
+            raise APIError(f"No recorded interaction for {request.method} {request.url}")
+        response = ReplayResponse(interaction, sent, self.speed)
+        response._wait(interaction["ttfb"])
+        request.context["timings"]["headers"] = time.time_ns()
+        return response
+
+
+class ReplayHTTPClient(AsyncHTTPClient):
+    """AsyncHTTPClient backed by a cassette, to pass as an AsyncAPIClient's `http_client`."""
+
+    def __init__(self, cassette, speed: Optional[float] = 1.0, match: str = "body", connection_pool=None,
+                 retry_config=None, middleware=None):
+        super().__init__(connection_pool, retry_config, middleware)
+        self._executor = ReplayExecutor(cassette, speed, match, connection_pool, retry_config, middleware)
+
+
+class SyncReplayHTTPClient(SyncHTTPClient):
+    """SyncHTTPClient backed by a cassette, to pass as a SyncAPIClient's `http_client`."""
+
+    def __init__(self, cassette, speed: Optional[float] = 1.0, match: str = "body", connection_pool=None,
+                 retry_config=None, middleware=None):
+        super().__init__(connection_pool, retry_config, middleware)
+        self._executor = ReplayExecutor(cassette, speed, match, connection_pool, retry_config, middleware)
+
+
+def iter_streams(cassette: Cassette) -> Iterator[dict]:
+    """Recorded successful SSE interactions (what streaming benchmarks replay)."""
+    for interaction in cassette.interactions:
+        if interaction["status"] < 400 and "text/event-stream" in interaction["headers"].get("content-type", ""):
+            yield interaction
@@ -0,0 +1,199 @@
+"""
+Hedged streaming requests.
+
+If the primary stream hasn't produced its first token after a delay taken from the observed
+time-to-first-token distribution, a duplicate request is fired at a hedge target (another
+provider/model). The first stream to produce a token wins and the other one is cancelled.
+A token-bucket budget caps how much extra load hedging is allowed to add.
+Hedges fired and won are counted per policy name in the metrics registry.
+"""
+
+import asyncio
+import time
+import logging
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+HEDGES_FIRED = REGISTRY.counter("llm_hedges_fired_total", "Duplicate requests fired at a hedge target", ("policy",))
+HEDGES_WON = REGISTRY.counter("llm_hedges_won_total", "Hedged streams whose first token came from a hedge", ("policy",))
+
+
+class LatencyTracker:
+    """Rolling window of latency samples (seconds) with percentile lookup."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, value: float):
+        self._samples.append(value)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Return the p-th percentile (0-100) of the window, or None when empty."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+        return ordered[index]
+
+
+class HedgeBudget:
+    """
+    Token bucket that limits hedges to a fraction of the primary traffic.
+    Every primary request deposits `ratio` tokens (up to `burst`), every hedge spends one.
+    """
+
+    def __init__(self, ratio: float = 0.1, burst: float = 5.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = burst
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+    def deposit(self):
+        self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+
+class HedgePolicy:
+    """
+    Decides when to hedge. Meant to be long-lived and shared by every client talking to the same
+    provider/model so the TTFT window and the budget survive across requests.
+    """
+
+    def __init__(self, percentile: float = 95.0,
+                 initial_delay: float = 2.0,
+                 min_delay: float = 0.05,
+                 max_delay: float = 10.0,
+                 min_samples: int = 20,
+                 window: int = 200,
+                 budget: Optional[HedgeBudget] = None,
+                 name: str = "default"):
+        self.name = name
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.tracker = LatencyTracker(window)
+        self.budget = budget or HedgeBudget()
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self._fired_metric = HEDGES_FIRED.labels(name)
+        self._won_metric = HEDGES_WON.labels(name)
+
+    def hedge_delay(self) -> float:
+        """How long to wait for the primary's first token before hedging."""
+        if len(self.tracker) < self.min_samples:
+            delay = self.initial_delay
+        else:
+            delay = self.tracker.percentile(self.percentile)
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def record_ttft(self, seconds: float):
+        self.tracker.record(seconds)
+
+    def hedge_fired(self):
+        self.hedges_fired += 1
+        self._fired_metric.inc()
+
+    def hedge_won(self):
+        self.hedges_won += 1
+        self._won_metric.inc()
+
+
+async def _cancel_stream(task: asyncio.Future, stream: AsyncIterator[str]):
+    """Cancel a pending first-token fetch and close its generator (drops the upstream socket)."""
+    task.cancel()
+    try:
+        await task
+    except BaseException:
+        pass
+    try:
+        await stream.aclose()
+    except Exception:
+        pass
+
+
+async def hedged_stream(primary: AsyncIterator[str],
+                        make_hedges: List[Callable[[], AsyncIterator[str]]],
+                        policy: HedgePolicy) -> AsyncIterator[str]:
+    """
+    Race `primary` against lazily created hedge streams and yield from whichever produces a
+    token first. `make_hedges` are only called if the policy decides to hedge. The time to the
+    first token is recorded for the primary, as a lower bound when a hedge beat it.
+    """
+    start = time.monotonic()
+    policy.budget.deposit()
+
+    contenders = {asyncio.ensure_future(primary.__anext__()): primary}
+    hedges = list(make_hedges)
+    last_error: Optional[BaseException] = None
+    winner = first = None
+
+    try:
+        timeout = policy.hedge_delay()
+        while contenders:
+            done, _ = await asyncio.wait(contenders, timeout=timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                # Primary is slow: fire a hedge if the budget allows, otherwise just keep waiting
+                timeout = None
+                if hedges and policy.budget.try_spend():
+                    stream = hedges.pop(0)()
+                    contenders[asyncio.ensure_future(stream.__anext__())] = stream
+                    policy.hedge_fired()
+                    logger.debug(f"Hedging stream after {time.monotonic() - start:.3f}s")
+                continue
+
+            for task in done:
+                stream = contenders.pop(task)
+                error = task.exception()
+                if error is None or isinstance(error, StopAsyncIteration):
+                    winner, first = stream, task
+                    break
+                # That contender failed outright, let the others keep racing
+                last_error = error
+            if winner is not None:
+                break
+            if not contenders and hedges and policy.budget.try_spend():
+                # Everyone so far failed; a remaining hedge target is better than an error
+                stream = hedges.pop(0)()
+                contenders[asyncio.ensure_future(stream.__anext__())] = stream
+                policy.hedge_fired()
+    finally:
+        # Losers (or everybody, if we're being cancelled ourselves) are torn down immediately
+        for task, stream in contenders.items():
+            await _cancel_stream(task, stream)
+
+    if winner is None:
+        raise last_error or RuntimeError("No hedged stream produced a result")
+
+    if winner is not primary:
+        policy.hedge_won()
+
+    error = first.exception()
+    if isinstance(error, StopAsyncIteration):
+        return
+    # The window is the primary target's TTFT. When a hedge won, the primary's first token was
+    # still missing at this point: the elapsed time is a lower bound of it, and leaving it out
+    # would keep only the fast samples and walk the hedge delay down
+    policy.record_ttft(time.monotonic() - start)
+
+    yield first.result()
+    async for content in winner:
+        yield content
@@ -0,0 +1,269 @@
+"""
+Minimal metrics primitives: fixed-bucket histograms and counters with labels, percentile
+estimates, and Prometheus text exposition. No third-party dependency.
+
+Each histogram child has its own lock held only for a couple of integer increments, so
+contention stays negligible even with the I/O thread pool recording concurrently.
+
+A registry can be copied as a picklable `snapshot()` and snapshots added together with
+`MetricsRegistry.merged`, which is how the generation worker processes' metrics reach /metrics.
+"""
+
+import math
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds, from sub-millisecond renders to minute-long generations
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 200, 400, 800, 1600, 3200)
+
+# name -> (kind, documentation, label names, buckets or None, {label values: child state})
+Snapshot = Dict[str, Tuple[str, str, Tuple[str, ...], Optional[Tuple[float, ...]], Dict[Tuple[str, ...], Any]]]
+
+
+class Histogram:
+    """A single fixed-bucket histogram (one label combination)."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """(per-bucket counts, sum, count), consistent with each other."""
+        with self._lock:
+            return list(self._counts), self._sum, self._count
+
+    def merge(self, state: Tuple[List[int], float, int]):
+        """Add another histogram's snapshot (same buckets) to this one."""
+        counts, total_sum, total = state
+        with self._lock:
+            self._counts = [a + b for a, b in zip(self._counts, counts)]
+            self._sum += total_sum
+            self._count += total
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def percentile(self, p: float) -> float:
+        """Estimate the p-th percentile (0-100) by interpolating inside the matching bucket."""
+        counts, _, total = self.snapshot()
+        if total == 0:
+            return 0.0
+        rank = p / 100.0 * total
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return lower  # Beyond the last bucket, the best we can say is "at least"
+                upper = self.buckets[index]
+                return lower + (upper - lower) * max(0.0, rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def summary(self) -> Dict[str, float]:
+        _, total_sum, total = self.snapshot()
+        return {
+            'count': total,
+            'mean': total_sum / total if total else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99)
+        }
+
+
+class Counter:
+    """A single monotonically increasing counter."""
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> float:
+        return self._value
+
+    def merge(self, value: float):
+        self.inc(value)
+
+
+class MetricFamily:
+    """A named metric with a fixed set of label names; children are created on first use."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def children(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return list(self._children.items())
+
+    def _label_str(self, values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.label_names, values))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class HistogramFamily(MetricFamily):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, label_names)
+
+    def _new_child(self) -> Histogram:
+        return Histogram(self.buckets)
+
+    def observe(self, value: float):
+        """Shortcut for label-less histograms."""
+        self.labels().observe(value)
+
+    def expose(self) -> Iterable[str]:
+        for values, histogram in self.children():
+            counts, total_sum, total = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{self._label_str(values, ('le', _format(bound)))} {cumulative}"
+            yield f"{self.name}_bucket{self._label_str(values, ('le', '+Inf'))} {total}"
+            yield f"{self.name}_sum{self._label_str(values)} {_format(total_sum)}"
+            yield f"{self.name}_count{self._label_str(values)} {total}"
+
+
+class CounterFamily(MetricFamily):
+    kind = "counter"
+
+    def _new_child(self) -> Counter:
+        return Counter()
+
+    def inc(self, amount: float = 1.0):
+        """Shortcut for label-less counters."""
+        self.labels().inc(amount)
+
+    def expose(self) -> Iterable[str]:
+        for values, counter in self.children():
+            yield f"{self.name}{self._label_str(values)} {_format(counter.value)}"
+
+
+class MetricsRegistry:
+    """Holds metric families and renders them in the Prometheus text format (0.0.4)."""
+
+    def __init__(self):
+        self._families: Dict[str, MetricFamily] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = cls(name, *args, **kwargs)
+            elif not isinstance(family, cls):
+                raise ValueError(f"Metric {name} already registered as {family.kind}")
+            return family
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> HistogramFamily:
+        return self._get_or_create(HistogramFamily, name, documentation, label_names, buckets)
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> CounterFamily:
+        return self._get_or_create(CounterFamily, name, documentation, label_names)
+
+    def snapshot(self) -> Snapshot:
+        """Picklable copy of every family's values."""
+        with self._lock:
+            families = list(self._families.values())
+        return {family.name: (family.kind, family.documentation, family.label_names, getattr(family, "buckets", None),
+                              {values: child.snapshot() for values, child in family.children()})
+                for family in families}
+
+    @classmethod
+    def merged(cls, snapshots: Iterable[Snapshot]) -> "MetricsRegistry":
+        """A new registry holding the sum of `snapshots` (families in order of first appearance)."""
+        registry = cls()
+        for snapshot in snapshots:
+            for name, (kind, documentation, label_names, buckets, children) in snapshot.items():
+                if kind == "histogram":
+                    family = registry.histogram(name, documentation, label_names, buckets)
+                else:
+                    family = registry.counter(name, documentation, label_names)
+                for values, state in children.items():
+                    family.labels(*values).merge(state)
+        return registry
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            families = list(self._families.values())
+        for family in families:
+            lines.append(f"# HELP {family.name} {family.documentation}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            lines.extend(family.expose())
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Percentile summary of every histogram, keyed by name then by joined label values."""
+        result = {}
+        with self._lock:
+            families = [f for f in self._families.values() if isinstance(f, HistogramFamily)]
+        for family in families:
+            result[family.name] = {"/".join(values) or "all": histogram.summary()
+                                   for values, histogram in family.children()}
+        return result
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    value = float(value)
+    return str(int(value)) if value.is_integer() and abs(value) < 1e15 else repr(value)
+
+
+# Process-wide default registry
+REGISTRY = MetricsRegistry()
@@ -1,11 +1,15 @@
+import asyncio
 import logging
 import threading
+import time
+import re
 # Configure logging
 logger = logging.getLogger(__name__)
 
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, Tuple
 
 from .models import *
+from .metrics import REGISTRY, RATE_BUCKETS, Histogram, MetricsRegistry
 
 # Middleware System
 class BaseMiddleware:
@@ -23,6 +27,22 @@ class BaseMiddleware:
         """Process an error that occurred during the request."""
         return error
 
+    # Streaming lifecycle hooks (streaming requests never produce an HTTPResponse)
+    async def process_first_byte(self, request: HTTPRequest, elapsed: float) -> None:
+        """Called when the first chunk of a streaming attempt arrives, `elapsed` since it was sent."""
+
+    async def process_chunk(self, request: HTTPRequest, chunk: bytes) -> bytes:
+        """Process every streamed chunk (one SSE line for event streams) before it's consumed."""
+        return chunk
+
+    async def process_stream_end(self, request: HTTPRequest, elapsed: float,
+                                 error: Optional[BaseException] = None) -> None:
+        """Called once when a stream is over: completed, failed for good (`error`) or abandoned."""
+
+    def overrides(self, hook: str) -> bool:
+        """Whether this middleware implements `hook` (lets the executor skip no-op per-chunk calls)."""
+        return getattr(type(self), hook) is not getattr(BaseMiddleware, hook)
+
 class LoggingMiddleware(BaseMiddleware):
     """Middleware for logging requests and responses."""
 
@@ -41,6 +61,10 @@ class LoggingMiddleware(BaseMiddleware):
         self.logger.error(f"Request failed: {request.method} {request.url} - {error}")
         return error
 
+    async def process_stream_end(self, request: HTTPRequest, elapsed: float,
+                                 error: Optional[BaseException] = None) -> None:
+        self.logger.debug(f"Stream ended: {request.url} ({elapsed:.3f}s){f' - {error!r}' if error else ''}")
+
 class AuthenticationMiddleware(BaseMiddleware):
     """Middleware for adding authentication headers."""
 
@@ -71,14 +95,24 @@ class MetricsMiddleware(BaseMiddleware):
         self.request_count = 0
         self.error_count = 0
         self.total_response_time = 0.0
+        self.response_times = Histogram()
         self._lock = threading.Lock()
 
     async def process_response(self, response: HTTPResponse) -> HTTPResponse:
         with self._lock:
             self.request_count += 1
             self.total_response_time += response.elapsed
+        self.response_times.observe(response.elapsed)
         return response
 
+    async def process_stream_end(self, request: HTTPRequest, elapsed: float,
+                                 error: Optional[BaseException] = None) -> None:
+        if error is None:
+            with self._lock:
+                self.request_count += 1
+                self.total_response_time += elapsed
+            self.response_times.observe(elapsed)
+
     async def process_error(self, error: Exception, request: HTTPRequest) -> Exception:
         with self._lock:
             self.error_count += 1
@@ -97,6 +131,142 @@ class MetricsMiddleware(BaseMiddleware):
                 'error_rate': (
                     self.error_count / (self.request_count + self.error_count)
                     if (self.request_count + self.error_count) > 0 else 0.0
-                )
+                ),
+                'p50_response_time': self.response_times.percentile(50),
+                'p95_response_time': self.response_times.percentile(95),
+                'p99_response_time': self.response_times.percentile(99)
+            }
+
+
+_MODEL_RE = re.compile(rb'(?<!\\)"model"\s*:\s*"([^"]*)"')
+_FINISH_REASON_RE = re.compile(rb'"finish_reason"\s*:\s*"([^"]+)"')
+_COMPLETION_TOKENS_RE = re.compile(rb'"completion_tokens"\s*:\s*(\d+)')
+_EMPTY_CONTENT_RE = re.compile(rb'"content"\s*:\s*(?:""|null)')
+
+def _has_content(line: bytes) -> bool:
+    """Cheap check for a non-empty content delta in an SSE data line (no JSON parsing)."""
+    return b'"content"' in line and not _EMPTY_CONTENT_RE.search(line)
+
+class StreamingMetricsMiddleware(BaseMiddleware):
+    """
+    Per provider/model upstream metrics: request latency, time to first token, inter-token latency,
+    tokens/sec, bytes and finish reasons, recorded into histograms/counters of a MetricsRegistry.
+    Works on the raw SSE lines, so it doesn't care which client is used.
+    Tokens are counted as content events unless the provider reports `usage.completion_tokens`.
+    """
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        registry = registry or REGISTRY
+        labels = ('provider', 'model')
+        self.request_seconds = registry.histogram(
+            'llm_upstream_request_seconds', 'Upstream request latency (whole stream for streaming requests)', labels)
+        self.ttft_seconds = registry.histogram(
+            'llm_time_to_first_token_seconds', 'Time from sending the request to the first content token', labels)
+        self.inter_token_seconds = registry.histogram(
+            'llm_inter_token_latency_seconds', 'Time between consecutive content tokens', labels)
+        self.tokens_per_second = registry.histogram(
+            'llm_tokens_per_second', 'Generation speed of a stream, measured from its first token', labels,
+            buckets=RATE_BUCKETS)
+        self.tokens_total = registry.counter('llm_stream_tokens_total', 'Tokens streamed', labels)
+        self.bytes_total = registry.counter('llm_stream_bytes_total', 'Bytes streamed', labels)
+        self.streams_total = registry.counter(
+            'llm_streams_total', 'Finished streams by finish reason', labels + ('finish_reason',))
+        self.errors_total = registry.counter('llm_upstream_errors_total', 'Failed upstream requests', labels)
+
+    @staticmethod
+    def labels(request: HTTPRequest) -> Tuple[str, str]:
+        """(provider, model) of a request: the upstream host and the model named in the body."""
+        label = request.context.get('metric_labels')
+        if label is None:
+            match = _MODEL_RE.search(request.body or b'')
+            model = match.group(1).decode('utf-8', errors='ignore') if match else "unknown"
+            label = request.context['metric_labels'] = (request.parsed_url.hostname or "unknown", model)
+        return label
+
+    def _state(self, request: HTTPRequest) -> Dict[str, Any]:
+        state = request.context.get('stream_metrics')
+        if state is None:
+            state = request.context['stream_metrics'] = {
+                'start': time.monotonic(), 'ttft': None, 'last_token': None,
+                'tokens': 0, 'usage_tokens': None, 'bytes': 0, 'finish_reason': None
             }
+        return state
+
+    async def process_request(self, request: HTTPRequest) -> HTTPRequest:
+        self._state(request)['start'] = time.monotonic()
+        return request
+
+    async def process_response(self, response: HTTPResponse) -> HTTPResponse:
+        self.request_seconds.labels(*self.labels(response.request)).observe(response.elapsed)
+        return response
+
+    async def process_error(self, error: Exception, request: HTTPRequest) -> Exception:
+        self.errors_total.labels(*self.labels(request)).inc()
+        return error
 
+    async def process_chunk(self, request: HTTPRequest, chunk: bytes) -> bytes:
+        state = self._state(request)
+        now = time.monotonic()
+        state['bytes'] += len(chunk)
+
+        if chunk.startswith(b'data:') and _has_content(chunk):
+            if state['ttft'] is None:
+                state['ttft'] = now - state['start']
+                self.ttft_seconds.labels(*self.labels(request)).observe(state['ttft'])
+            else:
+                self.inter_token_seconds.labels(*self.labels(request)).observe(now - state['last_token'])
+            state['last_token'] = now
+            state['tokens'] += 1
+
+        if b'finish_reason' in chunk:
+            match = _FINISH_REASON_RE.search(chunk)
+            if match:
+                state['finish_reason'] = match.group(1).decode('utf-8', errors='ignore')
+        if b'completion_tokens' in chunk:
+            match = _COMPLETION_TOKENS_RE.search(chunk)
+            if match:
+                state['usage_tokens'] = int(match.group(1))
+        return chunk
+
+    async def process_stream_end(self, request: HTTPRequest, elapsed: float,
+                                 error: Optional[BaseException] = None) -> None:
+        state = self._state(request)
+        labels = self.labels(request)
+        tokens = state['usage_tokens'] if state['usage_tokens'] is not None else state['tokens']
+
+        if isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            finish_reason = "cancelled"
+        else:
+            finish_reason = state['finish_reason'] or ("error" if error is not None else "unknown")
+
+        self.request_seconds.labels(*labels).observe(elapsed)
+        self.tokens_total.labels(*labels).inc(tokens)
+        self.bytes_total.labels(*labels).inc(state['bytes'])
+        self.streams_total.labels(*labels, finish_reason).inc()
+
+        # Generation speed is measured from the first token, so TTFT doesn't drag it down
+        if state['ttft'] is not None and tokens > 1:
+            generation_time = state['last_token'] - (state['start'] + state['ttft'])
+            if generation_time > 0:
+                self.tokens_per_second.labels(*labels).observe((tokens - 1) / generation_time)
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Current metrics keyed by "provider/model"."""
+        stats = {}
+        for labels, histogram in self.request_seconds.children():
+            key = "/".join(labels)
+            ttft = self.ttft_seconds.labels(*labels)
+            finish_reasons = {values[2]: counter.value for values, counter in self.streams_total.children()
+                              if values[:2] == labels}
+            stats[key] = {
+                'requests': histogram.count,
+                'errors': self.errors_total.labels(*labels).value,
+                'tokens': self.tokens_total.labels(*labels).value,
+                'bytes': self.bytes_total.labels(*labels).value,
+                'latency': histogram.summary(),
+                'ttft': ttft.summary(),
+                'inter_token_latency': self.inter_token_seconds.labels(*labels).summary(),
+                'tokens_per_second': self.tokens_per_second.labels(*labels).summary(),
+                'finish_reasons': finish_reasons
+            }
+        return stats
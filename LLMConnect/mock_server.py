@@ -0,0 +1,213 @@
+"""
+Local OpenAI-compatible mock provider for offline load tests and benchmarks.
+
+Serves `POST /v1/chat/completions` (streaming and not) and `GET /v1/models` with synthetic
+output, so the app can run against the "mock" provider in providers_config.json and go through
+the real APIClientFactory / executor / SSE parsing code paths without network or API keys.
+That provider is only registered (and listed in the UI) when HFC_ENABLE_MOCK=1.
+
+    python -m LLMConnect.mock_server --port 8399 --ttft 0.3 --tps 60 --error-rate 0.01
+
+Every knob can also be set per request with an `X-Mock-<Option>` header (e.g. `X-Mock-TTFT: 2`),
+which lets a benchmark mix profiles against one server.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, fields, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+WORDS = ("the quick brown fox jumps over lazy dog while streaming tokens arrive at steady pace "
+         "through local sockets for benchmark purposes only").split()
+
+
+@dataclass
+class MockConfig:
+    ttft: float = 0.2               # Seconds before the first token (and before the non-streaming reply)
+    tps: float = 50.0               # Tokens per second once streaming (0 = as fast as possible)
+    tokens: int = 200               # Tokens per reply, capped by the request's max_tokens
+    chunk_tokens: int = 1           # Tokens per SSE chunk
+    token_chars: int = 0            # Pad every token to this many characters (payload size), 0 = natural words
+    jitter: float = 0.0             # Relative random variation of ttft and inter-token delay
+    error_rate: float = 0.0         # Fraction of requests answered with a 500
+    rate_limit_rate: float = 0.0    # Fraction of requests answered with a 429
+    retry_after: float = 1.0        # Retry-After of the 429s
+    mid_stream_error_rate: float = 0.0  # Fraction of streams cut off halfway
+
+    def with_overrides(self, headers) -> "MockConfig":
+        overrides = {}
+        for f in fields(self):
+            value = headers.get("X-Mock-" + f.name.replace("_", "-"))
+            if value is not None:
+                overrides[f.name] = type(getattr(self, f.name))(value)
+        return replace(self, **overrides) if overrides else self
+
+
+class MockStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {"requests": 0, "streams": 0, "errors": 0, "rate_limited": 0, "tokens": 0}
+
+    def add(self, key: str, n: int = 1):
+        with self._lock:
+            self.counts[key] += n
+
+
+def _token(i: int, config: MockConfig, rng: random.Random) -> str:
+    word = WORDS[(i + rng.randrange(len(WORDS))) % len(WORDS)]
+    if config.token_chars:
+        word = (word * (config.token_chars // len(word) + 1))[:config.token_chars - 1]
+    return word + " "
+
+
+def _delay(seconds: float, config: MockConfig, rng: random.Random):
+    if seconds > 0:
+        time.sleep(max(0.0, seconds * (1 + rng.uniform(-config.jitter, config.jitter))))
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real APIs
+    disable_nagle_algorithm = True  # Headers and body are separate writes, don't let delayed ACKs add 40ms
+    server: "MockServer"
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status: int, payload: dict, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._json(200, {"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "mock"}]})
+        else:
+            self._json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._json(404, {"error": {"message": "Not found"}})
+            return
+
+        config = self.server.config.with_overrides(self.headers)
+        rng = random.Random()
+        stats = self.server.stats
+        stats.add("requests")
+        if rng.random() < config.rate_limit_rate:
+            stats.add("rate_limited")
+            self._json(429, {"error": {"message": "Rate limit exceeded (mock)", "type": "rate_limit"}},
+                       {"Retry-After": f"{config.retry_after:g}"})
+            return
+        if rng.random() < config.error_rate:
+            stats.add("errors")
+            self._json(500, {"error": {"message": "Internal error (mock)", "type": "server_error"}})
+            return
+
+        model = request.get("model", "mock-model")
+        n_tokens = min(config.tokens, request.get("max_tokens") or request.get("max_completion_tokens") or config.tokens)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in request.get("messages", []))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": n_tokens, "total_tokens": prompt_tokens + n_tokens}
+
+        _delay(config.ttft, config, rng)
+        if not request.get("stream"):
+            content = "".join(_token(i, config, rng) for i in range(n_tokens))
+            stats.add("tokens", n_tokens)
+            self._json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+            return
+
+        stats.add("streams")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_event(payload) -> None:
+            data = f"data: {payload if isinstance(payload, str) else json.dumps(payload)}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def chunk(delta: dict, finish_reason=None, **extra) -> dict:
+            return {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}], **extra}
+
+        cut_at = n_tokens // 2 if rng.random() < config.mid_stream_error_rate else None
+        try:
+            send_event(chunk({"role": "assistant", "content": ""}))
+            interval = config.chunk_tokens / config.tps if config.tps > 0 else 0.0
+            for start in range(0, n_tokens, config.chunk_tokens):
+                if cut_at is not None and start >= cut_at:
+                    stats.add("errors")
+                    self.close_connection = True
+                    return  # No terminating chunk: the client sees a truncated body
+                if start:
+                    _delay(interval, config, rng)
+                count = min(config.chunk_tokens, n_tokens - start)
+                send_event(chunk({"content": "".join(_token(start + i, config, rng) for i in range(count))}))
+                stats.add("tokens", count)
+            send_event(chunk({}, "stop", usage=usage))
+            send_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # The client went away (cancelled generation)
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # Listen backlog: hundreds of clients connect at once in load tests
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8399, config: Optional[MockConfig] = None):
+        super().__init__((host, port), MockHandler)
+        self.config = config or MockConfig()
+        self.stats = MockStats()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockServer":
+        """Serve from a daemon thread (for tests and benchmarks). Returns self."""
+        threading.Thread(target=self.serve_forever, name="mock-llm", daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8399)
+    for f in fields(MockConfig):
+        parser.add_argument("--" + f.name.replace("_", "-"), type=type(f.default), default=f.default)
+    args = parser.parse_args()
+    config = MockConfig(**{f.name: getattr(args, f.name) for f in fields(MockConfig)})
+
+    server = MockServer(args.host, args.port, config)
+    print(f"Mock LLM provider on {server.base_url} ({config})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats.counts))
+
+
+if __name__ == "__main__":
+    main()
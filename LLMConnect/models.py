@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import Dict, Optional
+from typing import Any, Dict, Optional
 from urllib.parse import urlparse
 
 # Request/Response Models
@@ -11,6 +11,7 @@ class HTTPRequest:
     headers: Dict[str, str] = field(default_factory=dict)
     body: Optional[bytes] = None
     timeout: float = 30.0
+    context: Dict[str, Any] = field(default_factory=dict)  # Per-request scratch space for middleware
 
     @property
     def parsed_url(self):
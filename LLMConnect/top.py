@@ -6,10 +6,11 @@ This was the original version. I've added send & post to both SyncAPIClient & As
 import json
 import asyncio
 import os
-from typing import Dict, List, Optional, Any, AsyncIterator, Union, Iterator
+from typing import Dict, List, Optional, Any, AsyncIterator, Union, Iterator, Iterable
 
 from .base import SyncHTTPClient, AsyncHTTPClient, ConnectionPool, RetryConfig
 from .middlewares import AuthenticationMiddleware, UserAgentMiddleware, LoggingMiddleware, HTTPResponse, BaseMiddleware
+from .hedging import HedgePolicy, hedged_stream
 
 from .utils import validate_messages_format
 
@@ -69,11 +70,18 @@ class APIExecutor:
         else:
             raise TypeError(f"Prompt must be either a string or a list of message dictionaries, got {type(prompt)!r}")
 
+        return self.build_request_data(self.messages, stream)
+
+    def build_request_data(self, messages: List[Dict[str, str]], stream: bool = False,
+                           model: Optional[str] = None,
+                           temperature: Optional[float] = None,
+                           max_completion_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """Request data for `messages` without touching the stored history (parameters default to the client's)."""
         data = {
-            "model": self.model,
-            "messages": self.messages,
-            "temperature": self.temperature,
-            "max_completion_tokens": self.max_completion_tokens
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": self.temperature if temperature is None else temperature,
+            "max_completion_tokens": max_completion_tokens or self.max_completion_tokens
         }
 
         if stream:
@@ -97,10 +105,15 @@ class APIExecutor:
 
         return url, request_headers, body
 
+    @staticmethod
+    def extract_content(response: HTTPResponse) -> str:
+        """The assistant message of a non-streaming chat response."""
+        result = json.loads(response.body.decode('utf-8'))
+        return result["choices"][0]["message"]["content"]
+
     def process_non_streaming_response(self, response: HTTPResponse) -> str:
         """Process a non-streaming chat response."""
-        result = json.loads(response.body.decode('utf-8'))
-        assistant_message = result["choices"][0]["message"]["content"]
+        assistant_message = self.extract_content(response)
 
         # Add assistant's response to history
         self.add_message("assistant", assistant_message)
@@ -227,24 +240,49 @@ class SyncAPIClient:
 
     def _stream_chat(self, data: Dict[str, Any]) -> Iterator[str]:
         """Handle streaming chat responses."""
+        full_response = []
+
+        for content in self._stream_content(data):
+            full_response.append(content)
+            yield content
+
+        # Add complete response to history
+        if full_response:
+            self._executor.add_message("assistant", "".join(full_response))
+
+    def _stream_content(self, data: Dict[str, Any], timeout: Optional[float] = None) -> Iterator[str]:
+        """Stream the non-empty content deltas of a single upstream request."""
         url, headers, body = self._executor.get_request_config(data)
         headers['Accept'] = 'text/event-stream'
 
-        full_response = []
-
         for chunk in self._http_client.stream_request('POST', url, headers=headers,
-                                                    body=body, timeout=self._executor.timeout):
+                                                    body=body, timeout=timeout or self._executor.timeout):
             content = self._executor.parse_streaming_chunk(chunk)
 
             if content is None:  # End of stream
                 break
             elif content:  # Non-empty content
-                full_response.append(content)
                 yield content
 
-        # Add complete response to history
-        if full_response:
-            self._executor.add_message("assistant", "".join(full_response))
+    # Stateless API: messages and parameters per call, nothing stored on the client, so one
+    # client can serve any number of conversations
+    def complete(self, messages: List[Dict[str, str]], model: Optional[str] = None,
+                 temperature: Optional[float] = None, max_completion_tokens: Optional[int] = None,
+                 timeout: Optional[float] = None) -> str:
+        """The assistant reply to `messages` (history and client settings left untouched)."""
+        validate_messages_format(messages)
+        data = self._executor.build_request_data(messages, False, model, temperature, max_completion_tokens)
+        url, headers, body = self._executor.get_request_config(data)
+        response = self.post(url, headers=headers, body=body, timeout=timeout or self._executor.timeout)
+        return self._executor.extract_content(response)
+
+    def stream(self, messages: List[Dict[str, str]], model: Optional[str] = None,
+               temperature: Optional[float] = None, max_completion_tokens: Optional[int] = None,
+               timeout: Optional[float] = None) -> Iterator[str]:
+        """Stream the assistant reply to `messages` (history and client settings left untouched)."""
+        validate_messages_format(messages)
+        data = self._executor.build_request_data(messages, True, model, temperature, max_completion_tokens)
+        return self._stream_content(data, timeout)
 
     def close(self):
         """Close the client and cleanup resources."""
@@ -269,12 +307,18 @@ class AsyncAPIClient:
                 http_client: Optional[AsyncHTTPClient] = None,
                 middleware: Optional[List[BaseMiddleware]] = None,
                 connection_pool: Optional[ConnectionPool] = None,
-                retry_config: Optional[RetryConfig] = None):
+                retry_config: Optional[RetryConfig] = None,
+                hedge_targets: Optional[List["AsyncAPIClient"]] = None,
+                hedge_policy: Optional[HedgePolicy] = None):
 
         self._executor = APIExecutor(
             api_key, base_url, model, endpoint, temperature, max_completion_tokens, timeout
         )
 
+        # Opt-in hedging: only active when both targets and a policy are given
+        self._hedge_targets = hedge_targets or []
+        self._hedge_policy = hedge_policy
+
         # Use provided client or create a new one
         if http_client:
             self._http_client = http_client
@@ -348,27 +392,77 @@ class AsyncAPIClient:
 
     async def _stream_chat(self, data: Dict[str, Any]) -> AsyncIterator[str]:
         """Handle streaming chat responses."""
+        full_response = []
+
+        async for content in self._stream_data(data):
+            full_response.append(content)
+            yield content
+
+        # Add complete response to history
+        if full_response:
+            self._executor.add_message("assistant", "".join(full_response))
+
+    def _stream_data(self, data: Dict[str, Any], timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Content deltas for `data`, hedged when hedging is on."""
+        if self._hedge_targets and self._hedge_policy:
+            return hedged_stream(
+                self._stream_content(data, timeout),
+                [self._make_hedge(target, data, timeout or self._executor.timeout) for target in self._hedge_targets],
+                self._hedge_policy
+            )
+        return self._stream_content(data, timeout)
+
+    async def _stream_content(self, data: Dict[str, Any], timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Stream the non-empty content deltas of a single upstream request."""
         url, headers, body = self._executor.get_request_config(data)
         headers['Accept'] = 'text/event-stream'
 
-        full_response = []
-
         async for chunk in self._http_client.stream_request('POST', url, headers=headers,
-                                                          body=body, timeout=self._executor.timeout):
+                                                          body=body, timeout=timeout or self._executor.timeout):
             content = self._executor.parse_streaming_chunk(chunk)
 
             if content is None:  # End of stream
                 break
             elif content:  # Non-empty content
-                full_response.append(content)
                 yield content
 
-        # Add complete response to history
-        if full_response:
-            self._executor.add_message("assistant", "".join(full_response))
+    @staticmethod
+    def _make_hedge(target: "AsyncAPIClient", data: Dict[str, Any], timeout: float):
+        """Build a lazy duplicate of `data` aimed at a hedge target's own model/endpoint, under the primary's timeout."""
+        return lambda: target._stream_content({**data, "model": target.model}, timeout)
+
+    # Stateless API: messages and parameters per call, nothing stored on the client, so one
+    # client (and its warm connections) can serve any number of concurrent conversations
+    async def complete(self, messages: List[Dict[str, str]], model: Optional[str] = None,
+                       temperature: Optional[float] = None, max_completion_tokens: Optional[int] = None,
+                       timeout: Optional[float] = None) -> str:
+        """The assistant reply to `messages` (history and client settings left untouched)."""
+        validate_messages_format(messages)
+        data = self._executor.build_request_data(messages, False, model, temperature, max_completion_tokens)
+        url, headers, body = self._executor.get_request_config(data)
+        response = await self.post(url, headers=headers, body=body, timeout=timeout or self._executor.timeout)
+        return self._executor.extract_content(response)
+
+    def stream(self, messages: List[Dict[str, str]], model: Optional[str] = None,
+               temperature: Optional[float] = None, max_completion_tokens: Optional[int] = None,
+               timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Stream the assistant reply to `messages` (history and client settings left untouched)."""
+        validate_messages_format(messages)
+        data = self._executor.build_request_data(messages, True, model, temperature, max_completion_tokens)
+        return self._stream_data(data, timeout)
+
+    def batch(self, items: Iterable[Union[List[Dict[str, str]], Dict[str, Any]]], concurrency: int = 8,
+              max_retries: int = 2, requests_per_minute: Optional[float] = None,
+              **params) -> AsyncIterator["BatchResult"]:
+        """`complete` over many message lists with bounded concurrency, results in completion order (see LLMConnect.batch)."""
+        from .batch import batch_complete  # Not at module level: `python -m LLMConnect.batch` imports this module
+        return batch_complete(self, items, concurrency=concurrency, max_retries=max_retries,
+                              requests_per_minute=requests_per_minute, **params)
 
     async def close(self):
         """Close the client and cleanup resources."""
+        for target in self._hedge_targets:
+            await target.close()
         if self._owns_client:
             await self._http_client.close()
 
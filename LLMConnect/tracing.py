@@ -0,0 +1,292 @@
+"""
+Lightweight tracing: spans grouped under a trace id, propagated with contextvars, exported as
+JSON lines or OTLP/HTTP JSON by a background thread (exporting never blocks the event loop).
+
+    with tracer.span("render", template="chat.html"):
+        ...
+
+`span()` activates the span for the code inside the `with`. Async generators must not do that
+(their steps can run in different contexts), they use `start(..., parent=...)` + `end()` instead.
+When nothing is exported and there is no active trace, spans are no-ops.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("llmconnect_span", default=None)
+
+
+class Span:
+    """A timed operation. The root span of a trace also collects child timings (Server-Timing)."""
+
+    __slots__ = ('tracer', 'name', 'trace_id', 'span_id', 'parent_id', 'root', 'start_ns', 'end_ns',
+                 'attributes', 'events', 'error', 'timings')
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"] = None,
+                 start_ns: Optional[int] = None, **attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.root = parent.root if parent else self
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = attributes
+        self.events: List[Tuple[str, int, Dict[str, Any]]] = []
+        self.error: Optional[str] = None
+        self.timings: List[Tuple[str, float]] = []
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes):
+        self.events.append((name, time.time_ns(), attributes))
+
+    def record_error(self, error: BaseException):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self, end_ns: Optional[int] = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns or time.time_ns()
+        if self.root is not self and self.root.end_ns is None:
+            self.root.timings.append((self.name, self.duration_ms))
+        self.tracer._export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': round(self.duration_ms, 3),
+            'attributes': self.attributes,
+            'events': [{'name': name, 'time_ns': ts, 'attributes': attrs} for name, ts, attrs in self.events],
+            'error': self.error
+        }
+
+
+class _NoopSpan:
+    """Stand-in returned when tracing is effectively off."""
+
+    trace_id = span_id = parent_id = None
+    duration_ms = 0.0
+
+    def set_attribute(self, key, value): pass
+    def add_event(self, name, **attributes): pass
+    def record_error(self, error): pass
+    def end(self, end_ns=None): pass
+
+NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter:
+    """Receives batches of finished spans on the exporter thread."""
+
+    def export(self, spans: List[Span]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JSONLinesExporter(SpanExporter):
+    """Appends one JSON object per span to a local file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]):
+        with open(self.path, "a") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+
+class OTLPHTTPExporter(SpanExporter):
+    """POSTs spans to an OTLP/HTTP collector (JSON encoding), e.g. http://localhost:4318."""
+
+    def __init__(self, endpoint: str, service_name: str = "hyperfastchat", timeout: float = 5.0):
+        endpoint = endpoint.rstrip('/')
+        self.url = endpoint if endpoint.endswith('/v1/traces') else endpoint + '/v1/traces'
+        self.service_name = service_name
+        self.timeout = timeout
+
+    @staticmethod
+    def _attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+        result = []
+        for key, value in attributes.items():
+            if isinstance(value, bool):
+                encoded = {'boolValue': value}
+            elif isinstance(value, int):
+                encoded = {'intValue': str(value)}
+            elif isinstance(value, float):
+                encoded = {'doubleValue': value}
+            else:
+                encoded = {'stringValue': str(value)}
+            result.append({'key': key, 'value': encoded})
+        return result
+
+    def _encode(self, span: Span) -> Dict[str, Any]:
+        encoded = {
+            'traceId': span.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(span.start_ns),
+            'endTimeUnixNano': str(span.end_ns),
+            'attributes': self._attributes(span.attributes),
+            'events': [{'name': name, 'timeUnixNano': str(ts), 'attributes': self._attributes(attrs)}
+                       for name, ts, attrs in span.events],
+            'status': {'code': 2, 'message': span.error} if span.error else {'code': 1}
+        }
+        if span.parent_id:
+            encoded['parentSpanId'] = span.parent_id
+        return encoded
+
+    def export(self, spans: List[Span]):
+        payload = {'resourceSpans': [{
+            'resource': {'attributes': self._attributes({'service.name': self.service_name})},
+            'scopeSpans': [{'scope': {'name': 'LLMConnect'}, 'spans': [self._encode(s) for s in spans]}]
+        }]}
+        request = urllib.request.Request(self.url, data=json.dumps(payload).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class Tracer:
+    """Creates spans and ships finished ones to an exporter in batches."""
+
+    def __init__(self, exporter: Optional[SpanExporter] = None,
+                 batch_size: int = 256, flush_interval: float = 1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._exporter: Optional[SpanExporter] = None
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=10000)
+        self._thread: Optional[threading.Thread] = None
+        if exporter is not None:
+            self.set_exporter(exporter)
+
+    @property
+    def enabled(self) -> bool:
+        return self._exporter is not None
+
+    def set_exporter(self, exporter: Optional[SpanExporter]):
+        self._exporter = exporter
+        if exporter is not None and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="llmconnect-tracer", daemon=True)
+            self._thread.start()
+
+    def configure(self, spec: Optional[str]):
+        """Set the exporter from "jsonl:<path>" or "otlp:<endpoint>" (e.g. the TRACE_EXPORT env var)."""
+        if not spec:
+            return
+        kind, _, target = spec.partition(':')
+        if kind == 'jsonl':
+            self.set_exporter(JSONLinesExporter(target or 'traces.jsonl'))
+        elif kind == 'otlp':
+            self.set_exporter(OTLPHTTPExporter(target or 'http://localhost:4318'))
+        else:
+            raise ValueError(f"Unknown trace exporter '{spec}', expected jsonl:<path> or otlp:<endpoint>")
+
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        return _current_span.get()
+
+    def start(self, name: str, parent: Optional[Span] = None, start_ns: Optional[int] = None,
+              force: bool = False, **attributes):
+        """
+        Start a span without activating it. `parent` defaults to the active span.
+        `force` creates a real root span even when nothing is exported (e.g. for Server-Timing).
+        """
+        if parent is None:
+            parent = _current_span.get()
+        if parent is None and not (self.enabled or force):
+            return NOOP_SPAN
+        if isinstance(parent, _NoopSpan):
+            parent = None
+        return Span(self, name, parent, start_ns, **attributes)
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Span] = None, force: bool = False, **attributes) -> Iterator[Span]:
+        """Start a span, make it the active one for the block, end it afterwards."""
+        span = self.start(name, parent, force=force, **attributes)
+        if span is NOOP_SPAN:
+            yield span
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as error:
+            span.record_error(error)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def record(self, name: str, start_ns: int, end_ns: int, parent: Optional[Span] = None, **attributes):
+        """Record an already finished operation (e.g. timed on a worker thread)."""
+        span = self.start(name, parent, start_ns, **attributes)
+        span.end(end_ns)
+        return span
+
+    def _export(self, span: Span):
+        if self._exporter is None:
+            return
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass  # Never slow down the traced code because the exporter can't keep up
+
+    def _run(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if batch and self._exporter is not None:
+                try:
+                    self._exporter.export(batch)
+                except Exception as e:
+                    logger.warning(f"Dropping {len(batch)} spans, export failed: {e}")
+
+    def flush(self, timeout: float = 5.0):
+        """Best-effort wait until queued spans have been handed to the exporter."""
+        deadline = time.monotonic() + timeout
+        while not self._queue.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+def server_timing(span: Span) -> str:
+    """Format a root span and its children's timings as a Server-Timing header value."""
+    totals: Dict[str, float] = {}
+    for name, duration in span.timings:
+        metric = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+        totals[metric] = totals.get(metric, 0.0) + duration
+    entries = [f"{name};dur={duration:.1f}" for name, duration in totals.items()]
+    entries.append(f"total;dur={span.duration_ms:.1f}")
+    return ", ".join(entries)
+
+
+# Process-wide default tracer
+tracer = Tracer()
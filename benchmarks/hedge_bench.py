@@ -0,0 +1,113 @@
+"""
+Hedged streaming benchmark.
+
+Boots two local OpenAI-compatible stubs with a slow TTFT tail and measures the client-side
+time-to-first-token distribution with and without hedging.
+
+    python -m benchmarks.hedge_bench --requests 400 --slow-ratio 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from LLMConnect.top import AsyncAPIClient
+from LLMConnect.hedging import HedgePolicy, HedgeBudget
+
+
+def make_stub(ttft: float, slow_ttft: float, slow_ratio: float, tokens: int):
+    """Stub server whose first token is usually fast and occasionally very slow."""
+
+    class SlowTailHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            try:
+                time.sleep(slow_ttft if random.random() < slow_ratio else ttft)
+                for i in range(tokens):
+                    event = {"choices": [{"delta": {"content": f"tok{i} "}}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client cancelled us after losing a hedge race
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowTailHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+
+async def run(base_url: str, hedge_url: str, policy, requests: int, concurrency: int) -> List[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    ttfts = []
+
+    async def one():
+        async with semaphore:
+            targets = [AsyncAPIClient("stub", hedge_url, "stub-hedge")] if policy else None
+            client = AsyncAPIClient("stub", base_url, "stub", hedge_targets=targets, hedge_policy=policy)
+            start = time.monotonic()
+            first = None
+            async for _ in await client.chat([{"role": "user", "content": "hi"}], stream=True):
+                if first is None:
+                    first = time.monotonic() - start
+            ttfts.append(first)
+            await client.close()
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return ttfts
+
+
+def report(name: str, ttfts: List[float]):
+    print(f"{name:<10} p50={percentile(ttfts, 50) * 1000:8.1f}ms "
+          f"p95={percentile(ttfts, 95) * 1000:8.1f}ms p99={percentile(ttfts, 99) * 1000:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--ttft", type=float, default=0.02, help="normal time to first token (s)")
+    parser.add_argument("--slow-ttft", type=float, default=1.0, help="tail time to first token (s)")
+    parser.add_argument("--slow-ratio", type=float, default=0.05, help="fraction of slow requests")
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--budget", type=float, default=0.1, help="max extra load from hedges")
+    args = parser.parse_args()
+
+    primary = make_stub(args.ttft, args.slow_ttft, args.slow_ratio, args.tokens)
+    secondary = make_stub(args.ttft, args.slow_ttft, args.slow_ratio, args.tokens)
+    base_url = f"http://127.0.0.1:{primary.server_port}/v1"
+    hedge_url = f"http://127.0.0.1:{secondary.server_port}/v1"
+
+    baseline = asyncio.run(run(base_url, hedge_url, None, args.requests, args.concurrency))
+    report("baseline", baseline)
+
+    policy = HedgePolicy(percentile=95, initial_delay=args.ttft * 5, min_samples=20,
+                         budget=HedgeBudget(ratio=args.budget))
+    hedged = asyncio.run(run(base_url, hedge_url, policy, args.requests, args.concurrency))
+    report("hedged", hedged)
+    print(f"hedges fired={policy.hedges_fired} won={policy.hedges_won} "
+          f"({policy.hedges_fired / args.requests:.1%} extra load)")
+
+    primary.shutdown()
+    secondary.shutdown()
+
+
+if __name__ == "__main__":
+    main()
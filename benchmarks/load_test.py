@@ -0,0 +1,280 @@
+"""
+End-to-end load test: the real app (uvicorn main:app, in its own process) against the local
+mock provider, driven by N concurrent simulated users.
+
+Each user opens a new chat with a message, follows its bot-stream, loads the history and the
+sidebar, sends follow-up turns, then renames the chat and moves it into a folder of their own.
+The run ends with a JSON report (latency percentiles per step, TTFT and full response times,
+requests/s, event-loop lag sampled from /debug/loop, RSS of the app's process tree) meant to be
+kept and diffed between releases.
+
+    python -m benchmarks.load_test --users 50 --chats 4 --ttft 0.2 --tps 80 --output report.json
+    python -m benchmarks.load_test --users 200 --workers 4 --generation-workers 2
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.hedge_bench import percentile
+from LLMConnect.mock_server import MockConfig, MockServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FOLDER_ID_RE = re.compile(r'id="folder-([0-9a-f-]{36})"')
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2),
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(max(values) * 1000, 2),
+    }
+
+
+def tree_rss_mb(pid: int) -> Optional[float]:
+    """Resident memory of a process and all its descendants (Linux /proc), None elsewhere."""
+    try:
+        parents = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+                except (OSError, IndexError, ValueError):
+                    continue
+        pids, frontier = {pid}, [pid]
+        while frontier:
+            children = [p for p, ppid in parents.items() if ppid == frontier[-1]]
+            frontier.pop()
+            pids.update(children)
+            frontier.extend(children)
+        total_kb = 0
+        for p in pids:
+            try:
+                with open(f"/proc/{p}/status") as f:
+                    total_kb += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+            except (OSError, StopIteration):
+                continue
+        return round(total_kb / 1024, 1)
+    except OSError:
+        return None
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.requests = 0
+
+    async def call(self, client: httpx.AsyncClient, step: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        self.requests += 1
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[step] += 1
+            return None
+        self.latencies[step].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[step] += 1
+            return None
+        return response
+
+
+async def follow_stream(client: httpx.AsyncClient, recorder: Recorder, conv_id: str, sent_at: float):
+    """Read a bot-stream to its done event, recording TTFT and full response time from `sent_at`."""
+    recorder.requests += 1
+    first_token = None
+    try:
+        async with client.stream("GET", f"/chat/{conv_id}/bot-stream") as response:
+            event = None
+            async for line in response.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: ") and event == "token" and first_token is None and line != 'data: ""':
+                    first_token = time.perf_counter()
+                    recorder.latencies["ttft"].append(first_token - sent_at)
+                elif line.startswith("data: ") and event == "done":
+                    recorder.latencies["response"].append(time.perf_counter() - sent_at)
+                    return
+                elif event == "error":
+                    break
+    except httpx.HTTPError:
+        pass
+    recorder.errors["bot-stream"] += 1
+
+
+async def simulate_user(client: httpx.AsyncClient, recorder: Recorder, user: int, chats: int, turns: int,
+                        think_time: float):
+    form = {"provider": "mock", "model": "mock-model"}
+    folder_id = None
+    for chat in range(chats):
+        conv_id = "new"
+        for turn in range(turns):
+            sent_at = time.perf_counter()
+            response = await recorder.call(client, "send-message", "POST", f"/chat/{conv_id}/send-message",
+                                           data={**form, "message": f"user {user} chat {chat} turn {turn}: explain"})
+            if response is None:
+                return
+            if conv_id == "new":
+                conv_id = response.headers["HX-Push-Url"].rsplit("/", 1)[-1]
+            await follow_stream(client, recorder, conv_id, sent_at)
+            await recorder.call(client, "history", "GET", f"/chat/{conv_id}/history")
+            await recorder.call(client, "sidebar", "GET", "/sidebar", params={"current_id": conv_id})
+            await asyncio.sleep(think_time)
+
+        await recorder.call(client, "rename", "PATCH", f"/chat/{conv_id}/rename", json={"title": f"Load test {user}-{chat}"})
+        if folder_id is None:
+            response = await recorder.call(client, "create-folder", "POST", "/folders", json={"name": f"Load {user}"})
+            match = FOLDER_ID_RE.search(response.text) if response is not None else None
+            folder_id = match.group(1) if match else None
+        if folder_id is not None:
+            await recorder.call(client, "move", "PATCH", f"/chat/{conv_id}/folder", json={"folder_id": folder_id})
+
+
+async def sample_server(base_url: str, pid: int, samples: Dict[str, list], stop: asyncio.Event, interval: float = 0.5):
+    async with httpx.AsyncClient(base_url=base_url, timeout=10) as client:
+        while not stop.is_set():
+            try:
+                report = (await client.get("/debug/loop")).json()
+                samples["loop_lag_ms"].append(report["lag_ms"])
+                samples["stalls"] = len(report["stalls"])
+            except (httpx.HTTPError, ValueError, KeyError):
+                pass
+            rss = tree_rss_mb(pid)
+            if rss is not None:
+                samples["rss_mb"].append(rss)
+            try:
+                await asyncio.wait_for(stop.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def run_load(base_url: str, pid: int, args) -> dict:
+    recorder = Recorder()
+    samples: Dict[str, list] = {"loop_lag_ms": [], "rss_mb": []}
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_server(base_url, pid, samples, stop))
+    rss_start = tree_rss_mb(pid)
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(simulate_user(client, recorder, user, args.chats, args.turns, args.think_time)
+                               for user in range(args.users)))
+        duration = time.perf_counter() - start
+    stop.set()
+    await sampler
+
+    lag = samples["loop_lag_ms"]
+    rss = samples["rss_mb"]
+    return {
+        "duration_s": round(duration, 3),
+        "requests": recorder.requests,
+        "requests_per_s": round(recorder.requests / duration, 2),
+        "ttft": summarize(recorder.latencies.pop("ttft", [])),
+        "response": summarize(recorder.latencies.pop("response", [])),
+        "steps": {step: summarize(values) for step, values in sorted(recorder.latencies.items())},
+        "errors": dict(recorder.errors),
+        "loop_lag_ms": {"mean": round(sum(lag) / len(lag), 2), "max": max(lag)} if lag else None,
+        "loop_stalls": samples.get("stalls"),
+        "rss_mb": {"start": rss_start, "peak": max(rss), "end": rss[-1]} if rss else None,
+    }
+
+
+def start_app(args, workdir: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["STATE_BACKEND"] = f"json:{os.path.join(workdir, 'db.json')}"  # Never touch the real db.json
+    env["HFC_ENABLE_MOCK"] = "1"  # The "mock" provider is off by default
+    if args.workers > 1:
+        env["STATE_BACKEND"] = f"sqlite:{os.path.join(workdir, 'db.sqlite3')}"
+        env["STREAM_RELAY"] = f"unix:{os.path.join(workdir, 'relay.sock')}"
+    if args.generation_workers:
+        env["GENERATION_WORKERS"] = str(args.generation_workers)
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning",
+               "--workers", str(args.workers)]
+    return subprocess.Popen(command, cwd=REPO_ROOT, env=env)
+
+
+def wait_ready(base_url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/debug/loop", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("App did not become ready")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--chats", type=int, default=2, help="chats opened by each user")
+    parser.add_argument("--turns", type=int, default=2, help="messages sent per chat")
+    parser.add_argument("--think-time", type=float, default=0.0, help="pause between a user's turns (s)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request client timeout (s)")
+    parser.add_argument("--port", type=int, default=8311, help="port for the app under test")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (>1 uses SQLite state + relay)")
+    parser.add_argument("--generation-workers", type=int, default=0)
+    parser.add_argument("--ttft", type=float, default=0.2, help="mock provider time to first token (s)")
+    parser.add_argument("--tps", type=float, default=80.0, help="mock provider tokens per second")
+    parser.add_argument("--tokens", type=int, default=150, help="mock provider tokens per reply")
+    parser.add_argument("--external-mock", action="store_true",
+                        help="use a mock provider already running on the configured port")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+
+    mock = None
+    if not args.external_mock:
+        mock = MockServer(port=8399, config=MockConfig(ttft=args.ttft, tps=args.tps, tokens=args.tokens)).start()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as workdir:
+        app = start_app(args, workdir)
+        try:
+            wait_ready(base_url, app)
+            results = asyncio.run(run_load(base_url, app.pid, args))
+        finally:
+            app.terminate()
+            app.wait(10)
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "python": sys.version.split()[0],
+        **results,
+        "mock_provider": mock.stats.counts if mock is not None else None,
+    }
+    if mock is not None:
+        mock.shutdown()
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    print(f"users={args.users} requests/s={report['requests_per_s']} "
+          f"ttft p50={report['ttft'].get('p50_ms')}ms p99={report['ttft'].get('p99_ms')}ms "
+          f"response p50={report['response'].get('p50_ms')}ms p99={report['response'].get('p99_ms')}ms "
+          f"errors={sum(report['errors'].values())}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+"""
+Microbenchmarks of the hot paths, with stored baselines and a regression gate.
+
+Covered: LLMConnect's SSE chunk parsing and framing loop, request preparation on large histories,
+state persistence (JSON and SQLite backends) and the sidebar index at 1k/10k/100k conversations,
+the /sidebar endpoint, and rendering of chat_history_list.html. Datasets are synthetic and seeded,
+so two runs measure the same work. `--cassette` adds the SSE pipeline replayed on recorded
+provider streams (see LLMConnect.cassettes).
+
+    python -m benchmarks.micro                                   # run and print
+    python -m benchmarks.micro --save benchmarks/baselines/micro.json
+    python -m benchmarks.micro --compare benchmarks/baselines/micro.json --threshold 15
+    python -m benchmarks.micro --filter llm. --cassette groq.jsonl.gz
+
+With --compare the exit status is 1 when any benchmark's median got slower than the baseline by
+more than --threshold percent. Baselines are machine-specific: compare against one saved on the
+same hardware (CI runner class), not across machines.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from LLMConnect.base import RequestExecutor
+from LLMConnect.cassettes import Cassette, ReplayExecutor, iter_streams
+from LLMConnect.models import HTTPRequest
+from LLMConnect.top import APIExecutor
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut "
+         "labore et dolore magna aliqua python async stream token render sidebar history").split()
+
+BENCHMARKS: List[Tuple[str, Callable[[], Callable[[], None]]]] = []
+
+
+def benchmark(name: str):
+    """Register a setup function returning the callable to time (setup cost is not measured)."""
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+# --- Synthetic datasets ---
+
+def make_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def make_chats(n: int, messages: int = 4, seed: int = 0) -> Dict[str, dict]:
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    chats = {}
+    for i in range(n):
+        conv_id = f"{i:08d}-0000-4000-8000-{rng.getrandbits(48):012x}"
+        created = start + timedelta(minutes=i)
+        chats[conv_id] = {
+            "id": conv_id,
+            "title": make_text(rng, 5),
+            "provider": "mock",
+            "model": "mock-model",
+            "messages": [{"role": "system", "content": "You are a helpful assistant."}] + [
+                {"role": "user" if j % 2 == 0 else "assistant", "content": make_text(rng, rng.randint(10, 80)),
+                 **({"status": "complete"} if j % 2 else {})}
+                for j in range(messages)
+            ],
+            "timestamp": created.isoformat(),
+            "updated_at": (created + timedelta(minutes=rng.randint(0, 10_000))).isoformat(),
+            "folder_id": None if rng.random() < 0.8 else f"folder-{rng.randint(0, 9)}",
+            "is_pinned": rng.random() < 0.01,
+        }
+    return chats
+
+
+def make_folders(n: int = 10) -> Dict[str, dict]:
+    return {f"folder-{i}": {"id": f"folder-{i}", "name": f"Folder {i}", "created_at": "2025-01-01T00:00:00",
+                            "updated_at": "2025-01-01T00:00:00", "color": None, "icon": "folder", "sort_order": i}
+            for i in range(n)}
+
+
+def make_history(n: int, seed: int = 0) -> List[dict]:
+    rng = random.Random(seed)
+    history = [{"role": "system", "content": "You are a helpful assistant."}]
+    for j in range(n):
+        content = make_text(rng, rng.randint(50, 400))
+        if j % 2 and j % 6 == 1:
+            content += "\n\n```python\ndef f(x):\n    return [i * x for i in range(10)]\n```\n"
+        history.append({"role": "user" if j % 2 == 0 else "assistant", "content": content})
+    return history
+
+
+def sse_body(events: int, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    lines = []
+    for i in range(events):
+        chunk = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": 0, "model": "mock-model",
+                 "choices": [{"index": 0, "delta": {"content": rng.choice(WORDS) + " "}, "finish_reason": None}]}
+        lines.append(f"data: {json.dumps(chunk)}\n\n")
+    lines.append("data: [DONE]\n\n")
+    return "".join(lines).encode()
+
+
+# --- LLMConnect ---
+
+def _executor() -> APIExecutor:
+    return APIExecutor(api_key="bench", base_url="http://127.0.0.1:1/v1", model="mock-model")
+
+
+@benchmark("llm.parse_streaming_chunk[1 event]")
+def bench_parse_one():
+    executor = _executor()
+    line = sse_body(1).split(b"\n\n")[0] + b"\n"
+    return lambda: executor.parse_streaming_chunk(line)
+
+
+@benchmark("llm.parse_streaming_chunk[8 events]")
+def bench_parse_batch():
+    executor = _executor()
+    chunk = b"\n\n".join(sse_body(8).split(b"\n\n")[:8]) + b"\n\n"
+    return lambda: executor.parse_streaming_chunk(chunk)
+
+
+class _FakeSSEResponse:
+    """Just what the streaming loop reads from an http.client response."""
+    status = 200
+    headers = {"content-type": "text/event-stream"}
+
+    def __init__(self, body: bytes):
+        self._body = io.BytesIO(body)
+
+    def read1(self, n: int) -> bytes:
+        return self._body.read1(n)
+
+    def read(self, n: int = -1) -> bytes:
+        return self._body.read(n)
+
+    def isclosed(self) -> bool:
+        return self._body.tell() == len(self._body.getbuffer())
+
+
+class _ReplayExecutor(RequestExecutor):
+    """RequestExecutor whose socket I/O is replaced by an in-memory SSE body."""
+    body = b""
+
+    def _send_request(self, conn, request, path):
+        return _FakeSSEResponse(self.body)
+
+
+@benchmark("llm.sse_framing[500 events]")
+def bench_sse_framing():
+    executor = _ReplayExecutor()
+    executor.body = sse_body(500)
+    api = _executor()
+    loop = asyncio.new_event_loop()
+
+    async def consume():
+        request = HTTPRequest("POST", "http://127.0.0.1:1/v1/chat/completions")
+        async for chunk in executor._execute_single_streaming_request(request, 8192):
+            api.parse_streaming_chunk(chunk)
+
+    return lambda: loop.run_until_complete(consume())
+
+
+def _bench_prepare(messages: int):
+    executor = _executor()
+    history = make_history(messages)
+
+    def run():
+        data = executor.prepare_request_data(history, stream=True)
+        executor.get_request_config(data)
+    return run
+
+
+for _messages in (200, 2000):
+    benchmark(f"llm.prepare_request[{_messages} msgs]")(lambda m=_messages: _bench_prepare(m))
+
+
+def register_cassette(path: str):
+    """Framing + parsing of every recorded SSE stream of a cassette, replayed as fast as possible."""
+    cassette = Cassette.load(path)
+    streams = list(iter_streams(cassette))
+    if not streams:
+        raise SystemExit(f"No successful SSE stream recorded in {path}")
+
+    def setup():
+        executor = ReplayExecutor(Cassette(streams), speed=None, match="url")
+        api = _executor()
+        loop = asyncio.new_event_loop()
+
+        async def consume():
+            for stream in streams:
+                request = HTTPRequest(stream["method"], stream["url"])
+                async for chunk in executor._execute_single_streaming_request(request, 8192):
+                    api.parse_streaming_chunk(chunk)
+
+        return lambda: loop.run_until_complete(consume())
+
+    benchmark(f"llm.sse_replay[{os.path.basename(path)}, {len(streams)} streams]")(setup)
+
+
+# --- State persistence and sidebar (sizes registered in main()) ---
+
+def register_sized(sizes: List[int]):
+    from storage import JSONStateBackend, SQLiteStateBackend
+    from chat_index import ChatIndex
+
+    datasets: Dict[int, Dict[str, dict]] = {}
+
+    def dataset(n: int) -> Dict[str, dict]:
+        if n not in datasets:
+            datasets.clear()  # Keep one size in memory at a time
+            datasets[n] = make_chats(n)
+        return datasets[n]
+
+    workdir = tempfile.mkdtemp(prefix="microbench-")
+
+    for n in sizes:
+        def json_write(n=n):
+            backend = JSONStateBackend(os.path.join(workdir, f"db-{n}.json"))
+            chats, folders = dataset(n), make_folders()
+            return lambda: backend.flush(chats, folders)
+
+        def json_read(n=n):
+            backend = JSONStateBackend(os.path.join(workdir, f"db-{n}.json"))
+            backend.flush(dataset(n), make_folders())
+            return backend.load
+
+        def sqlite_flush_one(n=n):
+            path = os.path.join(workdir, f"db-{n}.sqlite3")
+            backend = SQLiteStateBackend(path, import_json=None)
+            chats, folders = dataset(n), make_folders()
+            if not backend.load()[0]:
+                for conv_id in chats:
+                    backend.mark_dirty(conv_id)
+                backend.flush(chats, folders)
+            conv_id = next(iter(chats))
+
+            def run():
+                backend.mark_dirty(conv_id)
+                backend.flush(chats, folders)
+            return run
+
+        def sqlite_load(n=n):
+            path = os.path.join(workdir, f"db-{n}.sqlite3")
+            backend = SQLiteStateBackend(path, import_json=None)
+            chats = dataset(n)
+            if not backend.load()[0]:
+                for conv_id in chats:
+                    backend.mark_dirty(conv_id)
+                backend.flush(chats, make_folders())
+            return lambda: SQLiteStateBackend(path, import_json=None).load()
+
+        def index_rebuild(n=n):
+            chats = dataset(n)
+            return lambda: ChatIndex().rebuild(chats)
+
+        def index_page(n=n):
+            index = ChatIndex()
+            index.rebuild(dataset(n))
+            return lambda: index.page(None, 50)
+
+        def sidebar_http(n=n):
+            app_module = _app_module()
+            app_module.chats.clear()
+            app_module.chats.update(dataset(n))
+            app_module.folders.clear()
+            app_module.folders.update(make_folders())
+            app_module.chat_index.rebuild(app_module.chats)
+            from fastapi.testclient import TestClient
+            client = TestClient(app_module.app)
+            return lambda: client.get("/sidebar")
+
+        benchmark(f"db.json.write[{n}]")(json_write)
+        benchmark(f"db.json.read[{n}]")(json_read)
+        benchmark(f"db.sqlite.flush_one[{n}]")(sqlite_flush_one)
+        benchmark(f"db.sqlite.load[{n}]")(sqlite_load)
+        benchmark(f"sidebar.index_rebuild[{n}]")(index_rebuild)
+        benchmark(f"sidebar.index_page[{n}]")(index_page)
+        benchmark(f"sidebar.http[{n}]")(sidebar_http)
+
+
+_app = None
+
+def _app_module():
+    """main.py, imported with its state redirected to a scratch file."""
+    global _app
+    if _app is None:
+        os.environ["STATE_BACKEND"] = f"json:{os.path.join(tempfile.mkdtemp(prefix='microbench-'), 'db.json')}"
+        import main
+        main.write_db_to_disk = lambda: None
+        _app = main
+    return _app
+
+
+def _bench_history_render(warm: bool):
+    app_module = _app_module()
+    import rendering
+    template = app_module.templates.get_template("chat_history_list.html")
+    messages = [m for m in make_history(30, seed=1) if m["role"] != "system"]
+    for m in messages:
+        if m["role"] == "assistant":
+            m["status"] = "complete"
+            if warm:
+                rendering.rendered_message(m)
+
+    def run():
+        if not warm:
+            for m in messages:
+                m.pop("rendered", None)
+        template.render({"request": None, "history": messages, "history_offset": 0, "conversation_id": "bench"})
+    return run
+
+
+benchmark("render.chat_history_list[30 msgs, cached]")(lambda: _bench_history_render(True))
+benchmark("render.chat_history_list[30 msgs, cold]")(lambda: _bench_history_render(False))
+
+
+# --- Runner ---
+
+def measure(fn: Callable[[], None], repeat: int, min_time: float) -> Dict[str, float]:
+    """Per-call seconds: calls per round calibrated to take >= min_time, then `repeat` rounds."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.1))
+    rounds = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - start) / number)
+    return {"median_s": statistics.median(rounds), "min_s": min(rounds), "calls": number}
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    regressions = []
+    print(f"\n{'benchmark':<48} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<48} {'-':>12} {format_time(result['median_s']):>12} {'new':>8}")
+            continue
+        before, after = baseline[name]["median_s"], result["median_s"]
+        change = (after / before - 1) * 100
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<48} {format_time(before):>12} {format_time(after):>12} {change:>+7.1f}%{flag}")
+    return regressions
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="conversation counts for state/sidebar benchmarks")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5, help="timed rounds per benchmark (median is kept)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum duration of a round (s)")
+    parser.add_argument("--save", help="write results as a baseline file")
+    parser.add_argument("--compare", help="baseline file to compare against")
+    parser.add_argument("--threshold", type=float, default=15.0, help="allowed slowdown in percent")
+    parser.add_argument("--cassette", action="append", default=[],
+                        help="also benchmark SSE framing/parsing on the streams recorded in this cassette")
+    args = parser.parse_args()
+
+    register_sized([int(n) for n in args.sizes.split(",") if n])
+    for path in args.cassette:
+        register_cassette(path)
+    results: Dict[str, dict] = {}
+    for name, setup in BENCHMARKS:
+        if args.filter and args.filter not in name:
+            continue
+        fn = setup()
+        results[name] = measure(fn, args.repeat, args.min_time)
+        print(f"{name:<48} {format_time(results[name]['median_s']):>12}  (x{results[name]['calls']})", file=sys.stderr)
+
+    report = {
+        "meta": {"python": sys.version.split()[0], "platform": platform.platform(), "machine": platform.machine(),
+                 "cpus": os.cpu_count(), "date": datetime.now().isoformat(timespec="seconds")},
+        "results": results,
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:g}%: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\nNo regression above {args.threshold:g}%")
+    elif not args.save:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+In-memory indexes over the `chats` dict so sidebar queries don't scan every chat.
+
+Chats are bucketed by folder (None = Recent). Each bucket keeps its members ordered by
+(pinned, updated_at, id), so listing the newest N chats of a folder costs O(N) and counts are O(1).
+Listing walks that order backwards: pinned chats first, then most recently updated. Pages are
+addressed by keyset cursors (the key of the last item served), which stay valid while chats move.
+The index is updated incrementally: every mutation of a chat's folder, pin or updated_at must be
+followed by `upsert`, every deletion by `remove`.
+"""
+
+import base64
+import json
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+RecencyKey = Tuple[int, str, str]  # (pinned, updated_at ISO string, conv_id)
+
+
+def recency_key(conv_id: str, chat: dict) -> RecencyKey:
+    # ISO-8601 strings sort chronologically; older chats may only have a creation timestamp
+    return (1 if chat.get("is_pinned") else 0, chat.get("updated_at") or chat.get("timestamp") or "", conv_id)
+
+
+def encode_cursor(key: RecencyKey) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[RecencyKey]:
+    """Inverse of encode_cursor; None for a missing or malformed cursor (= first page)."""
+    if not cursor:
+        return None
+    try:
+        pinned, updated_at, conv_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return (int(pinned), str(updated_at), str(conv_id))
+    except (ValueError, TypeError):
+        return None
+
+
+class ChatIndex:
+    """Folder -> chats membership and per-folder recency order."""
+
+    def __init__(self):
+        self._keys: Dict[str, RecencyKey] = {}
+        self._folder_of: Dict[str, Optional[str]] = {}
+        self._buckets: Dict[Optional[str], List[RecencyKey]] = {}  # Sorted oldest -> newest
+
+    def rebuild(self, chats: Dict[str, dict]):
+        self._keys.clear()
+        self._folder_of.clear()
+        self._buckets.clear()
+        for conv_id, chat in chats.items():
+            key = recency_key(conv_id, chat)
+            folder_id = chat.get("folder_id")
+            self._keys[conv_id] = key
+            self._folder_of[conv_id] = folder_id
+            self._buckets.setdefault(folder_id, []).append(key)
+        for bucket in self._buckets.values():
+            bucket.sort()
+
+    def upsert(self, conv_id: str, chat: dict):
+        """Index a new chat or re-position one whose folder or updated_at changed."""
+        key = recency_key(conv_id, chat)
+        folder_id = chat.get("folder_id")
+        if self._keys.get(conv_id) == key and self._folder_of.get(conv_id) == folder_id:
+            return
+        self.remove(conv_id)
+        self._keys[conv_id] = key
+        self._folder_of[conv_id] = folder_id
+        insort(self._buckets.setdefault(folder_id, []), key)
+
+    def remove(self, conv_id: str):
+        key = self._keys.pop(conv_id, None)
+        if key is None:
+            return
+        folder_id = self._folder_of.pop(conv_id)
+        bucket = self._buckets[folder_id]
+        del bucket[bisect_left(bucket, key)]
+        if not bucket:
+            del self._buckets[folder_id]
+
+    def __contains__(self, conv_id: str) -> bool:
+        return conv_id in self._keys
+
+    def folder_of(self, conv_id: str) -> Optional[str]:
+        return self._folder_of.get(conv_id)
+
+    def count(self, folder_id: Optional[str]) -> int:
+        return len(self._buckets.get(folder_id, ()))
+
+    def counts(self) -> Dict[Optional[str], int]:
+        return {folder_id: len(bucket) for folder_id, bucket in self._buckets.items()}
+
+    def recent(self, folder_id: Optional[str] = None, limit: Optional[int] = None) -> List[str]:
+        """Chat ids of a folder (None = Recent), pinned then most recently updated first. Returns a copy."""
+        return self.page(folder_id, limit)[0]
+
+    def page(self, folder_id: Optional[str] = None, limit: Optional[int] = None,
+             after: Optional[RecencyKey] = None) -> Tuple[List[str], Optional[RecencyKey]]:
+        """
+        Up to `limit` chat ids following the `after` cursor, in listing order,
+        plus the cursor of the next page (None when this one is the last).
+        """
+        bucket = self._buckets.get(folder_id, [])
+        end = len(bucket) if after is None else bisect_left(bucket, after)
+        start = 0 if limit is None else max(0, end - limit)
+        ids = [key[2] for key in reversed(bucket[start:end])]
+        return ids, (bucket[start] if start > 0 else None)
@@ -0,0 +1,54 @@
+"""
+Emission policy for token SSE streams: when the text generated so far becomes an event.
+
+Providers send tiny deltas (a word, sometimes a character or two), and every event costs a send,
+a compression flush and, in the browser, a markdown re-render of the whole message. A
+`Coalescer` per SSE connection batches them:
+
+- The first text of a stream goes out at once, so time to first token is unchanged. The end of
+  the stream is always flushed: the callers emit the final content unconditionally.
+- After that, pending text waits for the current window to elapse, or goes out as soon as it
+  reaches `max_bytes`.
+- The window starts at `min_interval` and grows with the size of the message (the client
+  re-renders all of it on every event, at roughly `render_bytes_per_second`) and with
+  backpressure: how long the previous events took to be accepted by the transport, which is
+  what a slow client or a full socket buffer looks like from here. It never exceeds `max_interval`.
+
+Sizes are in characters of text, a close enough stand-in for bytes.
+"""
+
+import time
+from typing import Optional
+
+
+class Coalescer:
+    def __init__(self, min_interval: float = 0.05, max_interval: float = 0.25, max_bytes: int = 2048,
+                 render_bytes_per_second: float = 200_000):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_bytes = max_bytes
+        self.render_bytes_per_second = render_bytes_per_second
+        self.events = 0
+        self.emitted_size = 0
+        self.send_time = 0.0  # Moving average of how long an event took to send
+        self._last_emit: Optional[float] = None
+
+    def window(self, size: int) -> float:
+        """Minimum time between two events for a message of `size` characters."""
+        window = self.min_interval + size / self.render_bytes_per_second + 2 * self.send_time
+        return min(window, self.max_interval)
+
+    def delay(self, size: int, now: Optional[float] = None) -> float:
+        """Seconds until text that changed and is now `size` long should be emitted (0: now)."""
+        if self._last_emit is None or size - self.emitted_size >= self.max_bytes:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        return max(0.0, self._last_emit + self.window(size) - now)
+
+    def emitted(self, size: int, started: float):
+        """Record an event of `size` characters whose send started at `started` and just returned."""
+        now = time.monotonic()
+        self.send_time = 0.8 * self.send_time + 0.2 * (now - started)
+        self._last_emit = now
+        self.emitted_size = size
+        self.events += 1
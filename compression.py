@@ -0,0 +1,193 @@
+"""
+Response compression as a pure ASGI middleware (gzip, and brotli when the package is installed).
+
+- Regular responses are compressed in one go when they are at least `minimum_size` bytes and
+  of a compressible type; smaller ones are sent as they are.
+- Server-sent events are compressed as a stream: every body chunk (one SSE event) is followed by
+  a sync flush, so the browser can decode each event as soon as it arrives. The compressor keeps
+  its window across events, which matters here since every token event repeats the text so far.
+- Responses that already carry a Content-Encoding, and bodiless ones (304, 204, HEAD), pass through.
+- A compressed response's ETag is weakened (W/"..."), as it no longer identifies the exact bytes;
+  a 304 to a client revalidating that weak tag carries it in the same form.
+- Every response that could have been compressed (a compressible type, or a 304) carries
+  `Vary: Accept-Encoding`, whether or not this one was, so shared caches keep the variants apart.
+"""
+
+import zlib
+from typing import List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # Optional dependency
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick "br" or "gzip" from an Accept-Encoding header (honouring q=0), None if neither."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", accepted.get("*", 0)) > 0:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    """Uniform wrapper over zlib (gzip container) and brotli streaming compressors."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._gz = zlib.compressobj(gzip_level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        if self.encoding == "br":
+            out = self._br.process(data)
+            return out + self._br.flush() if flush else out
+        out = self._gz.compress(data)
+        return out + self._gz.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._br.finish()
+        return self._gz.flush(zlib.Z_FINISH)
+
+
+def _header(headers: List[Tuple[bytes, bytes]], name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _vary_on_encoding(headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    vary = _header(headers, b"vary")
+    if vary is None:
+        return headers + [(b"vary", b"Accept-Encoding")]
+    if b"accept-encoding" in vary.lower() or vary.strip() == b"*":
+        return headers
+    return [(k, v + b", Accept-Encoding" if k.lower() == b"vary" else v) for k, v in headers]
+
+
+def _varies(message) -> bool:
+    """Whether a response's representation depends on Accept-Encoding here."""
+    headers = message.get("headers", [])
+    if message["status"] == 304:
+        return True
+    content_type = (_header(headers, b"content-type") or b"").decode("latin-1").lower()
+    return (message["status"] != 204 and _header(headers, b"content-encoding") is None
+            and content_type.startswith(COMPRESSIBLE_TYPES))
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 500, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            return await self.app(scope, receive, send)
+
+        request_headers = dict(scope["headers"])
+        encoding = choose_encoding(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            async def send_identity(message):
+                if message["type"] == "http.response.start" and _varies(message):
+                    message = {**message, "headers": _vary_on_encoding(list(message.get("headers", [])))}
+                await send(message)
+            return await self.app(scope, receive, send_identity)
+
+        if_none_match = request_headers.get(b"if-none-match", b"")
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        streaming = False
+        passthrough = False
+
+        def compressed_start(headers: List[Tuple[bytes, bytes]], content_length: Optional[int]):
+            etag = _header(headers, b"etag")
+            headers = [(k, v) for k, v in headers if k.lower() not in (b"content-length", b"etag")]
+            if etag is not None:
+                headers.append((b"etag", etag if etag.startswith(b"W/") else b"W/" + etag))
+            headers.append((b"content-encoding", encoding.encode()))
+            if content_length is not None:
+                headers.append((b"content-length", str(content_length).encode()))
+            return {**start_message, "headers": headers}
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, streaming, passthrough
+
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                content_type = (_header(headers, b"content-type") or b"").decode("latin-1").lower()
+                varies = _varies(message)
+                if varies:
+                    headers = _vary_on_encoding(headers)
+                if message["status"] == 304:
+                    # Answer with the ETag as the client holds it: weakened, if it got the compressed body
+                    etag = _header(headers, b"etag")
+                    if etag is not None and not etag.startswith(b"W/") and b"W/" + etag in if_none_match:
+                        headers = [(k, b"W/" + v if k.lower() == b"etag" else v) for k, v in headers]
+                if not varies or message["status"] == 304:
+                    passthrough = True
+                    await send({**message, "headers": headers})
+                    return
+                start_message = {**message, "headers": headers}
+                if content_type.startswith("text/event-stream"):
+                    # Events must reach the client right away: headers now, a sync flush per event
+                    streaming = True
+                    compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                    await send(compressed_start(headers, None))
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if streaming:
+                chunk = compressor.compress(body, flush=True) if body else b""
+                if not more_body:
+                    chunk += compressor.finish()
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                return
+
+            if compressor is None:
+                if not more_body:
+                    # Whole body in a single message: compress it only if it's worth it
+                    if len(body) < self.minimum_size:
+                        await send(start_message)
+                        await send(message)
+                        return
+                    whole = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                    compressed = whole.compress(body) + whole.finish()
+                    await send(compressed_start(start_message["headers"], len(compressed)))
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                # A streamed non-SSE body: compress as it comes, flushing only at the end
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                await send(compressed_start(start_message["headers"], None))
+
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
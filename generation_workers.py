@@ -0,0 +1,356 @@
+"""
+LLM clients for generations, optionally run in dedicated worker processes.
+
+By default generations use the shared clients of `get_client` on the web process's event loop.
+With GENERATION_WORKERS=N, a pool of N processes owns the LLMConnect clients instead: upstream
+streaming, SSE parsing and JSON decoding happen there, and only the text deltas come back to the
+web process. `GenerationPool.open` returns a `RemoteClient` with the same `stream(messages)`
+surface as an AsyncAPIClient (plus `close()` to release the job), so the generation code does not change.
+
+Protocol (tuples, over a job queue and a result pipe per worker):
+
+    web -> worker: ("open", job_id, provider, model, attributes), ("chat", job_id, history), ("close", job_id), None = exit
+    worker -> web: (job_id, "ready") | (job_id, "delta", text) | (job_id, "end") | (job_id, "error", message)
+                   | (None, "metrics", registry snapshot)
+
+Jobs go to the worker with the fewest open jobs. A worker that dies fails its jobs and is replaced:
+the web process holds no write end of a worker's result pipe, so the worker's exit shows up there
+as end-of-file, however busy the other workers are (a shared queue could be left locked by it).
+Hedge policies and streaming metrics live in whichever process runs the clients. Workers send a
+snapshot of their metrics registry when it changed, at most every WORKER_METRICS_SECONDS, and
+`GenerationPool.metrics_snapshots()` hands them (plus what replaced workers had counted) to /metrics.
+"""
+
+import asyncio
+import contextlib
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import uuid
+from typing import AsyncIterator, Dict, List, Optional
+
+from LLMConnect.api_client_factory import APIClientFactory, Provider
+from LLMConnect.base import ConnectionPool
+from LLMConnect.cassettes import Cassette, CassetteRecorder, ReplayHTTPClient
+from LLMConnect.hedging import HedgePolicy
+from LLMConnect.metrics import REGISTRY, MetricsRegistry, Snapshot
+from LLMConnect.top import AsyncAPIClient
+from LLMConnect.middlewares import UserAgentMiddleware, LoggingMiddleware, StreamingMetricsMiddleware
+from LLMConnect.top import user_agent
+from LLMConnect.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+WORKER_METRICS_SECONDS = float(os.getenv("WORKER_METRICS_SECONDS", "1"))
+
+# Opt-in hedged streaming: race a slow first token against the provider's `hedge_targets`.
+# Policies live per provider/model so the TTFT window and hedge budget outlive each client.
+HEDGE_STREAMING = os.getenv("HEDGE_STREAMING", "0") == "1"
+hedge_policies: Dict[str, HedgePolicy] = {}
+
+# Shared by every client so TTFT / tokens-per-second stats cover all generations.
+# (No AuthenticationMiddleware needed: the executor already sets the Authorization header.)
+stream_metrics = StreamingMetricsMiddleware()
+
+
+# LLM_RECORD_CASSETTE=path appends every upstream exchange to a cassette; LLM_REPLAY_CASSETTE=path
+# answers from one instead of the providers (matched by URL, at the recorded pace), see LLMConnect.cassettes
+LLM_RECORD_CASSETTE = os.getenv("LLM_RECORD_CASSETTE")
+LLM_REPLAY_CASSETTE = os.getenv("LLM_REPLAY_CASSETTE")
+cassette_recorder = CassetteRecorder(LLM_RECORD_CASSETTE) if LLM_RECORD_CASSETTE else None
+replay_cassette = Cassette.load(LLM_REPLAY_CASSETTE) if LLM_REPLAY_CASSETTE else None
+
+
+def llm_middleware():
+    middleware = [UserAgentMiddleware(user_agent), LoggingMiddleware(), stream_metrics]
+    if cassette_recorder is not None:
+        middleware.append(cassette_recorder)
+    return middleware
+
+
+# One client per provider/model, shared by every generation of the process: the stateless
+# `stream` API takes the history per call. All of them share one connection pool (keyed by host),
+# so two models of a provider, e.g. in a compare turn, reuse the same warm connections.
+clients: Dict[str, AsyncAPIClient] = {}
+connection_pool = ConnectionPool(max_connections_per_host=64)
+
+
+def get_client(provider_name: str, model_name: Optional[str]) -> AsyncAPIClient:
+    key = f"{provider_name}:{model_name}"
+    client = clients.get(key)
+    if client is None:
+        client = clients[key] = create_client(provider_name, model_name)
+    return client
+
+
+async def close_clients():
+    while clients:
+        _, client = clients.popitem()
+        await client.close()
+    connection_pool.close_all()
+
+
+def create_client(provider_name: str, model_name: Optional[str]) -> AsyncAPIClient:
+    hedge_policy = None
+    if HEDGE_STREAMING:
+        key = f"{provider_name}:{model_name}"
+        hedge_policy = hedge_policies.get(key)
+        if hedge_policy is None:
+            hedge_policy = hedge_policies[key] = HedgePolicy(name=key)
+    kwargs = {}
+    if replay_cassette is not None:
+        kwargs["http_client"] = ReplayHTTPClient(replay_cassette, match="url", middleware=llm_middleware())
+    return APIClientFactory.create_async_client(
+        provider=Provider(provider_name),
+        model=model_name,
+        hedge_policy=hedge_policy,
+        middleware=llm_middleware(),
+        connection_pool=connection_pool,
+        **kwargs
+    )
+
+
+class RemoteGenerationError(Exception):
+    """An error raised in a generation worker, carried back as its message."""
+
+
+# --- Worker process ---
+
+class _Worker:
+    def __init__(self, jobs: multiprocessing.Queue, results: multiprocessing.connection.Connection):
+        self.jobs = jobs
+        self.results = results
+        self.clients: Dict[str, AsyncAPIClient] = {}
+        self.attributes: Dict[str, dict] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    async def run(self):
+        tracer.configure(os.getenv("TRACE_EXPORT"))
+        loop = asyncio.get_running_loop()
+        exiting = asyncio.Event()
+        threading.Thread(target=self._read_jobs, args=(loop, exiting), name="generation-jobs", daemon=True).start()
+        pusher = asyncio.create_task(self._push_metrics())
+        await exiting.wait()
+        pusher.cancel()
+        for job_id in list(self.clients):
+            await self._close(job_id)
+        await close_clients()
+
+    def _read_jobs(self, loop: asyncio.AbstractEventLoop, exiting: asyncio.Event):
+        while True:
+            message = self.jobs.get()
+            if message is None:
+                loop.call_soon_threadsafe(exiting.set)
+                return
+            loop.call_soon_threadsafe(self._handle, message)
+
+    async def _push_metrics(self):
+        sent = None
+        while True:
+            await asyncio.sleep(WORKER_METRICS_SECONDS)
+            snapshot = REGISTRY.snapshot()
+            if snapshot != sent:
+                self.results.send((None, "metrics", snapshot))
+                sent = snapshot
+
+    def _handle(self, message: tuple):
+        op, job_id = message[0], message[1]
+        if op == "open":
+            _, _, provider_name, model_name, attributes = message
+            try:
+                self.clients[job_id] = get_client(provider_name, model_name)
+                self.attributes[job_id] = attributes
+            except Exception as e:
+                self.results.send((job_id, "error", str(e)))
+                return
+            self.results.send((job_id, "ready"))
+        elif op == "chat":
+            self.tasks[job_id] = asyncio.create_task(self._stream(job_id, message[2]))
+        elif op == "close":
+            asyncio.create_task(self._close(job_id))
+
+    async def _stream(self, job_id: str, history: List[dict]):
+        try:
+            with tracer.span("generation.worker", pid=os.getpid(), **self.attributes[job_id]):
+                async for chunk in self.clients[job_id].stream(history):
+                    self.results.send((job_id, "delta", chunk))
+            self.results.send((job_id, "end"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.results.send((job_id, "error", str(e)))
+
+    async def _close(self, job_id: str):
+        task = self.tasks.pop(job_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self.attributes.pop(job_id, None)
+        self.clients.pop(job_id, None)  # Shared, stays open for the next jobs
+
+
+def _worker_main(jobs: multiprocessing.Queue, results: multiprocessing.connection.Connection):
+    asyncio.run(_Worker(jobs, results).run())
+
+
+# --- Web process side ---
+
+class RemoteClient:
+    """Stand-in for an AsyncAPIClient whose requests run in a generation worker."""
+
+    def __init__(self, pool: "GenerationPool", job_id: str, inbox: asyncio.Queue):
+        self._pool = pool
+        self.job_id = job_id
+        self._inbox = inbox
+
+    def stream(self, messages: List[dict]) -> AsyncIterator[str]:
+        self._pool._send(self.job_id, ("chat", self.job_id, messages))
+        return self._deltas()
+
+    async def _deltas(self) -> AsyncIterator[str]:
+        while True:
+            kind, *payload = await self._inbox.get()
+            if kind == "delta":
+                yield payload[0]
+            elif kind == "end":
+                return
+            else:
+                raise RemoteGenerationError(payload[0])
+
+    async def close(self):
+        self._pool._release(self.job_id)
+
+
+class _WorkerHandle:
+    def __init__(self, process, jobs, results):
+        self.process = process
+        self.jobs = jobs
+        self.results = results  # Read end of the worker's result pipe
+        self.job_ids = set()
+        self.exited = False
+        self.metrics: Optional[Snapshot] = None  # Latest registry snapshot the worker sent
+
+
+class GenerationPool:
+    def __init__(self, size: int):
+        self.size = size
+        self._context = multiprocessing.get_context("spawn")  # No forking a process that runs threads and a loop
+        self._wakeup_reader, self._wakeup = self._context.Pipe(duplex=False)  # Workers changed, or stop
+        self._workers: List[_WorkerHandle] = []
+        self._inboxes: Dict[str, asyncio.Queue] = {}
+        self._job_worker: Dict[str, _WorkerHandle] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped = threading.Event()
+        self._reader: Optional[threading.Thread] = None
+        self._retired_metrics = MetricsRegistry()  # Counted by workers that were since replaced
+
+    def start(self):
+        """Spawn the workers and the result reader. Call from the event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._workers = [self._spawn() for _ in range(self.size)]
+        self._reader = threading.Thread(target=self._read_results, name="generation-results", daemon=True)
+        self._reader.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stopped.set()
+        self._wakeup.send_bytes(b"")
+        for worker in self._workers:
+            worker.jobs.put(None)
+        for worker in self._workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.jobs.close()
+        if self._reader is not None:
+            self._reader.join()
+        for worker in self._workers:
+            worker.results.close()
+        self._wakeup.close()
+        self._wakeup_reader.close()
+        # Drop the queues so their semaphores are released now, not reported as leaked at exit
+        self._workers = []
+
+    def _spawn(self) -> _WorkerHandle:
+        jobs = self._context.Queue()
+        results, results_writer = self._context.Pipe(duplex=False)
+        process = self._context.Process(target=_worker_main, args=(jobs, results_writer),
+                                        name="generation-worker", daemon=True)
+        process.start()
+        results_writer.close()  # The worker's copy is the only one left: its exit closes the pipe
+        return _WorkerHandle(process, jobs, results)
+
+    def _read_results(self):
+        while not self._stopped.is_set():
+            readers = {worker.results: worker for worker in list(self._workers) if not worker.exited}
+            for conn in multiprocessing.connection.wait([self._wakeup_reader, *readers]):
+                if conn is self._wakeup_reader:
+                    conn.recv_bytes()
+                    continue
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    worker = readers[conn]
+                    worker.exited = True
+                    conn.close()
+                    if not self._stopped.is_set():
+                        self._loop.call_soon_threadsafe(self._replace_worker, worker)
+                    continue
+                if message[0] is None:
+                    readers[conn].metrics = message[2]
+                    continue
+                self._loop.call_soon_threadsafe(self._dispatch, message)
+
+    def _dispatch(self, message: tuple):
+        inbox = self._inboxes.get(message[0])
+        if inbox is not None:
+            inbox.put_nowait(message[1:])
+
+    def _replace_worker(self, worker: _WorkerHandle):
+        if self._stopped.is_set():
+            return
+        logger.error(f"Generation worker {worker.process.pid} exited ({worker.process.exitcode}), replacing it")
+        for job_id in worker.job_ids:
+            self._dispatch((job_id, "error", "Generation worker exited"))
+        if worker.metrics is not None:
+            # Keep its counts so the totals don't go backwards (minus what it counted since its last push)
+            self._retired_metrics = MetricsRegistry.merged([self._retired_metrics.snapshot(), worker.metrics])
+        self._workers[self._workers.index(worker)] = self._spawn()
+        self._wakeup.send_bytes(b"")  # So the reader waits on the new worker's pipe too
+
+    def metrics_snapshots(self) -> List[Snapshot]:
+        """The workers' latest metrics, to be added to the web process's own."""
+        snapshots = [self._retired_metrics.snapshot()]
+        snapshots.extend(worker.metrics for worker in list(self._workers) if worker.metrics is not None)
+        return snapshots
+
+    def _send(self, job_id: str, message: tuple):
+        self._job_worker[job_id].jobs.put(message)
+
+    def _release(self, job_id: str):
+        worker = self._job_worker.pop(job_id, None)
+        self._inboxes.pop(job_id, None)
+        if worker is not None:
+            worker.job_ids.discard(job_id)
+            worker.jobs.put(("close", job_id))
+
+    async def open(self, provider_name: str, model_name: Optional[str], **attributes) -> RemoteClient:
+        """A client on the least busy worker, once that worker has created it (errors are raised here)."""
+        job_id = uuid.uuid4().hex
+        worker = min(self._workers, key=lambda w: len(w.job_ids))
+        worker.job_ids.add(job_id)
+        inbox = self._inboxes[job_id] = asyncio.Queue()
+        self._job_worker[job_id] = worker
+        worker.jobs.put(("open", job_id, provider_name, model_name, attributes))
+        kind, *payload = await inbox.get()
+        if kind != "ready":
+            self._release(job_id)
+            raise RemoteGenerationError(payload[0])
+        return RemoteClient(self, job_id, inbox)
+
+
+def create_generation_pool(size: Optional[str]) -> Optional[GenerationPool]:
+    size = int(size or 0)
+    return GenerationPool(size) if size > 0 else None
@@ -1,21 +1,136 @@
+import os
+import time
 import uuid
+import hashlib
 import asyncio
+import contextlib
+from contextlib import asynccontextmanager
 
 import json
+import logging
 
+import jinja2
 from fastapi import FastAPI, Request, UploadFile, File, Form, Depends
-from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, PlainTextResponse, Response
 from fastapi.templating import Jinja2Templates
 from typing import Annotated
 
 from fastapi.staticfiles import StaticFiles
-from LLMConnect.api_client_factory import APIClientFactory, Provider
+from LLMConnect.api_client_factory import Provider, provider_enabled
+from LLMConnect.metrics import REGISTRY, MetricsRegistry
+from LLMConnect.tracing import tracer, server_timing, NOOP_SPAN
+from monitoring import LoopMonitor
+from chat_index import ChatIndex, encode_cursor, decode_cursor
+from coalescing import Coalescer
+from compression import CompressionMiddleware
+from search_index import SearchIndex, snippet, TITLE
+from storage import create_state_backend
+from relay import create_stream_relay
+from generation_workers import close_clients, create_generation_pool, get_client
+import rendering
 from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Optional, List, Dict
 
+logger = logging.getLogger(__name__)
+
+# --- Metrics ---
+DB_WRITE_SECONDS = REGISTRY.histogram("app_db_write_seconds", "Duration of write_db_to_disk")
+TEMPLATE_RENDER_SECONDS = REGISTRY.histogram("app_template_render_seconds", "Top-level Jinja render time", ("template",))
+SSE_LAG_SECONDS = REGISTRY.histogram("app_sse_fanout_lag_seconds", "Delay between a token landing in the chat state and its SSE emission")
+
+class TimedTemplate(jinja2.Template):
+    """Records every top-level render (get_template().render() and TemplateResponse alike)."""
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with tracer.span("render", template=self.name or "<string>"):
+                return super().render(*args, **kwargs)
+        finally:
+            TEMPLATE_RENDER_SECONDS.labels(self.name or "<string>").observe(time.perf_counter() - start)
+
+# --- Event loop health ---
+# Above LOOP_SHED_THRESHOLD seconds of loop lag, new send_message calls get a 503 + Retry-After
+loop_monitor = LoopMonitor(
+    stall_threshold=float(os.getenv("LOOP_STALL_THRESHOLD", "0.2")),
+    shed_threshold=float(os.getenv("LOOP_SHED_THRESHOLD", "0.5"))
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop_monitor.start()
+    if stream_relay is not None:
+        await stream_relay.start()
+    if generation_pool is not None:
+        generation_pool.start()
+    # Generations a crash or restart left "streaming" (with other workers, only the stale ones)
+    recovered = recover_orphaned_streams(time.time() - STREAM_ORPHAN_SECONDS if state.shared else None)
+    if recovered:
+        logger.warning(f"Marked {len(recovered)} interrupted generation(s) from a previous run")
+        write_db_to_disk()
+        if RESUME_INTERRUPTED and not state.shared:
+            for conv_id in recovered:
+                msg = chats[conv_id]["messages"][-1]
+                if msg["status"] == "interrupted":
+                    resume_generation(conv_id, msg)
+    checkpointer = asyncio.create_task(checkpoint_generations())
+    indexer = asyncio.create_task(search_index.build(chats))
+    yield
+    indexer.cancel()
+    checkpointer.cancel()
+    await interrupt_generations()
+    loop_monitor.stop()
+    if generation_pool is not None:
+        generation_pool.stop()
+    await close_clients()
+    if stream_relay is not None:
+        await stream_relay.stop()
+
+# --- Tracing ---
+# TRACE_EXPORT=jsonl:traces.jsonl or TRACE_EXPORT=otlp:http://localhost:4318
+tracer.configure(os.getenv("TRACE_EXPORT"))
+UNTRACED_PREFIXES = ("/static", "/metrics")
+
+class TracingMiddleware:
+    """Opens a root span per HTTP request and adds a Server-Timing header to HTML responses."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(UNTRACED_PREFIXES):
+            return await self.app(scope, receive, send)
+
+        with tracer.span(f'{scope["method"]} {scope["path"]}', force=True, method=scope["method"], path=scope["path"]) as span:
+            async def send_with_timing(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("status_code", message["status"])
+                    headers = list(message.get("headers", []))
+                    if any(k == b"content-type" and v.startswith(b"text/html") for k, v in headers):
+                        headers.append((b"server-timing", server_timing(span).encode("latin-1")))
+                        message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
+
+class StateSyncMiddleware:
+    """Applies other workers' writes before each request, so every worker answers from current state."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if state.shared and scope["type"] == "http" and not scope["path"].startswith(UNTRACED_PREFIXES):
+            apply_remote_changes()
+        return await self.app(scope, receive, send)
+
 templates = Jinja2Templates(directory="templates")
-app = FastAPI()
+templates.env.template_class = TimedTemplate
+templates.env.globals["rendered_message"] = rendering.rendered_message
+templates.env.globals["has_math"] = rendering.has_math
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(StateSyncMiddleware)
+app.add_middleware(TracingMiddleware)
+# Added last = outermost, so it compresses what the tracing middleware emits too
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESS_MIN_SIZE", "500")))
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -48,38 +163,123 @@ class Folder(BaseModel):
     icon: Optional[str] = "folder"
     sort_order: int = 0
 
-# In-memory storage
-chats: Dict[str, dict] = {}
-folders: Dict[str, dict] = {}
-DB_PATH = "db.json"
-
-def read_db_from_disk():
-    try:
-        with open(DB_PATH, "r") as f:
-            data = json.load(f)
-            # Handle old format where it was just the chats dict
-            if isinstance(data, dict) and "chats" in data:
-                return data.get("chats", {}), data.get("folders", {})
-            return data, {} # Old format
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}, {}
-
-chats, folders = read_db_from_disk()
+# In-memory storage, persisted through the state backend
+# Several workers: STATE_BACKEND=sqlite:db.sqlite3 STREAM_RELAY=unix:/tmp/hyperfastchat-relay.sock uvicorn main:app --workers 4
+state = create_state_backend(os.getenv("STATE_BACKEND"))
+stream_relay = create_stream_relay(os.getenv("STREAM_RELAY"))
+chats: Dict[str, dict]
+folders: Dict[str, dict]
+chats, folders = state.load()
+
+# Sidebar indexes, kept in sync through chat_changed / chat_removed
+chat_index = ChatIndex()
+chat_index.rebuild(chats)
+
+def chat_changed(conv_id: str):
+    """Call after creating a chat or changing its folder_id / updated_at."""
+    chat_index.upsert(conv_id, chats[conv_id])
+    bump_chat_version(conv_id)
+    bump_sidebar_version()
+
+def chat_removed(conv_id: str):
+    state.mark_removed(conv_id)
+    chat_index.remove(conv_id)
+    search_index.remove_conversation(conv_id)
+    chat_versions.pop(conv_id, None)
+    bump_sidebar_version()
+
+# Full-text search over titles and finished messages, updated as they are written
+search_index = SearchIndex()
+
+# --- Conditional GET ---
+# Version counters bumped on every mutation; ETags are derived from them so an unchanged partial
+# can be answered with a 304 before any template is rendered. BOOT_ID makes ETags from a previous
+# process (whose counters restarted at 0) never match.
+BOOT_ID = uuid.uuid4().hex[:8]
+chat_versions: Dict[str, int] = {}
+sidebar_version = 0
+
+def bump_chat_version(conv_id: str):
+    """Call after changing anything the conversation's history partial shows (messages, provider, model)."""
+    chat_versions[conv_id] = chat_versions.get(conv_id, 0) + 1
+    state.mark_dirty(conv_id)
+
+def bump_sidebar_version():
+    """Call after changing anything the sidebar shows (chat titles/order/folders, folder list)."""
+    global sidebar_version
+    sidebar_version += 1
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in (BOOT_ID,) + parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:20]}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    # no-cache = the browser may keep it but must revalidate each time, which is what gives us the 304s
+    return {"ETag": etag, "Cache-Control": "no-cache"}
 
 def write_db_to_disk():
-    with open(DB_PATH, "wt") as f:
-        json.dump({"chats": chats, "folders": folders}, f, indent=2, default=str)
+    start = time.perf_counter()
+    with tracer.span("db.write"):
+        state.flush(chats, folders)
+    DB_WRITE_SECONDS.observe(time.perf_counter() - start)
+
+# --- Multi-worker state sync ---
+# Conversations with a generation running in this process. Their messages list is being written
+# to by the generation, so remote updates of those chats keep the local list.
+generating: set = set()
+
+def apply_remote_changes():
+    """Fold other workers' writes into the in-memory state (no-op with the JSON backend)."""
+    changed = False
+    for kind, record_id, data in state.changes():
+        changed = True
+        if kind == "folder":
+            if data is None:
+                folders.pop(record_id, None)
+            else:
+                folders[record_id] = data
+            continue
+        if data is None:
+            if chats.pop(record_id, None) is not None:
+                chat_index.remove(record_id)
+                search_index.remove_conversation(record_id)
+                chat_versions.pop(record_id, None)
+            continue
+        if record_id in generating and record_id in chats:
+            data["messages"] = chats[record_id]["messages"]
+        chats[record_id] = data
+        chat_index.upsert(record_id, data)
+        search_index.index_conversation(record_id, data)
+        chat_versions[record_id] = chat_versions.get(record_id, 0) + 1
+    if changed:
+        bump_sidebar_version()
+
 # ---
 
 def load_providers_config():
     with open("LLMConnect/providers_config.json", "r") as f:
-        return json.load(f)
+        # The local mock provider is only offered with HFC_ENABLE_MOCK=1
+        return {key: config for key, config in json.load(f).items() if provider_enabled(config)}
 
 PROVIDERS_CONFIG = load_providers_config()
 default_provider = list(PROVIDERS_CONFIG.keys())[1] # groq
 default_model = PROVIDERS_CONFIG[default_provider]["default_model"]
 DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant."
 
+# GENERATION_WORKERS=N moves the LLM clients (upstream streaming and parsing) to N worker
+# processes; the web process only receives the text deltas. Unset = on this event loop.
+generation_pool = create_generation_pool(os.getenv("GENERATION_WORKERS"))
+
 # A class to acts like a Pydantic model but works with Forms
 class MessageForm:
     def __init__(
@@ -87,12 +287,26 @@ class MessageForm:
         message: str = Form(...),
         files: list[UploadFile] = File(default=[]),
         provider: str = Form(default_provider),
-        model: str = Form(default_model)
+        model: str = Form(default_model),
+        compare: list[str] = Form(default=[])
     ):
         self.message = message
         self.files = files
         self.provider = provider
         self.model = model
+        self.compare = compare  # Extra "provider:model" targets for a compare turn
+
+# Compare mode: one turn streamed from several provider/model pairs side by side
+MAX_COMPARE = 4
+
+def compare_targets(provider: str, model: str, extra: List[str]) -> List[tuple]:
+    """The (provider, model) pairs of a turn: the chat's own first, then the valid extra ones."""
+    targets = [(provider, model)]
+    for spec in extra:
+        p, _, m = spec.partition(":")
+        if p in PROVIDERS_CONFIG and m in PROVIDERS_CONFIG[p]["available_models"] and (p, m) not in targets:
+            targets.append((p, m))
+    return targets[:MAX_COMPARE]
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
@@ -106,6 +320,18 @@ async def read_root(request: Request):
         "current_model": PROVIDERS_CONFIG[default_provider]["default_model"]
     })
 
+HISTORY_PAGE_SIZE = 30
+
+def history_page(conv_id: str, before: Optional[int] = None, limit: int = HISTORY_PAGE_SIZE):
+    """
+    UI messages [start, before) of a conversation and `start`, so templates can number them with
+    absolute UI indexes (the system prompt is skipped). Defaults to the latest page.
+    """
+    ui_messages = [msg for msg in chats[conv_id]["messages"] if msg["role"] != "system"]
+    end = len(ui_messages) if before is None else max(0, min(before, len(ui_messages)))
+    start = max(0, end - limit)
+    return ui_messages[start:end], start
+
 @app.get("/chat/{conv_id}", response_class=HTMLResponse)
 async def get_chat(request: Request, conv_id: str):
     # Initialize conversation if it doesn't exist
@@ -125,14 +351,17 @@ async def get_chat(request: Request, conv_id: str):
             "updated_at": datetime.utcnow().isoformat(),
             "folder_id": None
         }
+        chat_changed(conv_id)
+        search_index.index(conv_id, TITLE, chats[conv_id]["title"])
     
-    # Get messages for rendering (skipping system message for UI)
-    ui_messages = [msg for msg in chats[conv_id]["messages"] if msg["role"] != "system"]
+    # Latest page of messages for rendering (skipping system message for UI)
+    ui_messages, history_offset = history_page(conv_id)
     
     return templates.TemplateResponse("index.html", {
         "request": request, 
         "conversation_id": conv_id,
         "history": ui_messages,
+        "history_offset": history_offset,
         "stream_id": str(uuid.uuid4())[:8],
         "providers_config": PROVIDERS_CONFIG,
         "current_provider": chats[conv_id].get("provider", default_provider),
@@ -141,6 +370,16 @@ async def get_chat(request: Request, conv_id: str):
 
 @app.post("/chat/{conv_id}/send-message")
 async def send_message(request: Request, conv_id: str, form_data: Annotated[MessageForm, Depends()]):
+    if not loop_monitor.admit():
+        # Shed new generations only, streams already in flight keep going. The chat form swaps
+        # this 503 in (htmx ignores error responses by default) and keeps the typed message.
+        retry_after = loop_monitor.retry_after()
+        return HTMLResponse(
+            content=f'<div class="error-message">Server busy, please retry in {retry_after} s.</div>',
+            status_code=503,
+            headers={"Retry-After": str(retry_after)}
+        )
+
     is_new = False
     actual_conv_id = conv_id
     
@@ -192,11 +431,24 @@ async def send_message(request: Request, conv_id: str, form_data: Annotated[Mess
         "files": processed_files
     })
 
-    chats[actual_conv_id]["messages"].append({
+    assistant_placeholder = {
         "role": "assistant",
         "content": "",
-        "status": "streaming"
-    })
+        "status": "streaming",
+        "heartbeat": time.time()  # Refreshed by checkpoint_generations while it streams
+    }
+    targets = compare_targets(chats[actual_conv_id]["provider"], chats[actual_conv_id]["model"], form_data.compare)
+    if len(targets) > 1:
+        assistant_placeholder["candidates"] = [
+            {"provider": p, "model": m, "content": "", "status": "streaming", "ttft": None, "tps": None, "tokens": 0}
+            for p, m in targets
+        ]
+    chats[actual_conv_id]["messages"].append(assistant_placeholder)
+    chats[actual_conv_id]["updated_at"] = datetime.utcnow().isoformat()
+    chat_changed(actual_conv_id)
+    if is_new:
+        search_index.index(actual_conv_id, TITLE, chats[actual_conv_id]["title"])
+    search_index.index(actual_conv_id, len(chats[actual_conv_id]["messages"]) - 2, form_data.message)
     write_db_to_disk() # temp only
 
     # Calculate msg_index for the user message
@@ -215,16 +467,21 @@ async def send_message(request: Request, conv_id: str, form_data: Annotated[Mess
     
     stream_id = str(uuid.uuid4())[:8]
     
-    # Render streaming bot placeholder
+    # Render streaming bot placeholder (side-by-side bubbles for a compare turn)
     bot_msg_index = len(chats[actual_conv_id]["messages"]) - 1
-    bot_trigger_html = templates.get_template("chat_stream.html").render({
+    bot_trigger_html = templates.get_template(
+        "chat_compare.html" if "candidates" in assistant_placeholder else "chat_stream.html"
+    ).render({
         "request": request,
         "conversation_id": actual_conv_id,
         "stream_id": stream_id,
-        "msg_index": bot_msg_index
+        "msg_index": bot_msg_index,
+        "ui_index": bot_msg_index - 1,
+        "candidates": assistant_placeholder.get("candidates"),
+        "providers_config": PROVIDERS_CONFIG
     })
     
-    asyncio.create_task(run_chatbot_logic(actual_conv_id))
+    start_generation(actual_conv_id, queued_ns=time.time_ns())
     
     response_content = user_html + bot_trigger_html
     headers = {}
@@ -232,13 +489,7 @@ async def send_message(request: Request, conv_id: str, form_data: Annotated[Mess
     if is_new:
         # Push new URL and trigger sidebar update
         headers["HX-Push-Url"] = f"/chat/{actual_conv_id}"
-        sidebar_item_html = templates.get_template("sidebar_item.html").render({
-            "request": request,
-            "conv_id": actual_conv_id,
-            "title": chats[actual_conv_id]["title"],
-            "active": True,
-            "all_folders": [f for f in folders.values()]
-        })
+        sidebar_item_html = render_sidebar_item(actual_conv_id, chats[actual_conv_id]["title"], active=True)
         # We'll use hx-swap-oob to prepend the new conversation to the sidebar list
         response_content += f'<div id="sidebar-list" hx-swap-oob="afterbegin">{sidebar_item_html}</div>'
 
@@ -246,6 +497,7 @@ async def send_message(request: Request, conv_id: str, form_data: Annotated[Mess
         input_field_html = templates.get_template("chat_input_field.html").render({
             "request": request,
             "conversation_id": actual_conv_id,
+            "providers_config": PROVIDERS_CONFIG,
             "current_provider": chats[actual_conv_id]["provider"],
             "current_model": chats[actual_conv_id]["model"]
         })
@@ -253,11 +505,178 @@ async def send_message(request: Request, conv_id: str, form_data: Annotated[Mess
     
     return HTMLResponse(content=response_content, headers=headers)
 
-async def run_chatbot_logic(conv_id: str):
+# When the oldest not-yet-emitted token of a conversation's stream arrived (for the SSE lag metric)
+stream_pending_since: Dict[str, float] = {}
+# Generation span of each conversation, picked up by its SSE stream so both land in the same trace
+stream_traces: Dict[str, object] = {}
+# Set on every change to a conversation's generation (new text, end), so its SSE streams wake up
+# when there is something to send instead of polling
+stream_wakeups: Dict[str, asyncio.Event] = {}
+# Longest an SSE stream sleeps without a wakeup (state changed by something other than the generation)
+STREAM_IDLE_WAIT = 1.0
+
+def stream_wakeup(conv_id: str) -> asyncio.Event:
+    """The event the next notify_stream(conv_id) sets. Take it before reading the state."""
+    wakeup = stream_wakeups.get(conv_id)
+    if wakeup is None:
+        wakeup = stream_wakeups[conv_id] = asyncio.Event()
+    return wakeup
+
+def notify_stream(conv_id: str):
+    wakeup = stream_wakeups.pop(conv_id, None)
+    if wakeup is not None:
+        wakeup.set()
+
+async def wait_for_wakeup(wakeup: asyncio.Event, timeout: float):
+    with contextlib.suppress(asyncio.TimeoutError):
+        await asyncio.wait_for(wakeup.wait(), timeout)
+
+# --- Crash safety ---
+# While a generation runs, its partial answer is written through the state backend every
+# STREAM_CHECKPOINT_SECONDS, along with a heartbeat on the message. A "streaming" message that no
+# generation of this process owns and whose heartbeat is older than STREAM_ORPHAN_SECONDS was left
+# behind by a crash or a restart (or its worker died): it becomes "interrupted", keeping its text,
+# and can be resumed with a continuation request (Continue button, or RESUME_INTERRUPTED=1 to do it
+# on startup; single process only, several workers would each resume the same messages).
+STREAM_CHECKPOINT_SECONDS = float(os.getenv("STREAM_CHECKPOINT_SECONDS", "2.0"))
+STREAM_ORPHAN_SECONDS = float(os.getenv("STREAM_ORPHAN_SECONDS", str(3 * STREAM_CHECKPOINT_SECONDS)))
+RESUME_INTERRUPTED = os.getenv("RESUME_INTERRUPTED", "0") == "1"
+CONTINUE_PROMPT = "Continue your previous answer exactly where it stopped, without repeating any of it."
+
+# Generation task of each conversation running in this process
+generation_tasks: Dict[str, asyncio.Task] = {}
+
+def start_generation(conv_id: str, queued_ns: Optional[int] = None):
+    generating.add(conv_id)  # Now, so a bot-stream arriving before the task starts doesn't take it for an orphan
+    task = generation_tasks[conv_id] = asyncio.create_task(run_chatbot_logic(conv_id, queued_ns=queued_ns))
+    task.add_done_callback(lambda _: generation_tasks.pop(conv_id, None) if generation_tasks.get(conv_id) is task else None)
+
+def mark_interrupted(conv_id: str, msg: dict):
+    """A generation that will not finish: keep what it wrote, let it be continued."""
+    msg["status"] = "interrupted"
+    candidates = msg.get("candidates")
+    if candidates:
+        finished = [i for i, c in enumerate(candidates) if c["status"] == "complete"]
+        if finished:
+            # A compare turn with an answer is simply over, as if the others had failed
+            msg["winner"] = finished[0]
+            msg["content"] = candidates[finished[0]]["content"]
+            msg["status"] = "complete"
+        else:
+            msg["content"] = candidates[0]["content"]  # The chat's own model, what Continue resumes
+        for candidate in candidates:
+            if candidate["status"] == "streaming":
+                candidate["status"] = "interrupted"
+    bump_chat_version(conv_id)
+    notify_stream(conv_id)
+
+def is_orphaned(conv_id: str, msg: dict, stale_before: Optional[float]) -> bool:
+    """A streaming message that nothing will write to any more. `stale_before` None: don't
+    check the heartbeat, no other process can own it."""
+    if msg.get("status") != "streaming" or conv_id in generating:
+        return False
+    return stale_before is None or msg.get("heartbeat", 0) < stale_before
+
+def recover_orphaned_streams(stale_before: Optional[float]) -> List[str]:
+    """Mark every orphaned streaming message interrupted (see is_orphaned); returns their chats."""
+    recovered = []
+    for conv_id, chat in chats.items():
+        messages = chat.get("messages")
+        if messages and messages[-1]["role"] == "assistant" and is_orphaned(conv_id, messages[-1], stale_before):
+            mark_interrupted(conv_id, messages[-1])
+            recovered.append(conv_id)
+    return recovered
+
+def resume_generation(conv_id: str, msg: dict):
+    """Continue an interrupted answer in place (see _run_chatbot_logic)."""
+    msg.pop("candidates", None)
+    msg.pop("winner", None)
+    msg["status"] = "streaming"
+    msg["heartbeat"] = time.time()
+    rendering.invalidate(msg)
+    bump_chat_version(conv_id)
+    start_generation(conv_id)
+
+def settle_unowned_stream(conv_id: str, msg: dict):
+    """
+    For bot-streams of a streaming message that no generation of this process writes to: instead
+    of waiting forever for text that will never come, mark it interrupted when it is orphaned.
+    """
+    if is_orphaned(conv_id, msg, time.time() - STREAM_ORPHAN_SECONDS if state.shared else None):
+        mark_interrupted(conv_id, msg)
+        write_db_to_disk()
+
+async def checkpoint_generations():
+    """Background task: persist running generations' partial answers, recover orphaned ones."""
+    while True:
+        await asyncio.sleep(STREAM_CHECKPOINT_SECONDS)
+        try:
+            now = time.time()
+            streaming = []
+            for conv_id in generating:
+                messages = chats.get(conv_id, {}).get("messages")
+                if messages and messages[-1].get("status") == "streaming":
+                    messages[-1]["heartbeat"] = now
+                    streaming.append(conv_id)
+            if state.shared:
+                apply_remote_changes()  # Other workers' heartbeats, before judging their messages
+            if recover_orphaned_streams(now - STREAM_ORPHAN_SECONDS):
+                write_db_to_disk()
+            if streaming:
+                # Only these chats, written off the loop: the cost doesn't grow with the whole history
+                write = state.checkpoint(chats, streaming)
+                with tracer.span("db.checkpoint", chats=len(streaming)):
+                    await asyncio.get_running_loop().run_in_executor(None, write)
+        except Exception:
+            logger.exception("Checkpointing generations failed")
+
+async def interrupt_generations():
+    """Shutdown: stop this process's generations and persist their partial answers as interrupted."""
+    tasks = dict(generation_tasks)
+    for conv_id in tasks:
+        messages = chats.get(conv_id, {}).get("messages")
+        if messages and messages[-1].get("status") == "streaming":
+            mark_interrupted(conv_id, messages[-1])  # Before the cancellation, so the relay's end says so
+    for task in tasks.values():
+        task.cancel()
+    await asyncio.gather(*tasks.values(), return_exceptions=True)
+    if tasks:
+        write_db_to_disk()
+
+async def run_chatbot_logic(conv_id: str, queued_ns: Optional[int] = None):
     """
     Background task that interacts with LLM providers via LLMConnect.
     Updates the conversation history in real-time as tokens are received.
     """
+    # create_task copied send_message's context, so this span joins its trace
+    with tracer.span("generation", conv_id=conv_id) as span:
+        if queued_ns is not None:
+            tracer.record("queue", queued_ns, time.time_ns(), parent=span)
+        if span is not NOOP_SPAN:
+            stream_traces[conv_id] = span
+        generating.add(conv_id)
+        if stream_relay is not None:
+            # Opens the channel now, so other workers' bot-streams wait for the first token
+            # instead of finding a channel the broker never saw
+            stream_relay.publish(conv_id, "")
+        try:
+            await _run_chatbot_logic(conv_id, span)
+        finally:
+            generating.discard(conv_id)
+            notify_stream(conv_id)
+            if conv_id in chats:
+                # Every exit is persisted, errors raised before the first token included, so a
+                # restart finds the final status rather than a stream to recover
+                bump_chat_version(conv_id)
+                write_db_to_disk()
+            if stream_relay is not None:
+                # Also on the early error returns; after the final write, so a resync sees the result
+                assistant_msg = next((m for m in reversed(chats.get(conv_id, {}).get("messages", []))
+                                      if m["role"] == "assistant"), None)
+                if assistant_msg is not None:
+                    stream_relay.end(conv_id, assistant_msg.get("status", "complete"), assistant_msg["content"])
+
+async def _run_chatbot_logic(conv_id: str, span):
     if conv_id not in chats:
         return
     
@@ -271,50 +690,140 @@ async def run_chatbot_logic(conv_id: str):
     # Simulation setup
     provider_name = chats[conv_id].get("provider", default_provider)
     model_name = chats[conv_id].get("model")
+    span.set_attribute("provider", provider_name)
+    span.set_attribute("model", model_name or "")
     
     try:
-        provider = Provider(provider_name)
+        Provider(provider_name)
     except ValueError:
         assistant_msg["content"] = f"Error: Unsupported provider '{provider_name}'"
         assistant_msg["status"] = "error"
         return
 
-    # Initialize LLMConnect client
-    try:
-        client = APIClientFactory.create_async_client(
-            provider=provider,
-            model=model_name
-        )
-    except Exception as e:
-        assistant_msg["content"] = f"Error initializing client: {str(e)}"
-        assistant_msg["status"] = "error"
-        return
-
     # Prepare historical context (everything except the current streaming placeholder)
     history_to_send = []
     for m in messages:
         if m is assistant_msg:
             continue
         history_to_send.append({"role": m["role"], "content": m["content"]})
-    
+
+    if "candidates" in assistant_msg:
+        await _run_compare(conv_id, assistant_msg, history_to_send, span)
+        return
+
+    # A resumed interrupted answer already has text: ask for the rest, appended to it
+    accumulated = assistant_msg["content"]
+    if accumulated:
+        span.set_attribute("continuation", True)
+        history_to_send += [{"role": "assistant", "content": accumulated}, {"role": "user", "content": CONTINUE_PROMPT}]
+        if stream_relay is not None:
+            stream_relay.publish(conv_id, accumulated)  # The relay's snapshot starts from it too
+
     try:
-        accumulated = ""
-        # The chat method is flexible - if passed a list, it treats it as full history
-        stream = await client.chat(history_to_send, stream=True)
-        
-        async for chunk in stream:
+        client = await open_client(provider_name, model_name, conv_id)
+    except Exception as e:
+        span.record_error(e)
+        if accumulated:
+            assistant_msg["status"] = "interrupted"  # Still resumable
+        else:
+            assistant_msg["content"] = f"Error initializing client: {str(e)}"
+            assistant_msg["status"] = "error"
+        return
+
+    try:
+        # Stateless call: the history goes with the request, nothing is kept on the shared client
+        async for chunk in client.stream(history_to_send):
             accumulated += chunk
             assistant_msg["content"] = accumulated
+            stream_pending_since.setdefault(conv_id, time.monotonic())
+            notify_stream(conv_id)
+            if stream_relay is not None:
+                stream_relay.publish(conv_id, chunk)
             # Yield control back to the event loop
             await asyncio.sleep(0)
             
         assistant_msg["status"] = "complete"
-        write_db_to_disk() # temp only
+        rendering.rendered_message(assistant_msg)  # Warm the HTML cache for the next history render
+        search_index.index(conv_id, next(i for i, m in enumerate(messages) if m is assistant_msg), accumulated)
+        bump_chat_version(conv_id)
     except Exception as e:
-        assistant_msg["content"] = f"Error during generation: {str(e)}"
-        assistant_msg["status"] = "error"
+        span.record_error(e)
+        if accumulated:
+            # Cut off mid-answer: keep the text, it can be continued
+            logger.warning(f"Generation of {conv_id} interrupted: {e}")
+            assistant_msg["status"] = "interrupted"
+        else:
+            assistant_msg["content"] = f"Error during generation: {str(e)}"
+            assistant_msg["status"] = "error"
+    finally:
+        stream_pending_since.pop(conv_id, None)
+        bump_chat_version(conv_id)  # Status left "streaming", the history is cacheable again
+        await release_client(client)
+
+async def open_client(provider_name: str, model_name: Optional[str], conv_id: str):
+    """LLMConnect client: a job in a generation worker when the pool is enabled, else the shared
+    client of this provider/model."""
+    if generation_pool is not None:
+        return await generation_pool.open(provider_name, model_name, conv_id=conv_id)
+    return get_client(provider_name, model_name)
+
+async def release_client(client):
+    if generation_pool is not None:
+        await client.close()  # Releases the worker job (shared local clients stay open)
+
+async def _run_candidate(conv_id: str, candidate: dict, history: List[dict], finished: List[int], index: int):
+    """Stream one side of a compare turn into its candidate, with its TTFT and delta rate."""
+    start = time.monotonic()
+    first = None
+    try:
+        client = await open_client(candidate["provider"], candidate["model"], conv_id)
+    except Exception as e:
+        candidate["content"] = f"Error initializing client: {str(e)}"
+        candidate["status"] = "error"
+        return
+    try:
+        async for chunk in client.stream(history):
+            now = time.monotonic()
+            if first is None:
+                first = now
+                candidate["ttft"] = round(now - start, 3)
+            candidate["content"] += chunk
+            candidate["tokens"] += 1  # Deltas, about one token each
+            if now > first:
+                candidate["tps"] = round(candidate["tokens"] / (now - first), 1)
+            notify_stream(conv_id)
+            await asyncio.sleep(0)
+        candidate["status"] = "complete"
+        finished.append(index)
+    except Exception as e:
+        candidate["content"] = f"Error during generation: {str(e)}"
+        candidate["status"] = "error"
+    finally:
+        notify_stream(conv_id)
+        await release_client(client)
+
+async def _run_compare(conv_id: str, assistant_msg: dict, history: List[dict], span):
+    """
+    A compare turn: the same history to every candidate concurrently. The first one to finish
+    becomes the message's content until the user keeps another (see keep_candidate).
+    """
+    candidates = assistant_msg["candidates"]
+    span.set_attribute("compare", len(candidates))
+    finished: List[int] = []
+    try:
+        await asyncio.gather(*(_run_candidate(conv_id, c, history, finished, i) for i, c in enumerate(candidates)))
+        if finished:
+            assistant_msg["winner"] = finished[0]
+            assistant_msg["content"] = candidates[finished[0]]["content"]
+            assistant_msg["status"] = "complete"
+            rendering.rendered_message(assistant_msg)
+            messages = chats[conv_id]["messages"]
+            search_index.index(conv_id, next(i for i, m in enumerate(messages) if m is assistant_msg), assistant_msg["content"])
+        else:
+            assistant_msg["content"] = "Error: every compared model failed"
+            assistant_msg["status"] = "error"
     finally:
-        await client.close()
+        bump_chat_version(conv_id)
 
 async def generate_bot_response_stream(conv_id: str):
     """
@@ -333,22 +842,62 @@ async def generate_bot_response_stream(conv_id: str):
         yield f"event: error\ndata: Message not found\n\n"
         return
 
-    last_sent_content = None
+    if stream_relay is not None and conv_id not in generating and assistant_msg.get("status") == "streaming":
+        # The generation runs in another worker: follow it through the relay
+        async for event in relay_bot_response_stream(conv_id):
+            yield event
+        return
+
+    if "candidates" in assistant_msg:
+        async for event in compare_response_stream(conv_id, messages, assistant_msg):
+            yield event
+        return
+
+    last_sent_content = ""
+    # Started, not activated: this is a generator (see LLMConnect.tracing)
+    span = tracer.start("sse.stream", parent=stream_traces.pop(conv_id, None), conv_id=conv_id)
+    http_span = tracer.current_span()
+    if http_span is not None and http_span.trace_id != span.trace_id:
+        span.set_attribute("http.trace_id", http_span.trace_id)  # The bot-stream request's own trace
+    # Deltas are batched into token events by time window and size (see coalescing)
+    coalescer = Coalescer()
     
-    # Loop while the backend is still generating
-    while assistant_msg.get("status") == "streaming":
-        current_content = assistant_msg["content"]
-        
-        # Only send an update if the content has changed
-        if current_content != last_sent_content:
+    try:
+        # Loop while the backend is still generating
+        while assistant_msg.get("status") == "streaming":
+            wakeup = stream_wakeup(conv_id)
+            if conv_id not in generating:
+                settle_unowned_stream(conv_id, assistant_msg)
+                break
+            current_content = assistant_msg["content"]
+            
+            # Only send an update if the content has changed, once the coalescing window allows
+            if current_content == last_sent_content:
+                await wait_for_wakeup(wakeup, STREAM_IDLE_WAIT)
+                continue
+            delay = coalescer.delay(len(current_content))
+            if delay > 0:
+                await wait_for_wakeup(wakeup, delay)  # Woken early by more text or the end
+                continue
+            pending_since = stream_pending_since.pop(conv_id, None)
+            if pending_since is not None:
+                SSE_LAG_SECONDS.observe(time.monotonic() - pending_since)
+            if coalescer.events == 0:
+                span.add_event("first_token")
             safe_data = json.dumps(current_content)
+            started = time.monotonic()
             yield f"event: token\ndata: {safe_data}\n\n"
+            coalescer.emitted(len(current_content), started)  # Resumed once the event was sent
             last_sent_content = current_content
-            
-        await asyncio.sleep(0.05) # Poll the shared state
-    
+        
+        for event in final_stream_events(conv_id, messages, assistant_msg["content"], assistant_msg.get("status")):
+            yield event
+    finally:
+        span.set_attribute("events", coalescer.events + 1)
+        span.end()
+
+def final_stream_events(conv_id: str, messages: List[dict], final_content: str, status: Optional[str] = None):
     # Final token update to ensure full content is delivered
-    final_content = assistant_msg["content"]
     yield f"event: token\ndata: {json.dumps(final_content)}\n\n"
     
     # UI Index for this bot response
@@ -359,10 +908,148 @@ async def generate_bot_response_stream(conv_id: str):
         "status": "done",
         "conversation_id": conv_id,
         "msg_index": bot_msg_index,
-        "content": final_content
+        "content": final_content,
+        "message_status": status  # "interrupted": the client offers to continue it
     }
     yield f"event: done\ndata: {json.dumps(payload)}\n\n"
 
+def candidate_event(index: int, candidate: dict) -> str:
+    payload = {"i": index, **{k: candidate[k] for k in ("content", "status", "ttft", "tps")}}
+    return f"event: candidate\ndata: {json.dumps(payload)}\n\n"
+
+def final_compare_events(conv_id: str, messages: List[dict], assistant_msg: dict):
+    for i, candidate in enumerate(assistant_msg["candidates"]):
+        yield candidate_event(i, candidate)
+    payload = {
+        "status": "done",
+        "conversation_id": conv_id,
+        "msg_index": len([m for m in messages if m["role"] != "system"]) - 1,
+        "winner": assistant_msg.get("winner"),
+        "content": assistant_msg["content"]
+    }
+    yield f"event: done\ndata: {json.dumps(payload)}\n\n"
+
+async def compare_response_stream(conv_id: str, messages: List[dict], assistant_msg: dict):
+    """
+    All candidates of a compare turn multiplexed on one SSE connection: a `candidate` event
+    (index, text so far, status, TTFT, rate) whenever one of them changed, then `done`.
+    """
+    sent = {}
+    span = tracer.start("sse.stream", parent=stream_traces.pop(conv_id, None), conv_id=conv_id, compare=True)
+    coalescers = [Coalescer() for _ in assistant_msg["candidates"]]
+    try:
+        while assistant_msg.get("status") == "streaming":
+            wakeup = stream_wakeup(conv_id)
+            if conv_id not in generating:
+                settle_unowned_stream(conv_id, assistant_msg)
+                break
+            delay = STREAM_IDLE_WAIT
+            for i, candidate in enumerate(assistant_msg["candidates"]):
+                snapshot = (len(candidate["content"]), candidate["status"])
+                if sent.get(i) == snapshot:
+                    continue
+                # A candidate's end goes out at once, its text as its own coalescing window allows
+                wait = coalescers[i].delay(snapshot[0]) if snapshot[1] == "streaming" else 0.0
+                if wait > 0:
+                    delay = min(delay, wait)
+                    continue
+                sent[i] = snapshot
+                started = time.monotonic()
+                yield candidate_event(i, candidate)
+                coalescers[i].emitted(snapshot[0], started)
+            stream_pending_since.pop(conv_id, None)
+            await wait_for_wakeup(wakeup, delay)
+        for event in final_compare_events(conv_id, messages, assistant_msg):
+            yield event
+    finally:
+        span.set_attribute("events", sum(c.events for c in coalescers) + 1)
+        span.end()
+
+# Pause before subscribing again when the broker doesn't know a generation the shared state says is running
+RELAY_RESUBSCRIBE_DELAY = 0.25
+
+def relay_generation_pending(conv_id: str) -> bool:
+    """
+    After an "unknown" (or "lost") answer from the relay: whether the shared state still shows a
+    live generation, which the broker just hasn't heard of (yet, or again after a reconnect).
+    """
+    apply_remote_changes()
+    messages = chats[conv_id]["messages"] if conv_id in chats else []
+    msg = messages[-1] if messages and messages[-1]["role"] == "assistant" else None
+    return (msg is not None and msg.get("status") == "streaming"
+            and not is_orphaned(conv_id, msg, time.time() - STREAM_ORPHAN_SECONDS))
+
+async def relay_bot_response_stream(conv_id: str):
+    """Same events as generate_bot_response_stream, from the relay's snapshot + deltas."""
+    content = ""
+    sent_content = ""
+    final_content = final_status = None
+    coalescer = Coalescer()  # Same emission policy as the local stream
+    while True:
+        subscription = stream_relay.subscribe(conv_id)
+        next_message = None
+        resubscribe = False
+        try:
+            while True:
+                delay = None
+                if content != sent_content:
+                    delay = coalescer.delay(len(content))
+                    if delay == 0:
+                        started = time.monotonic()
+                        yield f"event: token\ndata: {json.dumps(content)}\n\n"
+                        coalescer.emitted(len(content), started)
+                        sent_content = content
+                        continue
+                # Wait for the next message, or only until the window elapses while text is held back
+                if next_message is None:
+                    next_message = asyncio.ensure_future(subscription.__anext__())
+                done, _ = await asyncio.wait({next_message}, timeout=delay)
+                if not done:
+                    continue
+                next_message = None
+                try:
+                    message = done.pop().result()
+                except StopAsyncIteration:
+                    break
+                if "delta" in message:
+                    content += message["delta"]
+                elif message["status"] == "streaming":
+                    content = message["content"]  # Snapshot
+                elif message["status"] in ("unknown", "lost"):
+                    resubscribe = True
+                    break
+                else:
+                    final_content = message["content"]  # Whatever was held back goes out with the final token
+                    final_status = message["status"]
+                    break
+        finally:
+            if next_message is not None:
+                next_message.cancel()
+                with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                    await next_message
+            await subscription.aclose()
+        if not resubscribe or not relay_generation_pending(conv_id):
+            break
+        await asyncio.sleep(RELAY_RESUBSCRIBE_DELAY)
+
+    # The relay only has the text: take the message index (and, if the relay lost track of the
+    # generation, the content) from the shared state
+    apply_remote_changes()
+    messages = chats[conv_id]["messages"] if conv_id in chats else []
+    assistant_msg = next((m for m in reversed(messages) if m["role"] == "assistant"), None)
+    if assistant_msg is not None and "candidates" in assistant_msg:
+        # Compare turns aren't relayed token by token, their candidates come from the shared state at the end
+        for event in final_compare_events(conv_id, messages, assistant_msg):
+            yield event
+        return
+    if final_content is None:
+        if assistant_msg is not None and assistant_msg.get("status") == "streaming":
+            settle_unowned_stream(conv_id, assistant_msg)  # The relay doesn't know it: maybe an orphan
+        final_content = assistant_msg["content"] if assistant_msg is not None else content
+        final_status = assistant_msg.get("status") if assistant_msg is not None else None
+    for event in final_stream_events(conv_id, messages, final_content, final_status):
+        yield event
+
 
 @app.get("/chat/{conv_id}/bot-stream")
 async def bot_stream(request: Request, conv_id: str):
@@ -378,23 +1065,48 @@ async def bot_stream(request: Request, conv_id: str):
     )
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint."""
+    registry = REGISTRY
+    if generation_pool is not None:
+        # Upstream TTFT, token rates and hedges are recorded in the worker processes
+        registry = MetricsRegistry.merged([REGISTRY.snapshot(), *generation_pool.metrics_snapshots()])
+    return PlainTextResponse(registry.render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/debug/loop")
+async def loop_health():
+    """Current loop lag and the most recent stalls with the stack that caused them."""
+    return loop_monitor.report()
+
+
 @app.get("/chat/{conv_id}/history", response_class=HTMLResponse)
 async def get_chat_history(request: Request, conv_id: str):
     """Returns only the chat history partial for HTMX SPA navigation."""
     if conv_id not in chats:
         return HTMLResponse(content="Conversation not found", status_code=404)
     
-    ui_messages = [msg for msg in chats[conv_id]["messages"] if msg["role"] != "system"]
+    # A streaming conversation changes with every token, it is never served from cache
+    messages = chats[conv_id]["messages"]
+    cacheable = not (messages and messages[-1].get("status") == "streaming")
+    etag = make_etag("history", conv_id, chat_versions.get(conv_id, 0))
+    if cacheable and etag_matches(request, etag):
+        return not_modified(etag)
+    
+    ui_messages, history_offset = history_page(conv_id)
     
     history_html = templates.get_template("chat_history_list.html").render({
         "request": request,
         "history": ui_messages,
+        "history_offset": history_offset,
         "conversation_id": conv_id
     })
 
     input_field_html = templates.get_template("chat_input_field.html").render({
         "request": request,
         "conversation_id": conv_id,
+        "providers_config": PROVIDERS_CONFIG,
         "current_provider": chats[conv_id].get("provider", default_provider),
         "current_model": chats[conv_id].get("model", "")
     })
@@ -407,9 +1119,33 @@ async def get_chat_history(request: Request, conv_id: str):
         "current_model": chats[conv_id].get("model", "")
     })
 
-    return HTMLResponse(content=history_html + f'<div id="chat-form-container" hx-swap-oob="innerHTML">{input_field_html}</div>' + f'<div id="model-dropdown-container" hx-swap-oob="innerHTML">{model_dropdown_html}</div>')
+    return HTMLResponse(
+        content=history_html + f'<div id="chat-form-container" hx-swap-oob="innerHTML">{input_field_html}</div>' + f'<div id="model-dropdown-container" hx-swap-oob="innerHTML">{model_dropdown_html}</div>',
+        headers=cache_headers(etag) if cacheable else {"Cache-Control": "no-store"}
+    )
+
 
 
+@app.get("/chat/{conv_id}/history/older", response_class=HTMLResponse)
+async def get_older_history(request: Request, conv_id: str, before: int, limit: int = HISTORY_PAGE_SIZE):
+    """Messages preceding UI index `before`; replaces the "load older" sentinel at the top of the chat."""
+    if conv_id not in chats:
+        return HTMLResponse(content="Conversation not found", status_code=404)
+    
+    limit = max(1, min(limit, 200))
+    etag = make_etag("older", conv_id, chat_versions.get(conv_id, 0), before, limit)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    ui_messages, history_offset = history_page(conv_id, before, limit)
+    
+    return templates.TemplateResponse("chat_history_list.html", {
+        "request": request,
+        "history": ui_messages,
+        "history_offset": history_offset,
+        "is_tail": False,  # Never the streaming message, that one is always last
+        "conversation_id": conv_id
+    }, headers=cache_headers(etag))
 
 class EditMessageModel(BaseModel):
     content: str
@@ -428,6 +1164,9 @@ async def edit_message(request: Request, conv_id: str, msg_index: int, data: Edi
     
     # Update message and remove subsequent ones
     messages[backend_index]["content"] = data.content
+    search_index.index(conv_id, backend_index, data.content)
+    rendering.invalidate(messages[backend_index])
+    bump_chat_version(conv_id)
     role = messages[backend_index]["role"]
     write_db_to_disk()
 
@@ -442,15 +1181,79 @@ async def edit_message(request: Request, conv_id: str, msg_index: int, data: Edi
     #     })
     #     asyncio.create_task(run_chatbot_logic(conv_id))
     
-    # Return full history to refresh the view
-    ui_messages = [msg for msg in chats[conv_id]["messages"] if msg["role"] != "system"]
+    # Refresh the view from the edited message (or the latest page, whichever starts earlier) to the end
+    ui_count = sum(1 for msg in chats[conv_id]["messages"] if msg["role"] != "system")
+    ui_messages, history_offset = history_page(conv_id, limit=max(HISTORY_PAGE_SIZE, ui_count - msg_index))
     return templates.TemplateResponse("chat_history_list.html", {
         "request": request,
         "history": ui_messages,
+        "history_offset": history_offset,
         "conversation_id": conv_id
     })
 
 
+@app.post("/chat/{conv_id}/message/{msg_index}/keep/{candidate}", response_class=HTMLResponse)
+async def keep_candidate(request: Request, conv_id: str, msg_index: int, candidate: int):
+    """Make one side of a finished compare turn the canonical assistant message."""
+    if conv_id not in chats:
+        return HTMLResponse(content="Conversation not found", status_code=404)
+
+    messages = chats[conv_id]["messages"]
+    backend_index = msg_index + 1  # UI index 0 is backend index 1 (skipping system)
+    if backend_index < 1 or backend_index >= len(messages) or "candidates" not in messages[backend_index]:
+        return HTMLResponse(content="Invalid message index", status_code=400)
+    msg = messages[backend_index]
+    if msg.get("status") == "streaming" or not 0 <= candidate < len(msg["candidates"]) \
+            or msg["candidates"][candidate]["status"] != "complete":
+        return HTMLResponse(content="Candidate not available", status_code=409)
+
+    msg["winner"] = candidate
+    msg["content"] = msg["candidates"][candidate]["content"]
+    msg["status"] = "complete"
+    rendering.invalidate(msg)
+    search_index.index(conv_id, backend_index, msg["content"])
+    bump_chat_version(conv_id)
+    write_db_to_disk()
+
+    return templates.TemplateResponse("chat_response.html", {
+        "request": request,
+        "sender": "bot",
+        "message": msg["content"],
+        "msg_index": msg_index,
+        "conversation_id": conv_id,
+        "message_html": rendering.rendered_message(msg),
+        "message_has_math": rendering.has_math(msg),
+        "candidates": msg["candidates"],
+        "winner": candidate
+    })
+
+
+@app.post("/chat/{conv_id}/message/{msg_index}/continue", response_class=HTMLResponse)
+async def continue_message(request: Request, conv_id: str, msg_index: int):
+    """Resume an interrupted answer: the rest is requested with a continuation prompt and streamed onto it."""
+    if conv_id not in chats:
+        return HTMLResponse(content="Conversation not found", status_code=404)
+
+    messages = chats[conv_id]["messages"]
+    backend_index = msg_index + 1  # UI index 0 is backend index 1 (skipping system)
+    if backend_index != len(messages) - 1 or messages[backend_index]["role"] != "assistant":
+        return HTMLResponse(content="Invalid message index", status_code=400)
+    msg = messages[backend_index]
+    if msg.get("status") != "interrupted" or conv_id in generating:
+        return HTMLResponse(content="Message is not interrupted", status_code=409)
+
+    resume_generation(conv_id, msg)
+    write_db_to_disk()
+
+    return templates.TemplateResponse("chat_stream.html", {
+        "request": request,
+        "conversation_id": conv_id,
+        "stream_id": str(uuid.uuid4())[:8],
+        "msg_index": msg_index,
+        "message": msg["content"]
+    })
+
+
 #  Provider/Model selection --- 
 class SetModelModel(BaseModel):
     model: str
@@ -463,6 +1266,11 @@ async def get_model_options(request: Request, provider: str, current_model: str
     if provider not in PROVIDERS_CONFIG:
         return HTMLResponse(content="Invalid Provider", status_code=400)
     
+    # Only depends on the (static) provider config and the query
+    etag = make_etag("model-options", provider, current_model)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
     models = PROVIDERS_CONFIG[provider]["available_models"]
     
     # We create a simple list of buttons for the model dropdown
@@ -472,7 +1280,7 @@ async def get_model_options(request: Request, provider: str, current_model: str
         "models": models,
         "current_model": current_model,
         "conversation_id": "new" 
-    })
+    }, headers=cache_headers(etag))
 
 @app.patch("/chat/{conv_id}/model", response_class=HTMLResponse)
 async def set_model(request: Request, conv_id: str, data: SetModelModel):
@@ -485,6 +1293,7 @@ async def set_model(request: Request, conv_id: str, data: SetModelModel):
          return HTMLResponse(content="Invalid Model", status_code=400)
 
     chats[conv_id]["model"] = data.model
+    bump_chat_version(conv_id)
     
     return templates.TemplateResponse("model_dropdown.html", {
         "request": request,
@@ -505,6 +1314,7 @@ async def set_provider(request: Request, conv_id: str, data: SetProviderModel):
     chats[conv_id]["provider"] = data.provider
     # Reset to default model for this provider
     chats[conv_id]["model"] = PROVIDERS_CONFIG[data.provider]["default_model"]
+    bump_chat_version(conv_id)
     
     return templates.TemplateResponse("model_dropdown.html", {
         "request": request,
@@ -527,37 +1337,110 @@ class RenameFolderModel(BaseModel):
 class MoveChatModel(BaseModel):
     folder_id: Optional[str] = None  # None means "move to Recent/unsorted"
 
+# Sidebar items only depend on (conv_id, title, active): the folder list they used to embed is
+# now the single shared #folder-submenu, so folder changes don't invalidate them
+sidebar_fragments = rendering.FragmentCache()
+
+def render_sidebar_item(conv_id: str, title: str, active: bool = False):
+    return sidebar_fragments.get_or_render(
+        ("chat", conv_id, title, active),
+        lambda: templates.get_template("sidebar_item.html").render({"conv_id": conv_id, "title": title, "active": active})
+    )
+
+def render_folder_item(folder: dict):
+    return sidebar_fragments.get_or_render(
+        ("folder", folder["id"], folder["name"], folder.get("color"), folder.get("chat_count")),
+        lambda: templates.get_template("folder_item.html").render({"folder": folder})
+    )
+
+def render_folder_submenu(oob: bool = False) -> str:
+    all_folders = sorted(folders.values(), key=lambda f: f.get("sort_order", 0))
+    return templates.get_template("folder_submenu.html").render({"all_folders": all_folders, "oob": oob})
+
+templates.env.globals["sidebar_item"] = render_sidebar_item
+templates.env.globals["folder_item"] = render_folder_item
+
+SIDEBAR_PAGE_SIZE = 50
+SIDEBAR_MAX_PAGE_SIZE = 200
+
+def sidebar_page(folder_id: Optional[str], cursor: Optional[str], limit: int, base_url: str, current_id: str = None):
+    """One keyset page of a sidebar section plus the URL of the next one (None on the last page)."""
+    limit = max(1, min(limit, SIDEBAR_MAX_PAGE_SIZE))
+    ids, next_key = chat_index.page(folder_id, limit, decode_cursor(cursor))
+    conversations = [{"id": cid, "title": chats[cid].get("title", "Untitled")} for cid in ids]
+    next_url = None
+    if next_key is not None:
+        next_url = f"{base_url}?cursor={encode_cursor(next_key)}&limit={limit}"
+        if current_id:
+            next_url += f"&current_id={current_id}"
+    return conversations, next_url
+
 @app.get("/sidebar", response_class=HTMLResponse)
-async def get_sidebar(request: Request, current_id: str = None):
+async def get_sidebar(request: Request, current_id: str = None, limit: int = SIDEBAR_PAGE_SIZE):
     """Returns the full sidebar with folders and recent chats."""
+    etag = make_etag("sidebar", sidebar_version, current_id, limit)
+    if etag_matches(request, etag):
+        return not_modified(etag)
     
     # Build folder list with their chat counts
     folder_list = []
     for fid, folder in folders.items():
-        folder_chats = [cid for cid, chat in chats.items() if chat.get("folder_id") == fid]
         folder_list.append({
             "id": fid,
             "name": folder["name"],
             "color": folder.get("color"),
-            "chat_count": len(folder_chats),
+            "chat_count": chat_index.count(fid),
             "sort_order": folder.get("sort_order", 0)
         })
     folder_list.sort(key=lambda f: f["sort_order"])
     
-    # Build recent (unsorted) chat list
-    recent_chats = [
-        {"id": cid, "title": data.get("title", "Untitled")}
-        for cid, data in reversed(list(chats.items()))
-        if data.get("folder_id") is None
-    ]
+    # First page of the recent (unsorted) chat list: pinned, then most recently updated
+    recent_chats, next_url = sidebar_page(None, None, limit, "/sidebar/chats", current_id)
     
     return templates.TemplateResponse("sidebar.html", {
             "request": request,
             "folders": folder_list,
             "conversations": recent_chats,
+            "next_url": next_url,
             "current_id": current_id,
-            "all_folders": folder_list  # For move-to-folder submenu
+            "all_folders": folder_list  # For the shared move-to-folder submenu
+        }, headers=cache_headers(etag))
+
+@app.get("/sidebar/chats", response_class=HTMLResponse)
+async def get_sidebar_chats(request: Request, cursor: str = None, limit: int = SIDEBAR_PAGE_SIZE, current_id: str = None):
+    """Next page of the Recent list, requested by the infinite-scroll sentinel."""
+    etag = make_etag("sidebar-page", sidebar_version, cursor, limit, current_id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    recent_chats, next_url = sidebar_page(None, cursor, limit, "/sidebar/chats", current_id)
+    return templates.TemplateResponse("folder_chats_list.html", {
+        "request": request,
+        "conversations": recent_chats,
+        "next_url": next_url,
+        "first_page": False
+    }, headers=cache_headers(etag))
+
+@app.get("/search", response_class=HTMLResponse)
+async def search(request: Request, q: str = "", limit: int = 20):
+    """Ranked conversations matching `q`, as a sidebar-style fragment with highlighted snippets."""
+    results = []
+    for hit in search_index.search(q, max(1, min(limit, 100))):
+        chat = chats[hit.conv_id]
+        if hit.msg_index == TITLE:
+            text = next((m["content"] for m in chat["messages"] if m["role"] != "system"), "")
+        else:
+            text = chat["messages"][hit.msg_index]["content"]
+        results.append({
+            "id": hit.conv_id,
+            "title": snippet(chat.get("title", "Untitled"), q, width=80),
+            "snippet": snippet(text, q)
         })
+    return templates.TemplateResponse("search_results.html", {
+        "request": request,
+        "results": results,
+        "query": q,
+        "indexing": not search_index.ready
+    })
 
 @app.patch("/chat/{conv_id}/rename", response_class=HTMLResponse)
 async def rename_chat(conv_id: str, data: RenameModel):
@@ -571,6 +1454,9 @@ async def rename_chat(conv_id: str, data: RenameModel):
         new_title += "..."
         
     chats[conv_id]["title"] = new_title
+    search_index.index(conv_id, TITLE, new_title)
+    bump_chat_version(conv_id)
+    bump_sidebar_version()
     write_db_to_disk()
     return HTMLResponse(content=new_title)
 
@@ -578,6 +1464,7 @@ async def rename_chat(conv_id: str, data: RenameModel):
 async def delete_chat(conv_id: str):
     if conv_id in chats:
         del chats[conv_id]
+        chat_removed(conv_id)
         write_db_to_disk()
     return HTMLResponse(content="")
 
@@ -598,16 +1485,13 @@ async def create_folder(request: Request, data: CreateFolderModel):
         "icon": "folder",
         "sort_order": len(folders)
     }
+    bump_sidebar_version()
     write_db_to_disk()
     
-    # Return new folder item for OOB injection
-    folder_html = templates.get_template("folder_item.html").render({
-        "request": request,
-        "folder": folders[folder_id],
-        "conversations": []  # New folder has no chats
-    })
+    # Return new folder item for OOB injection, plus the move-to-folder submenu that now lists it
+    folder_html = render_folder_item({**folders[folder_id], "chat_count": 0})
     return HTMLResponse(
-        content=f'<div id="folders-list" hx-swap-oob="beforeend">{folder_html}</div>',
+        content=f'<div id="folders-list" hx-swap-oob="beforeend">{folder_html}</div>' + render_folder_submenu(oob=True),
         status_code=201
     )
 
@@ -620,9 +1504,10 @@ async def rename_folder(folder_id: str, data: RenameFolderModel):
     
     folders[folder_id]["name"] = data.name.strip()[:50]
     folders[folder_id]["updated_at"] = datetime.utcnow().isoformat()
+    bump_sidebar_version()
     write_db_to_disk()
     
-    return HTMLResponse(content=folders[folder_id]["name"])
+    return HTMLResponse(content=folders[folder_id]["name"] + render_folder_submenu(oob=True))
 
 
 @app.delete("/folders/{folder_id}", response_class=HTMLResponse)
@@ -633,54 +1518,51 @@ async def delete_folder(request: Request, folder_id: str, action: str = "unassig
     if folder_id not in folders:
         return HTMLResponse(content="Folder not found", status_code=404)
     
-    affected_chats = [cid for cid, chat in chats.items() if chat.get("folder_id") == folder_id]
+    affected_chats = chat_index.recent(folder_id)
     
     if action == "delete":
         # Delete all chats in this folder
         for cid in affected_chats:
             del chats[cid]
+            chat_removed(cid)
     else:
         # Unassign: move chats to Recent
         for cid in affected_chats:
             chats[cid]["folder_id"] = None
+            chat_changed(cid)
     
     del folders[folder_id]
+    bump_sidebar_version()
     write_db_to_disk()
     
     # Return OOB swap to remove folder from DOM and optionally add chats to Recent
-    response_html = ""
+    response_html = render_folder_submenu(oob=True)
     if action == "unassign":
-        remaining_folders = [f for f in folders.values()]
         for cid in affected_chats:
-            chat_html = templates.get_template("sidebar_item.html").render({
-                "request": request,
-                "conv_id": cid,
-                "title": chats[cid]["title"],
-                "active": False,
-                "all_folders": remaining_folders
-            })
+            chat_html = render_sidebar_item(cid, chats[cid]["title"])
             response_html += f'<div id="sidebar-list" hx-swap-oob="afterbegin">{chat_html}</div>'
     
     return HTMLResponse(content=response_html)
 
 
 @app.get("/folders/{folder_id}/chats", response_class=HTMLResponse)
-async def get_folder_chats(request: Request, folder_id: str):
-    """Get all chats within a folder for lazy-loading accordion content."""
+async def get_folder_chats(request: Request, folder_id: str, cursor: str = None, limit: int = SIDEBAR_PAGE_SIZE):
+    """Get a page of chats within a folder for lazy-loading accordion content."""
     if folder_id not in folders:
         return HTMLResponse(content="Folder not found", status_code=404)
     
-    folder_chats = [
-        {"id": cid, "title": chat["title"]}
-        for cid, chat in chats.items()
-        if chat.get("folder_id") == folder_id
-    ]
+    etag = make_etag("folder-page", sidebar_version, folder_id, cursor, limit)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    folder_chats, next_url = sidebar_page(folder_id, cursor, limit, f"/folders/{folder_id}/chats")
     
     return templates.TemplateResponse("folder_chats_list.html", {
         "request": request,
         "conversations": folder_chats,
-        "all_folders": [f for f in folders.values()]
-    })
+        "next_url": next_url,
+        "first_page": cursor is None
+    }, headers=cache_headers(etag))
 
 @app.patch("/chat/{conv_id}/folder", response_class=HTMLResponse)
 async def move_chat_to_folder(request: Request, conv_id: str, data: MoveChatModel):
@@ -703,16 +1585,11 @@ async def move_chat_to_folder(request: Request, conv_id: str, data: MoveChatMode
     
     chats[conv_id]["folder_id"] = new_folder_id
     chats[conv_id]["updated_at"] = datetime.utcnow().isoformat()
+    chat_changed(conv_id)
     write_db_to_disk()
     
     # Build OOB response for DOM manipulation
-    chat_html = templates.get_template("sidebar_item.html").render({
-        "request": request,
-        "conv_id": conv_id,
-        "title": chats[conv_id]["title"],
-        "active": False,
-        "all_folders": [f for f in folders.values()] # Need folders for context menu in new location
-    })
+    chat_html = render_sidebar_item(conv_id, chats[conv_id]["title"])
     
     response_parts = []
     
@@ -0,0 +1,127 @@
+"""
+Event-loop health: a lag sampler running on the loop, a watchdog thread that catches the loop
+while it is blocked and records what it was doing, and the admission check used to shed new
+work (send_message) while the loop is struggling. In-flight streams are never cut off.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from LLMConnect.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_SECONDS = REGISTRY.histogram("app_event_loop_lag_seconds", "How late the event loop wakes up a sleeping task")
+LOOP_STALLS = REGISTRY.counter("app_event_loop_stalls_total", "Times the watchdog caught the event loop blocked")
+REQUESTS_SHED = REGISTRY.counter("app_requests_shed_total", "New generations rejected because the loop was lagging")
+
+
+class LoopMonitor:
+    """
+    The sampler sleeps `interval` seconds on the loop and measures how late it wakes up, keeping an
+    exponentially smoothed lag. The watchdog thread checks the sampler's heartbeat: when it is older
+    than `stall_threshold` it grabs the loop thread's stack (sys._current_frames) once per stall.
+    New work is refused while the smoothed lag or the ongoing stall exceeds `shed_threshold`.
+    """
+
+    def __init__(self, interval: float = 0.25,
+                 stall_threshold: float = 0.2,
+                 shed_threshold: float = 0.5,
+                 smoothing: float = 0.3,
+                 max_stalls: int = 50):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.shed_threshold = shed_threshold
+        self.smoothing = smoothing
+        self.lag = 0.0  # Smoothed lag in seconds
+        self.stalls: deque = deque(maxlen=max_stalls)
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._sampler: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    # --- Loop side ---
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            LOOP_LAG_SECONDS.observe(lag)
+            self.lag += self.smoothing * (lag - self.lag)
+
+    def start(self):
+        """Start sampling on the running loop and the watchdog thread. Call from the loop."""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._sampler = asyncio.create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.cancel()
+
+    # --- Watchdog thread ---
+
+    def _watch(self):
+        stall: Optional[Dict[str, Any]] = None
+        while not self._stopped.wait(self.stall_threshold / 2):
+            blocked_for = time.monotonic() - self._heartbeat - self.interval
+            if blocked_for < self.stall_threshold:
+                if stall is not None:
+                    stall["duration"] = round(time.monotonic() - stall["_started"], 3)
+                    logger.warning(f"Event loop was blocked for {stall['duration']:.3f}s:\n{stall['stack']}")
+                    stall = None
+                continue
+            if stall is None:
+                # Only the first sample of a stall: the frame at that moment is the culprit
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stall = {
+                    "at": time.time(),
+                    "_started": time.monotonic() - blocked_for,
+                    "duration": None,
+                    "stack": "".join(traceback.format_stack(frame)) if frame is not None else ""
+                }
+                self.stalls.append(stall)
+                LOOP_STALLS.inc()
+
+    def current_stall(self) -> float:
+        """How long the loop has been blocked right now (0 if it isn't)."""
+        return max(0.0, time.monotonic() - self._heartbeat - self.interval)
+
+    # --- Admission control ---
+
+    @property
+    def overloaded(self) -> bool:
+        return self.lag > self.shed_threshold or self.current_stall() > self.shed_threshold
+
+    def admit(self) -> bool:
+        """Whether to accept new work. Counts rejections."""
+        if self.overloaded:
+            REQUESTS_SHED.inc()
+            return False
+        return True
+
+    def retry_after(self) -> int:
+        """Seconds a shed client should wait, grows with the lag."""
+        return max(1, min(30, int(round(self.lag * 4))))
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "lag_ms": round(self.lag * 1000, 2),
+            "overloaded": self.overloaded,
+            "shed_threshold_ms": self.shed_threshold * 1000,
+            "stalls": [{k: v for k, v in s.items() if not k.startswith("_")} for s in reversed(self.stalls)]
+        }
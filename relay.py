@@ -0,0 +1,232 @@
+"""
+Cross-process pub/sub for streaming token deltas, so a bot-stream request can be served by a
+different worker than the one running the generation.
+
+One worker on the box runs the broker: a Unix-socket server, elected with an exclusive flock on
+`<socket>.lock` (released by the OS when that worker dies, after which the next worker to notice
+takes over). Every worker, the broker's included, connects to it as a client. The protocol is
+JSON lines:
+
+    -> {"op": "pub", "ch": conv_id, "delta": "..."}                      a token delta
+    -> {"op": "end", "ch": conv_id, "status": "complete", "content": "..."}
+    -> {"op": "sub", "ch": conv_id} / {"op": "unsub", "ch": conv_id}
+    <- {"ch": conv_id, "content": "...", "status": "streaming"}         snapshot, first reply to a sub
+    <- {"ch": conv_id, "delta": "..."} / {"ch": conv_id, "status": "...", "content": "..."}
+
+The broker keeps the text so far of every live channel, which lets a subscriber that connects
+mid-generation start from a snapshot, and keeps ended channels around for `retain_ended` seconds
+for subscribers that arrive just after the end. A sub to a channel it never saw gets
+{"status": "unknown"}. If the connection to the broker drops, subscribers get {"status": "lost"}.
+The broker never waits for a subscriber: a connection that lets more than `max_buffer` bytes of
+fanout pile up unsent is dropped, and its subscribers get "lost" like on any other disconnect.
+
+Configured with STREAM_RELAY=unix:/tmp/hyperfastchat-relay.sock (disabled when unset).
+"""
+
+import asyncio
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import time
+from typing import AsyncIterator, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class _Broker:
+    def __init__(self, retain_ended: float, max_buffer: int):
+        self.retain_ended = retain_ended
+        self.max_buffer = max_buffer
+        self.content: Dict[str, str] = {}
+        self.ended: Dict[str, tuple] = {}  # ch -> (status, content, ended_at)
+        self.subscribers: Dict[str, Set[asyncio.StreamWriter]] = {}
+
+    def _send(self, writer: asyncio.StreamWriter, message: dict):
+        if writer.is_closing():
+            return
+        if writer.transport.get_write_buffer_size() > self.max_buffer:
+            # A stuck client: drop it rather than buffer the whole stream for it
+            logger.warning(f"Relay client dropped: over {self.max_buffer} bytes behind")
+            writer.transport.abort()
+            return
+        writer.write(json.dumps(message).encode() + b"\n")
+
+    def _fanout(self, ch: str, message: dict):
+        for writer in self.subscribers.get(ch, ()):
+            self._send(writer, message)
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.retain_ended
+        for ch in [ch for ch, (_, _, ended_at) in self.ended.items() if ended_at < cutoff]:
+            del self.ended[ch]
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        subscribed: Set[str] = set()
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                op, ch = message["op"], message["ch"]
+                if op == "pub":
+                    self.content[ch] = self.content.get(ch, "") + message["delta"]
+                    self.ended.pop(ch, None)
+                    self._fanout(ch, {"ch": ch, "delta": message["delta"]})
+                elif op == "end":
+                    self.content.pop(ch, None)
+                    self.ended[ch] = (message["status"], message["content"], time.monotonic())
+                    self._fanout(ch, {"ch": ch, "status": message["status"], "content": message["content"]})
+                    self._expire()
+                elif op == "sub":
+                    subscribed.add(ch)
+                    self.subscribers.setdefault(ch, set()).add(writer)
+                    if ch in self.content:
+                        self._send(writer, {"ch": ch, "content": self.content[ch], "status": "streaming"})
+                    elif ch in self.ended:
+                        status, content, _ = self.ended[ch]
+                        self._send(writer, {"ch": ch, "status": status, "content": content})
+                    else:
+                        self._send(writer, {"ch": ch, "status": "unknown"})
+                elif op == "unsub":
+                    subscribed.discard(ch)
+                    self.subscribers.get(ch, set()).discard(writer)
+                await writer.drain()
+        except (ConnectionError, ValueError, KeyError) as e:
+            logger.warning(f"Relay client dropped: {e}")
+        finally:
+            for ch in subscribed:
+                subs = self.subscribers.get(ch)
+                if subs is not None:
+                    subs.discard(writer)
+                    if not subs:
+                        del self.subscribers[ch]
+            writer.close()
+
+
+class StreamRelay:
+    def __init__(self, path: str, retain_ended: float = 30.0, reconnect_delay: float = 0.5,
+                 max_buffer: int = 1 << 20):
+        self.path = path
+        self.retain_ended = retain_ended
+        self.max_buffer = max_buffer
+        self.reconnect_delay = reconnect_delay
+        self.is_broker = False
+        self._lock_fd: Optional[int] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._queues: Dict[str, Set[asyncio.Queue]] = {}
+        self._connected = asyncio.Event()
+        self._closed = False
+
+    # --- Lifecycle ---
+
+    async def start(self):
+        await self._connect()
+
+    async def stop(self):
+        self._closed = True
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+        if self._server is not None:
+            self._server.close()
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self.path)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+
+    def _try_become_broker(self) -> bool:
+        if self._lock_fd is None:
+            self._lock_fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    async def _connect(self):
+        while not self._closed:
+            if not self.is_broker and self._try_become_broker():
+                # Holding the lock means any socket file left there belongs to a dead broker
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(self.path)
+                broker = _Broker(self.retain_ended, self.max_buffer)
+                self._server = await asyncio.start_unix_server(broker.handle, path=self.path)
+                self.is_broker = True
+                logger.info(f"Stream relay broker listening on {self.path} (pid {os.getpid()})")
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                # Broker elected but not listening yet, or just died
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+            self._reader_task = asyncio.create_task(self._read(reader))
+            self._connected.set()
+            return
+
+    async def _read(self, reader: asyncio.StreamReader):
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                for queue in self._queues.get(message["ch"], ()):
+                    queue.put_nowait(message)
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Stream relay connection error: {e}")
+        if self._closed:
+            return
+        self._connected.clear()
+        for ch, queues in self._queues.items():
+            for queue in queues:
+                queue.put_nowait({"ch": ch, "status": "lost"})
+        self._queues.clear()
+        await self._connect()
+
+    # --- Publishing ---
+
+    def _send(self, message: dict):
+        if self._writer is not None and self._connected.is_set() and not self._writer.is_closing():
+            self._writer.write(json.dumps(message).encode() + b"\n")
+
+    def publish(self, ch: str, delta: str):
+        """Fire-and-forget: never blocks the generation on the broker."""
+        self._send({"op": "pub", "ch": ch, "delta": delta})
+
+    def end(self, ch: str, status: str, content: str):
+        self._send({"op": "end", "ch": ch, "status": status, "content": content})
+
+    # --- Subscribing ---
+
+    async def subscribe(self, ch: str) -> AsyncIterator[dict]:
+        """Messages of a channel: a snapshot (or end/unknown status) first, then deltas until an end."""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._queues.setdefault(ch, set()).add(queue)
+        if self._connected.is_set():
+            # Also when another local subscriber already holds the subscription: the broker answers
+            # with a fresh snapshot, which the other subscribers simply take as a resync
+            self._send({"op": "sub", "ch": ch})
+        else:
+            queue.put_nowait({"ch": ch, "status": "lost"})
+        try:
+            while True:
+                message = await queue.get()
+                yield message
+                if "status" in message and message["status"] != "streaming":
+                    return
+        finally:
+            queues = self._queues.get(ch)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._queues[ch]
+                    self._send({"op": "unsub", "ch": ch})
+
+
+def create_stream_relay(spec: Optional[str]) -> Optional[StreamRelay]:
+    if not spec:
+        return None
+    kind, _, path = spec.partition(":")
+    if kind != "unix" or not path:
+        raise ValueError(f"Unknown STREAM_RELAY '{spec}', expected unix:<socket path>")
+    return StreamRelay(path)
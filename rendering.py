@@ -0,0 +1,201 @@
+"""
+Server-side rendering of finished messages to sanitized HTML, cached on the message itself,
+and a small LRU cache for other rendered fragments (sidebar items).
+
+Markdown goes through markdown-it with raw HTML disabled (so user/model HTML is escaped and
+unsafe link schemes are dropped). Code blocks are highlighted with Pygments, emitting
+highlight.js class names so the existing theme CSS applies. TeX has no Python renderer, so
+math spans are protected from markdown, kept verbatim, and the element is flagged for the
+browser's KaTeX auto-render, which then only runs on messages that actually contain math.
+
+Both libraries are optional: without markdown-it, `rendered_message` returns None and the
+template falls back to client-side rendering.
+"""
+
+import hashlib
+import html
+import re
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from markupsafe import Markup
+
+try:
+    from markdown_it import MarkdownIt
+except ImportError:  # Optional dependency
+    MarkdownIt = None
+
+try:
+    from pygments.lexers import get_lexer_by_name
+    from pygments.token import Token
+    from pygments.util import ClassNotFound
+except ImportError:  # Optional dependency
+    get_lexer_by_name = None
+
+# Bump when the output format changes so cached HTML gets re-rendered
+RENDER_VERSION = "1"
+
+# Fenced/inline code first so `$` inside code is never treated as math
+_CODE_OR_MATH_RE = re.compile(r"(```.*?```|`[^`\n]*`)|(\$\$.+?\$\$|\$(?!\s)[^$\n]+?(?<!\s)\$)", re.S)
+
+COPY_BUTTON = (
+    '<button class="copy-button" _="on click copyCode(me)">'
+    '<svg fill="none" stroke="currentColor" stroke-width="2" viewBox="0 0 24 24" xmlns="http://www.w3.org/2000/svg">'
+    '<path stroke-linecap="round" stroke-linejoin="round" d="M8 5H6a2 2 0 00-2 2v12a2 2 0 002 2h10a2 2 0 002-2v-1M8 5a2 2 0 002 2h2a2 2 0 002-2M8 5a2 2 0 012-2h2a2 2 0 012 2m0 0h2a2 2 0 012 2v3m2 4H10m0 0l3-3m-3 3l3 3"></path>'
+    '</svg><span>Copy</span></button>'
+)
+
+# Pygments token types -> highlight.js classes (the most specific match wins)
+_HLJS_CLASSES = {}
+if get_lexer_by_name is not None:
+    _HLJS_CLASSES = {
+        Token.Comment: "hljs-comment",
+        Token.Comment.Preproc: "hljs-meta",
+        Token.Keyword: "hljs-keyword",
+        Token.Keyword.Constant: "hljs-literal",
+        Token.Keyword.Type: "hljs-type",
+        Token.Name.Builtin: "hljs-built_in",
+        Token.Name.Builtin.Pseudo: "hljs-variable language_",
+        Token.Name.Function: "hljs-title function_",
+        Token.Name.Class: "hljs-title class_",
+        Token.Name.Decorator: "hljs-meta",
+        Token.Name.Tag: "hljs-name",
+        Token.Name.Attribute: "hljs-attr",
+        Token.Name.Variable: "hljs-variable",
+        Token.Literal.String: "hljs-string",
+        Token.Literal.String.Escape: "hljs-char escape_",
+        Token.Literal.String.Regex: "hljs-regexp",
+        Token.Literal.Number: "hljs-number",
+        Token.Operator.Word: "hljs-keyword",
+        Token.Generic.Deleted: "hljs-deletion",
+        Token.Generic.Inserted: "hljs-addition",
+        Token.Generic.Heading: "hljs-section",
+    }
+
+
+def _hljs_class(token_type) -> Optional[str]:
+    while token_type is not None:
+        css_class = _HLJS_CLASSES.get(token_type)
+        if css_class:
+            return css_class
+        token_type = token_type.parent
+    return None
+
+
+def highlight(code: str, lang: str) -> str:
+    """Escaped, highlighted HTML for a code block (plain escaped text for unknown languages)."""
+    if get_lexer_by_name is None or not lang:
+        return html.escape(code)
+    try:
+        lexer = get_lexer_by_name(lang, stripnl=False, ensurenl=False)
+    except ClassNotFound:
+        return html.escape(code)
+    parts = []
+    for token_type, value in lexer.get_tokens(code):
+        css_class = _hljs_class(token_type)
+        escaped = html.escape(value)
+        parts.append(f'<span class="{css_class}">{escaped}</span>' if css_class else escaped)
+    return "".join(parts)
+
+
+def _render_fence(self, tokens, idx, options, env):
+    token = tokens[idx]
+    lang = token.info.strip().split(maxsplit=1)[0] if token.info.strip() else ""
+    lang_class = f" language-{html.escape(lang)}" if lang else ""
+    return (f'<div class="code-block-container"><pre><code class="hljs{lang_class}">'
+            f'{highlight(token.content, lang)}</code></pre>{COPY_BUTTON}</div>\n')
+
+
+_md = None
+
+def _markdown():
+    global _md
+    if _md is None:
+        # Same behaviour as the client's marked({breaks: true, gfm: true}), minus raw HTML
+        _md = MarkdownIt("commonmark", {"html": False, "breaks": True}).enable(["table", "strikethrough"])
+        _md.add_render_rule("fence", _render_fence)
+        _md.add_render_rule("code_block", _render_fence)
+    return _md
+
+
+def _render(text: str):
+    """(HTML, whether it contains math) for a markdown text."""
+    math = []
+    # Math is swapped out around the markdown pass for placeholders delimited by a private-use
+    # character the text doesn't contain, so nothing typed or pasted can pass for one
+    mark = next(chr(c) for c in range(0xE000, 0xF900) if chr(c) not in text)
+
+    def protect(match):
+        if match.group(1):
+            return match.group(1)
+        math.append(match.group(2))
+        return f"{mark}{len(math) - 1}{mark}"
+
+    protected = _CODE_OR_MATH_RE.sub(protect, text)
+    rendered = _markdown().render(protected)
+    if not math:
+        return rendered, False
+    # The TeX source goes back escaped; KaTeX reads it from the text nodes
+    return re.sub(f"{mark}(\\d+){mark}", lambda m: html.escape(math[int(m.group(1))]), rendered), True
+
+
+def render_markdown(text: str) -> str:
+    """Markdown + code highlighting to sanitized HTML; math is left verbatim for KaTeX."""
+    return _render(text)[0]
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha1(f"{RENDER_VERSION}:{content}".encode("utf-8")).hexdigest()
+
+
+def rendered_message(msg: dict) -> Optional[str]:
+    """
+    Cached HTML for a finished message, rendering it on first use. None when the message is
+    still streaming, empty, or markdown-it isn't installed (the client renders it then).
+    """
+    if MarkdownIt is None or msg.get("status") == "streaming" or not msg.get("content"):
+        return None
+    digest = content_hash(msg["content"])
+    cache = msg.get("rendered")
+    if cache is None or cache.get("hash") != digest:
+        body, math = _render(msg["content"])
+        cache = msg["rendered"] = {"hash": digest, "html": body, "math": math}
+    return cache["html"]
+
+
+def has_math(msg: dict) -> bool:
+    cache = msg.get("rendered")
+    return bool(cache and cache.get("math"))
+
+
+def invalidate(msg: dict):
+    """Drop the cached HTML (the hash check would catch it too, this just frees it early)."""
+    msg.pop("rendered", None)
+
+
+class FragmentCache:
+    """
+    Bounded LRU of rendered HTML fragments. The key must contain everything the fragment depends
+    on, so changed inputs simply miss and stale entries age out.
+    """
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Markup]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key: tuple, render: Callable[[], str]) -> Markup:
+        fragment = self._entries.get(key)
+        if fragment is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return fragment
+        self.misses += 1
+        fragment = self._entries[key] = Markup(render())
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return fragment
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,229 @@
+"""
+In-process full-text search over conversation titles and messages.
+
+Every message (and every title) is a document keyed by (conv_id, msg_index), with msg_index -1
+for the title. The inverted index maps each term to {doc: term frequency}; each document keeps
+its own term counts so it can be re-indexed or dropped without scanning the postings. Queries
+are ranked with BM25 (titles boosted), grouped per conversation (best document wins) and the
+last query term is matched as a prefix, so results show up while typing.
+
+`build` indexes the existing chats in a worker thread at startup, into a separate index that is
+swapped in when it is done, so neither startup nor the first query blocks the event loop. Until
+then `ready` is False and searches come back empty; updates arriving meanwhile only note their
+conversation, which is re-indexed from its current state right after the swap.
+"""
+
+import asyncio
+import html
+import math
+import re
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from markupsafe import Markup
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+TITLE = -1  # msg_index of a conversation's title document
+
+# Terms present in nearly every message: they'd cost a full postings scan and carry no ranking signal
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from had has have he her his how i if in into is it its
+me my no not of on or our she so that the their them then there these they this to was we were what
+when which who will with would you your
+""".split())
+
+DocKey = Tuple[str, int]
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class SearchHit:
+    __slots__ = ("conv_id", "msg_index", "score")
+
+    def __init__(self, conv_id: str, msg_index: int, score: float):
+        self.conv_id = conv_id
+        self.msg_index = msg_index
+        self.score = score
+
+
+class SearchIndex:
+    def __init__(self, k1: float = 1.2, b: float = 0.75, title_boost: float = 2.0,
+                 max_prefix_terms: int = 50):
+        self.k1 = k1
+        self.b = b
+        self.title_boost = title_boost
+        self.max_prefix_terms = max_prefix_terms
+        self._postings: Dict[str, Dict[DocKey, int]] = {}
+        self._doc_terms: Dict[DocKey, Counter] = {}
+        self._doc_len: Dict[DocKey, int] = {}
+        self._conv_docs: Dict[str, Set[DocKey]] = {}
+        self._total_len = 0
+        self._vocabulary: Optional[List[str]] = None  # Sorted terms for prefix lookups, rebuilt lazily
+        self.ready = True
+        self._stale: Set[str] = set()  # Conversations updated while the build runs
+
+    async def build(self, chats: Dict[str, dict]):
+        """Index `chats` in a worker thread, then swap the result in (see the module docstring)."""
+        self.ready = False
+        self._stale = set()
+        fresh = type(self)(self.k1, self.b, self.title_boost, self.max_prefix_terms)
+        await asyncio.to_thread(fresh.rebuild, list(chats.items()))
+        for name in ("_postings", "_doc_terms", "_doc_len", "_conv_docs", "_total_len", "_vocabulary"):
+            setattr(self, name, getattr(fresh, name))
+        self.ready = True
+        for conv_id in self._stale:
+            if conv_id in chats:
+                self.index_conversation(conv_id, chats[conv_id])
+            else:
+                self.remove_conversation(conv_id)
+        self._stale = set()
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    # --- Updates ---
+
+    def index(self, conv_id: str, msg_index: int, text: str):
+        """(Re-)index one document: a message's content, or the title with msg_index=TITLE."""
+        if not self.ready:
+            self._stale.add(conv_id)
+            return
+        key = (conv_id, msg_index)
+        self._remove_doc(key)
+        terms = Counter(tokenize(text or ""))
+        if not terms:
+            return
+        for term, tf in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._vocabulary = None
+            postings[key] = tf
+        length = sum(terms.values())
+        self._doc_terms[key] = terms
+        self._doc_len[key] = length
+        self._total_len += length
+        self._conv_docs.setdefault(conv_id, set()).add(key)
+
+    def index_conversation(self, conv_id: str, chat: dict):
+        self.remove_conversation(conv_id)
+        self.index(conv_id, TITLE, chat.get("title", ""))
+        for msg_index, msg in enumerate(chat.get("messages", [])):
+            if msg.get("role") != "system" and msg.get("status") != "streaming":
+                self.index(conv_id, msg_index, msg.get("content", ""))
+
+    def remove_conversation(self, conv_id: str):
+        if not self.ready:
+            self._stale.add(conv_id)
+            return
+        for key in list(self._conv_docs.get(conv_id, ())):
+            self._remove_doc(key)
+
+    def rebuild(self, chats: Iterable[Tuple[str, dict]]):
+        for conv_id, chat in chats:
+            self.index_conversation(conv_id, chat)
+
+    def _remove_doc(self, key: DocKey):
+        terms = self._doc_terms.pop(key, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            del postings[key]
+            if not postings:
+                del self._postings[term]
+                self._vocabulary = None
+        self._total_len -= self._doc_len.pop(key)
+        docs = self._conv_docs[key[0]]
+        docs.discard(key)
+        if not docs:
+            del self._conv_docs[key[0]]
+
+    # --- Queries ---
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        start = bisect_left(self._vocabulary, prefix)
+        terms = []
+        for term in self._vocabulary[start:start + self.max_prefix_terms]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, query: str, limit: int = 20) -> List[SearchHit]:
+        """Best-matching conversations, each with the document that matched best."""
+        words = tokenize(query)
+        if not words or not self._doc_len:
+            return []
+
+        # Each query word is a group of alternative terms (the last one is a prefix)
+        groups = [[word] if word in self._postings else [] for word in words[:-1]]
+        groups.append(self._expand_prefix(words[-1]))
+        if any(not group for group in groups):
+            return []
+
+        doc_count = len(self._doc_len)
+        doc_len = self._doc_len
+        # BM25 with the per-document constants folded: idf * tf * (k1 + 1) / (tf + c1 + c2 * len)
+        c1 = self.k1 * (1 - self.b)
+        c2 = self.k1 * self.b * doc_count / self._total_len
+        scores: Dict[DocKey, float] = {}
+        # Rarest group first, then only its documents are looked up in the others (AND semantics)
+        group_postings = sorted(([self._postings[t] for t in group] for group in groups),
+                                key=lambda plist: sum(len(p) for p in plist))
+        for position, plist in enumerate(group_postings):
+            group_scores: Dict[DocKey, float] = {}
+            for postings in plist:
+                weight = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5)) * (self.k1 + 1)
+                if position == 0:
+                    items = postings.items()
+                else:
+                    items = [(key, postings[key]) for key in scores if key in postings]
+                for key, tf in items:
+                    group_scores[key] = group_scores.get(key, 0.0) + weight * tf / (tf + c1 + c2 * doc_len[key])
+            if position == 0:
+                scores = group_scores
+            else:
+                scores = {key: score + group_scores[key] for key, score in scores.items() if key in group_scores}
+            if not scores:
+                return []
+
+        best: Dict[str, SearchHit] = {}
+        for key, score in scores.items():
+            conv_id, msg_index = key
+            if msg_index == TITLE:
+                score *= self.title_boost
+            hit = best.get(conv_id)
+            if hit is None or score > hit.score:
+                best[conv_id] = SearchHit(conv_id, msg_index, score)
+        return sorted(best.values(), key=lambda hit: hit.score, reverse=True)[:limit]
+
+
+def snippet(text: str, query: str, width: int = 140) -> Markup:
+    """An escaped excerpt of `text` around the first query match, with matches wrapped in <mark>."""
+    words = tokenize(query)
+    if not words:
+        return Markup(html.escape(text[:width]))
+    # Whole words, except the last one which is a prefix (same as the search)
+    pattern = re.compile(
+        "|".join([rf"\b{re.escape(w)}\b" for w in words[:-1]] + [rf"\b{re.escape(words[-1])}\w*"]),
+        re.IGNORECASE | re.UNICODE
+    )
+    match = pattern.search(text)
+    start = 0 if match is None else max(0, match.start() - width // 3)
+    excerpt = text[start:start + width]
+    parts = []
+    last = 0
+    for m in pattern.finditer(excerpt):
+        parts.append(html.escape(excerpt[last:m.start()]))
+        parts.append(f"<mark>{html.escape(m.group(0))}</mark>")
+        last = m.end()
+    parts.append(html.escape(excerpt[last:]))
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if start + width < len(text) else ""
+    return Markup(prefix + "".join(parts).replace("\n", " ") + suffix)
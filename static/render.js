@@ -88,6 +88,43 @@ window.renderMessage = function (el) {
     el.classList.add('markdown-content');
 };
 
+/**
+ * KaTeX pass for server-rendered messages (flagged with data-has-math).
+ * Markdown and code highlighting already happened on the server.
+ */
+window.renderMath = function (el) {
+    if (!window.renderMathInElement) {
+        setTimeout(() => window.renderMath(el), 50);
+        return;
+    }
+    renderMathInElement(el, {
+        delimiters: [
+            { left: '$$', right: '$$', display: true },
+            { left: '$', right: '$', display: false }
+        ],
+        throwOnError: false
+    });
+};
+
+/**
+ * Copy handler for the code-block buttons emitted by the server renderer.
+ */
+window.copyCode = function (btn) {
+    const code = btn.parentElement.querySelector('code');
+    if (!code) return;
+    navigator.clipboard.writeText(code.innerText).then(() => {
+        const span = btn.querySelector('span');
+        span.innerText = 'Copied!';
+        btn.classList.add('text-green-400');
+        setTimeout(() => {
+            span.innerText = 'Copy';
+            btn.classList.remove('text-green-400');
+        }, 2000);
+    }).catch(err => {
+        console.error('Failed to copy: ', err);
+    });
+};
+
 window.copyMessage = function (btn, text) {
     navigator.clipboard.writeText(text).then(() => {
         const original = btn.innerText;
@@ -0,0 +1,258 @@
+"""
+Persistence for the `chats` / `folders` dicts, behind one small interface so the app can run
+either as a single process (JSON file, as before) or as several workers sharing a SQLite file.
+
+The app keeps working on its in-memory dicts. Mutations are reported with `mark_dirty` /
+`mark_removed` and written out by `flush`. With the SQLite backend every write gets a global,
+increasing `seq`, and `changes()` returns what *other* processes wrote since the last call, so
+each worker can fold them into its own dicts before handling a request. Concurrent edits of the
+same chat are last-writer-wins (chats are small and owned by one user, so this is acceptable).
+
+Running generations are saved with `checkpoint`, which writes only the given chats and returns the
+write itself so it can run off the event loop: SQLite updates their rows, the JSON backend appends
+them to a journal next to the file that `load` replays and the next full `flush` clears. A
+checkpointed chat that a `flush` wrote in the meantime is skipped, as the flush had its newer state.
+
+The messages' cached HTML (`rendered`, see rendering.py) is not stored; it is rebuilt on demand.
+
+Configured with STATE_BACKEND=json:db.json (default) or STATE_BACKEND=sqlite:db.sqlite3.
+"""
+
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+Records = Dict[str, dict]
+Change = Tuple[str, str, Optional[dict]]  # (kind, id, data) with kind "chat" / "folder", data None = deleted
+
+
+def _stored_message(msg: dict) -> dict:
+    msg = {k: v for k, v in msg.items() if k != "rendered"}
+    if "candidates" in msg:
+        msg["candidates"] = [_stored_message(c) for c in msg["candidates"]]
+    return msg
+
+
+def stored_chat(chat: dict) -> dict:
+    """The chat as persisted: without the messages' cached HTML."""
+    return {**chat, "messages": [_stored_message(m) for m in chat.get("messages", [])]}
+
+
+def encode_chat(chat: dict) -> str:
+    return json.dumps(stored_chat(chat), default=str)
+
+
+class JSONStateBackend:
+    """
+    Whole-state JSON dump, rewritten on every flush, plus a journal of checkpointed chats. Single
+    process only. Each flush starts a new epoch, stored in the file and on every journal line, so
+    lines from before the last flush are never replayed over it.
+    """
+
+    shared = False
+
+    def __init__(self, path: str = "db.json"):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self._epoch = 0
+        self._lock = threading.Lock()  # Checkpoint writes run in a thread
+
+    def load(self) -> Tuple[Records, Records]:
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}, {}
+        # Handle old format where it was just the chats dict
+        if not (isinstance(data, dict) and "chats" in data):
+            return data, {}
+        chats, folders = data.get("chats", {}), data.get("folders", {})
+        self._epoch = data.get("epoch", 0)
+        self._replay_journal(chats)
+        return chats, folders
+
+    def _replay_journal(self, chats: Records):
+        try:
+            f = open(self.journal_path, "r")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # Cut short by a crash: the last line, and the last write
+                if entry["epoch"] == self._epoch:
+                    chats[entry["id"]] = entry["chat"]
+
+    def mark_dirty(self, conv_id: str):
+        pass
+
+    def mark_removed(self, conv_id: str):
+        pass
+
+    def flush(self, chats: Records, folders: Records):
+        with self._lock:
+            self._epoch += 1
+            # Written aside and renamed over, so a crash mid-write never leaves a truncated file
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wt") as f:
+                json.dump({"chats": {conv_id: stored_chat(chat) for conv_id, chat in chats.items()},
+                           "folders": folders, "epoch": self._epoch}, f, indent=2, default=str)
+            os.replace(tmp_path, self.path)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.journal_path)  # Everything in it is older than the file now
+
+    def checkpoint(self, chats: Records, conv_ids: Iterable[str]) -> Callable[[], None]:
+        epoch = self._epoch
+        lines = "".join(f'{{"epoch": {epoch}, "id": {json.dumps(conv_id)}, "chat": {encode_chat(chats[conv_id])}}}\n'
+                        for conv_id in conv_ids if conv_id in chats)
+
+        def write():
+            with self._lock:
+                if self._epoch != epoch or not lines:
+                    return
+                with open(self.journal_path, "a") as f:
+                    f.write(lines)
+        return write
+
+    def changes(self) -> List[Change]:
+        return []
+
+
+class SQLiteStateBackend:
+    """
+    One row per chat / folder in a SQLite file (WAL mode) shared by every worker on the box.
+    Only chats marked dirty are rewritten; folders are few, so they are diffed against what was
+    last written instead. Deleted records stay as tombstones (data NULL) so other workers see them.
+    """
+
+    shared = True
+
+    def __init__(self, path: str = "db.sqlite3", import_json: Optional[str] = "db.json"):
+        self.path = path
+        self.import_json = import_json
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " kind TEXT NOT NULL, id TEXT NOT NULL, data TEXT, seq INTEGER NOT NULL, origin TEXT NOT NULL,"
+            " PRIMARY KEY (kind, id))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS records_seq ON records (seq)")
+        self._seen_seq = 0
+        self._dirty: Set[str] = set()
+        self._removed: Set[str] = set()
+        self._written_folders: Dict[str, str] = {}
+        self._flushes = 0
+        self._flushed_at: Dict[str, int] = {}  # Chat -> the flush that last wrote it
+        self._lock = threading.Lock()  # Checkpoint writes run in a thread
+
+    def load(self) -> Tuple[Records, Records]:
+        self._import_legacy_json()
+        chats: Records = {}
+        folders: Records = {}
+        for kind, record_id, data, seq in self._db.execute("SELECT kind, id, data, seq FROM records"):
+            self._seen_seq = max(self._seen_seq, seq)
+            if data is None:
+                continue
+            if kind == "chat":
+                chats[record_id] = json.loads(data)
+            else:
+                folders[record_id] = json.loads(data)
+                self._written_folders[record_id] = data
+        return chats, folders
+
+    def _import_legacy_json(self):
+        """First start on SQLite: take over the existing db.json, if any."""
+        if not self.import_json or self._db.execute("SELECT 1 FROM records LIMIT 1").fetchone():
+            return
+        chats, folders = JSONStateBackend(self.import_json).load()
+        if chats or folders:
+            self._dirty.update(chats)
+            self.flush(chats, folders)
+
+    def mark_dirty(self, conv_id: str):
+        self._removed.discard(conv_id)
+        self._dirty.add(conv_id)
+
+    def mark_removed(self, conv_id: str):
+        self._dirty.discard(conv_id)
+        self._removed.add(conv_id)
+
+    def flush(self, chats: Records, folders: Records):
+        rows: List[Tuple[str, str, Optional[str]]] = []
+        for conv_id in self._dirty:
+            if conv_id in chats:
+                rows.append(("chat", conv_id, encode_chat(chats[conv_id])))
+        rows.extend(("chat", conv_id, None) for conv_id in self._removed)
+        folder_rows = {folder_id: json.dumps(folder, default=str) for folder_id, folder in folders.items()}
+        for folder_id, data in folder_rows.items():
+            if self._written_folders.get(folder_id) != data:
+                rows.append(("folder", folder_id, data))
+        rows.extend(("folder", folder_id, None) for folder_id in self._written_folders if folder_id not in folder_rows)
+        self._dirty.clear()
+        self._removed.clear()
+        self._written_folders = folder_rows
+        with self._lock:
+            self._flushes += 1
+            for kind, record_id, _ in rows:
+                if kind == "chat":
+                    self._flushed_at[record_id] = self._flushes
+            self._write(rows)
+
+    def checkpoint(self, chats: Records, conv_ids: Iterable[str]) -> Callable[[], None]:
+        flushes = self._flushes
+        rows = [("chat", conv_id, encode_chat(chats[conv_id])) for conv_id in conv_ids if conv_id in chats]
+
+        def write():
+            with self._lock:
+                self._write([row for row in rows if self._flushed_at.get(row[1], 0) <= flushes])
+        return write
+
+    def _write(self, rows: List[Tuple[str, str, Optional[str]]]):
+        if not rows:
+            return
+        with self._db:  # One transaction; BEGIN IMMEDIATE serializes seq allocation between workers
+            self._db.execute("BEGIN IMMEDIATE")
+            seq = self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM records").fetchone()[0]
+            self._db.executemany(
+                "INSERT INTO records (kind, id, data, seq, origin) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (kind, id) DO UPDATE SET data = excluded.data, seq = excluded.seq, origin = excluded.origin",
+                [(kind, record_id, data, seq + i + 1, self.origin) for i, (kind, record_id, data) in enumerate(rows)]
+            )
+
+    def changes(self) -> List[Change]:
+        """Records written by other processes since the last call (or since load)."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT kind, id, data, seq, origin FROM records WHERE seq > ? ORDER BY seq", (self._seen_seq,)
+            ).fetchall()
+        changes: List[Change] = []
+        for kind, record_id, data, seq, origin in rows:
+            self._seen_seq = seq
+            if origin == self.origin:
+                continue
+            if kind == "folder":
+                if data is None:
+                    self._written_folders.pop(record_id, None)
+                else:
+                    self._written_folders[record_id] = data
+            changes.append((kind, record_id, json.loads(data) if data is not None else None))
+        return changes
+
+
+def create_state_backend(spec: Optional[str]):
+    """Backend from a "json:path" / "sqlite:path" spec (JSON db.json when unset)."""
+    kind, _, path = (spec or "json:db.json").partition(":")
+    if kind == "json":
+        return JSONStateBackend(path or "db.json")
+    if kind == "sqlite":
+        return SQLiteStateBackend(path or "db.sqlite3")
+    raise ValueError(f"Unknown STATE_BACKEND '{spec}', expected json:<path> or sqlite:<path>")
@@ -0,0 +1,12 @@
+"""Shared setup: the repo's modules importable, loaded as the app loads them, on throwaway state."""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # Templates and the providers config are loaded relative to the repo
+# Before main is imported by any test: its state backend is created at import time
+os.environ.setdefault("STATE_BACKEND", "sqlite:" + os.path.join(tempfile.mkdtemp(), "db.sqlite3"))
+os.environ.setdefault("HFC_ENABLE_MOCK", "1")  # The tests generate against the local mock provider
@@ -0,0 +1,61 @@
+"""The stateless complete/stream API: per-call messages and parameters, nothing kept on the client."""
+
+import asyncio
+
+import pytest
+
+import generation_workers
+from LLMConnect.mock_server import MockConfig, MockServer
+from LLMConnect.top import AsyncAPIClient, SyncAPIClient
+
+HISTORY = [{"role": "system", "content": "s"}, {"role": "user", "content": "hi"}]
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = MockServer(port=0, config=MockConfig(ttft=0.0, tps=0, tokens=50)).start()
+    yield server
+    server.shutdown()
+
+
+def test_concurrent_calls_on_one_client_keep_their_own_parameters(server):
+    async def run():
+        async with AsyncAPIClient("key", server.base_url, "mock-model", max_completion_tokens=40) as client:
+            async def streamed(n: int) -> str:
+                return "".join([delta async for delta in client.stream(HISTORY, max_completion_tokens=n)])
+
+            replies = await asyncio.gather(*(streamed(n) for n in range(1, 21)),
+                                           client.complete(HISTORY, max_completion_tokens=7),
+                                           client.complete(HISTORY))
+            assert client.messages == [] and client.max_completion_tokens == 40  # Nothing stored
+            return replies
+
+    replies = asyncio.run(run())
+    assert [len(reply.split()) for reply in replies] == list(range(1, 21)) + [7, 40]
+
+
+def test_sync_client_has_the_same_api(server):
+    with SyncAPIClient("key", server.base_url, "mock-model") as client:
+        assert len(client.complete(HISTORY, max_completion_tokens=3).split()) == 3
+        assert len("".join(client.stream(HISTORY, max_completion_tokens=5)).split()) == 5
+        assert client.messages == []
+
+
+def test_malformed_messages_are_rejected_before_any_request():
+    client = SyncAPIClient("key", "http://127.0.0.1:9", "mock-model")  # Nothing listens there
+    with pytest.raises(ValueError):
+        client.complete([{"role": "user"}])
+    with pytest.raises(ValueError):
+        client.stream([])
+
+
+def test_generations_share_one_client_per_provider_and_model():
+    async def run():
+        try:
+            client = generation_workers.get_client("mock", "mock-model")
+            assert generation_workers.get_client("mock", "mock-model") is client
+        finally:
+            await generation_workers.close_clients()
+        assert generation_workers.clients == {}
+
+    asyncio.run(run())
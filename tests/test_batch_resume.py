@@ -0,0 +1,22 @@
+"""`python -m LLMConnect.batch --resume`: what is kept of a previous run's output."""
+
+import json
+
+from LLMConnect.batch import _keep_successes
+
+
+def test_failed_results_are_dropped_before_the_retries(tmp_path):
+    output = tmp_path / "out.jsonl"
+    output.write_text(
+        json.dumps({"id": 0, "content": "a", "error": None}) + "\n"
+        + json.dumps({"id": 1, "content": None, "error": "HTTP 500"}) + "\n"
+        + json.dumps({"id": 2, "content": "c", "error": None}) + "\n"
+        + '{"id": 3, "cont'  # Cut short by the interrupted run
+    )
+
+    assert _keep_successes(str(output)) == {0, 2}
+    assert [json.loads(line)["id"] for line in output.read_text().splitlines()] == [0, 2]
+
+
+def test_missing_output_has_nothing_to_skip(tmp_path):
+    assert _keep_successes(str(tmp_path / "out.jsonl")) == set()
@@ -0,0 +1,57 @@
+"""Sidebar indexes: folder membership, recency order and keyset pages."""
+
+from chat_index import ChatIndex, decode_cursor, encode_cursor
+
+
+def chats(n: int, folder_id=None) -> dict:
+    return {f"c{i:02d}": {"folder_id": folder_id, "updated_at": f"2026-01-01T00:00:{i:02d}"} for i in range(n)}
+
+
+def walk(index: ChatIndex, folder_id=None, limit: int = 4) -> list:
+    """Every id of a folder, page by page, through the cursors as the client sends them back."""
+    ids, cursor = [], None
+    while True:
+        page, next_key = index.page(folder_id, limit, decode_cursor(cursor))
+        ids.extend(page)
+        if next_key is None:
+            return ids
+        cursor = encode_cursor(next_key)
+
+
+def test_pages_list_pinned_then_newest_first():
+    data = chats(10)
+    data["c03"]["is_pinned"] = True
+    index = ChatIndex()
+    index.rebuild(data)
+    assert walk(index) == ["c03", "c09", "c08", "c07", "c06", "c05", "c04", "c02", "c01", "c00"]
+
+
+def test_cursor_stays_valid_while_chats_move():
+    data = chats(10)
+    index = ChatIndex()
+    index.rebuild(data)
+    first, next_key = index.page(None, 4)
+    assert first == ["c09", "c08", "c07", "c06"]
+
+    # c08 is updated (moves to the top) and c02 deleted between the two page loads
+    data["c08"]["updated_at"] = "2026-01-02T00:00:00"
+    index.upsert("c08", data["c08"])
+    index.remove("c02")
+
+    second, _ = index.page(None, 4, decode_cursor(encode_cursor(next_key)))
+    assert second == ["c05", "c04", "c03", "c01"]  # No repeats, no skipped chats
+
+
+def test_folders_are_separate_buckets():
+    index = ChatIndex()
+    index.rebuild({**chats(3), **{"f": {"folder_id": "work", "updated_at": "2026-01-01T00:00:00"}}})
+    assert index.count(None) == 3 and index.count("work") == 1
+
+    index.upsert("c00", {"folder_id": "work", "updated_at": "2026-01-01T00:00:00"})
+    assert index.folder_of("c00") == "work"
+    assert index.counts() == {None: 2, "work": 2}
+
+
+def test_malformed_cursor_means_first_page():
+    assert decode_cursor("not a cursor") is None
+    assert decode_cursor(None) is None
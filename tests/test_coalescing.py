@@ -0,0 +1,52 @@
+"""Coalescer: when the text streamed so far becomes a token event."""
+
+import pytest
+
+import coalescing
+from coalescing import Coalescer
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(coalescing.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_first_text_goes_out_at_once(clock):
+    assert Coalescer().delay(3) == 0.0
+
+
+def test_deltas_wait_for_the_window(clock):
+    coalescer = Coalescer(min_interval=0.05, render_bytes_per_second=1e9)
+    coalescer.emitted(3, started=clock[0])
+    assert coalescer.delay(5) == pytest.approx(0.05)
+    clock[0] += 0.03
+    assert coalescer.delay(8) == pytest.approx(0.02)
+    clock[0] += 0.03
+    assert coalescer.delay(8) == 0.0
+    assert coalescer.events == 1
+
+
+def test_a_full_batch_is_not_held_back(clock):
+    coalescer = Coalescer(max_bytes=100)
+    coalescer.emitted(10, started=clock[0])
+    assert coalescer.delay(109) > 0
+    assert coalescer.delay(110) == 0.0
+
+
+def test_window_grows_with_the_message_and_is_capped():
+    coalescer = Coalescer(min_interval=0.05, max_interval=0.25, render_bytes_per_second=100_000)
+    assert coalescer.window(0) == pytest.approx(0.05)
+    assert coalescer.window(10_000) == pytest.approx(0.15)
+    assert coalescer.window(1_000_000) == 0.25
+
+
+def test_slow_sends_widen_the_window(clock):
+    coalescer = Coalescer(min_interval=0.05, render_bytes_per_second=1e9)
+    for _ in range(20):
+        started = clock[0]
+        clock[0] += 0.05  # Every event takes 50 ms to be accepted by the transport
+        coalescer.emitted(10, started)
+    assert coalescer.send_time == pytest.approx(0.05, rel=0.02)
+    assert coalescer.window(10) == pytest.approx(0.15, rel=0.02)
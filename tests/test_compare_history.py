@@ -0,0 +1,39 @@
+"""A finished compare turn, as the chat history renders it after a reload."""
+
+from fastapi.testclient import TestClient
+
+import main
+
+
+def add_compare_chat(conv_id: str):
+    main.chats[conv_id] = {
+        "id": conv_id, "title": "t", "provider": "mock", "model": "mock-model",
+        "messages": [
+            {"role": "system", "content": "s"},
+            {"role": "user", "content": "hi"},
+            {"role": "assistant", "content": "first answer", "status": "complete", "winner": 0, "candidates": [
+                {"provider": "mock", "model": "a", "content": "first answer", "status": "complete"},
+                {"provider": "mock", "model": "b", "content": "second answer", "status": "complete"},
+                {"provider": "mock", "model": "c", "content": "Error: boom", "status": "error"},
+            ]},
+        ],
+    }
+
+
+def test_history_shows_the_other_candidates_as_alternatives():
+    add_compare_chat("cmp-history")
+    html = TestClient(main.app).get("/chat/cmp-history/history").text
+
+    assert "first answer" in html
+    assert html.count("Alternative:") == 1  # The winner is the message; the failed one is dropped
+    assert "second answer" in html
+    assert "/chat/cmp-history/message/1/keep/1" in html
+
+
+def test_keeping_an_alternative_swaps_it_with_the_winner():
+    add_compare_chat("cmp-keep")
+    html = TestClient(main.app).post("/chat/cmp-keep/message/1/keep/1").text
+
+    assert main.chats["cmp-keep"]["messages"][2]["content"] == "second answer"
+    assert "/chat/cmp-keep/message/1/keep/0" in html
+    assert "/chat/cmp-keep/message/1/keep/1" not in html
@@ -0,0 +1,83 @@
+"""CompressionMiddleware: negotiation, whole and streamed bodies, SSE flushing, Vary and ETags."""
+
+import asyncio
+import zlib
+
+import pytest
+
+from compression import CompressionMiddleware, brotli, choose_encoding
+
+BIG = b"<p>" + b"hello world " * 100 + b"</p>"
+
+
+def app_sending(status: int, headers: list, *bodies: bytes):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        for i, body in enumerate(bodies):
+            await send({"type": "http.response.body", "body": body, "more_body": i < len(bodies) - 1})
+    return app
+
+
+def call(app, request_headers: dict, minimum_size: int = 500):
+    """Run one GET through the middleware; returns the start message and the body messages."""
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": "GET", "headers": [(k.encode(), v.encode()) for k, v in request_headers.items()]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=minimum_size)(scope, None, send))
+    return {k.decode(): v.decode() for k, v in messages[0]["headers"]}, messages[1:]
+
+
+def test_encoding_negotiation():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("*") == "gzip"
+    assert choose_encoding("") is None
+    assert choose_encoding("br, gzip") == ("br" if brotli is not None else "gzip")
+
+
+def test_large_html_is_gzipped_with_a_weak_etag():
+    headers, bodies = call(app_sending(200, [(b"content-type", b"text/html"), (b"etag", b'"v1"')], BIG),
+                           {"accept-encoding": "gzip"})
+    assert headers["content-encoding"] == "gzip"
+    assert headers["etag"] == 'W/"v1"'
+    assert headers["vary"] == "Accept-Encoding"
+    assert zlib.decompress(bodies[0]["body"], zlib.MAX_WBITS | 16) == BIG
+    assert int(headers["content-length"]) == len(bodies[0]["body"])
+
+
+@pytest.mark.skipif(brotli is None, reason="brotli is not installed")
+def test_brotli_is_preferred_when_available():
+    headers, bodies = call(app_sending(200, [(b"content-type", b"text/html")], BIG), {"accept-encoding": "gzip, br"})
+    assert headers["content-encoding"] == "br"
+    assert brotli.decompress(bodies[0]["body"]) == BIG
+
+
+def test_every_sse_event_is_decodable_on_arrival():
+    events = [b"data: %d\n\n" % i for i in range(3)]
+    headers, bodies = call(app_sending(200, [(b"content-type", b"text/event-stream")], *events),
+                           {"accept-encoding": "gzip"})
+    assert headers["content-encoding"] == "gzip" and "content-length" not in headers
+    decoder = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    # Each chunk decodes to its whole event without waiting for the next one
+    assert [decoder.decompress(message["body"]) for message in bodies] == events
+
+
+def test_uncompressed_responses_still_vary_on_accept_encoding():
+    small, _ = call(app_sending(200, [(b"content-type", b"text/html")], b"<p>hi</p>"), {"accept-encoding": "gzip"})
+    identity, _ = call(app_sending(200, [(b"content-type", b"text/html"), (b"vary", b"Cookie")], BIG), {})
+    assert "content-encoding" not in small and small["vary"] == "Accept-Encoding"
+    assert "content-encoding" not in identity and identity["vary"] == "Cookie, Accept-Encoding"
+
+    image, _ = call(app_sending(200, [(b"content-type", b"image/png")], BIG), {"accept-encoding": "gzip"})
+    assert "vary" not in image  # Never compressed here: one variant
+
+
+def test_304_carries_the_etag_as_the_client_holds_it():
+    not_modified = app_sending(304, [(b"etag", b'"v1"')], b"")
+    weak, _ = call(not_modified, {"accept-encoding": "gzip", "if-none-match": 'W/"v1"'})
+    strong, _ = call(not_modified, {"accept-encoding": "gzip", "if-none-match": '"v1"'})
+    assert weak["etag"] == 'W/"v1"' and strong["etag"] == '"v1"'
+    assert weak["vary"] == "Accept-Encoding"
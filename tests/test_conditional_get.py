@@ -0,0 +1,66 @@
+"""ETag / If-None-Match on the history, sidebar and model-options partials."""
+
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+
+def add_chat(conv_id: str, status: str = "complete") -> dict:
+    main.chats[conv_id] = {
+        "id": conv_id, "title": "t", "provider": "mock", "model": "mock-model",
+        "timestamp": "2026-01-01T00:00:00", "updated_at": "2026-01-01T00:00:00",
+        "messages": [
+            {"role": "system", "content": "s"},
+            {"role": "user", "content": "hi"},
+            {"role": "assistant", "content": "hello", "status": status, "heartbeat": time.time()},
+        ],
+    }
+    main.bump_chat_version(conv_id)
+    return main.chats[conv_id]
+
+
+def revalidate(url: str):
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+    return etag, client.get(url, headers={"If-None-Match": etag})
+
+
+def test_unchanged_history_is_a_304_and_a_change_invalidates_it():
+    add_chat("etag-history")
+    etag, again = revalidate("/chat/etag-history/history")
+    assert again.status_code == 304 and again.headers["ETag"] == etag and not again.content
+
+    main.chats["etag-history"]["messages"][-1]["content"] = "edited"
+    main.bump_chat_version("etag-history")
+    changed = client.get("/chat/etag-history/history", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+
+
+def test_streaming_history_is_never_cached():
+    add_chat("etag-streaming", status="streaming")
+    main.generating.add("etag-streaming")  # Owned by a generation here: not settled as orphaned
+    try:
+        response = client.get("/chat/etag-streaming/history", headers={"If-None-Match": "*"})
+    finally:
+        main.generating.discard("etag-streaming")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-store"
+    assert "ETag" not in response.headers
+
+
+def test_sidebar_etag_follows_the_sidebar_version():
+    etag, again = revalidate("/sidebar")
+    assert again.status_code == 304
+    main.bump_sidebar_version()
+    assert client.get("/sidebar", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_model_options_revalidate():
+    _, again = revalidate("/partials/model-options?provider=mock")
+    assert again.status_code == 304
@@ -0,0 +1,33 @@
+"""What a generation leaves on disk when it ends, including the error paths before the first token."""
+
+import asyncio
+import os
+import time
+
+import main
+from storage import create_state_backend
+
+
+def persisted(conv_id: str) -> dict:
+    """The chat as a fresh process would load it."""
+    chats, _ = create_state_backend(os.environ["STATE_BACKEND"]).load()
+    return chats[conv_id]
+
+
+def test_unsupported_provider_error_is_persisted():
+    main.chats["exit-provider"] = {
+        "id": "exit-provider", "title": "t", "provider": "no-such-provider", "model": "m",
+        "messages": [
+            {"role": "system", "content": "s"},
+            {"role": "user", "content": "hi"},
+            {"role": "assistant", "content": "", "status": "streaming", "heartbeat": time.time()},
+        ],
+    }
+    main.bump_chat_version("exit-provider")
+    main.write_db_to_disk()
+
+    asyncio.run(main.run_chatbot_logic("exit-provider"))
+
+    assistant = persisted("exit-provider")["messages"][-1]
+    assert assistant["status"] == "error"
+    assert "Unsupported provider" in assistant["content"]
@@ -0,0 +1,102 @@
+"""Generation worker processes: dead workers fail their jobs, and their metrics reach the web process."""
+
+import asyncio
+import time
+
+import pytest
+
+from generation_workers import GenerationPool, RemoteGenerationError
+from LLMConnect.metrics import MetricsRegistry
+from LLMConnect.mock_server import MockConfig, MockServer
+
+HISTORY = [{"role": "user", "content": "hi"}]
+
+
+@pytest.fixture(scope="module")
+def mock_provider():
+    # The "mock" provider of providers_config.json; one already running there (load tests) is used as is
+    try:
+        server = MockServer(port=8399, config=MockConfig(ttft=0.05, tps=200, tokens=100)).start()
+    except OSError:
+        yield None
+        return
+    yield server
+    server.shutdown()
+
+
+def test_dead_worker_fails_its_jobs_under_load(mock_provider):
+    async def scenario():
+        pool = GenerationPool(2)
+        pool.start()
+        try:
+            victim = await pool.open("mock", "mock-model")
+            busy = await pool.open("mock", "mock-model")  # Least busy: the other worker
+            assert pool._job_worker[victim.job_id] is not pool._job_worker[busy.job_id]
+
+            keep_streaming = True
+
+            async def steady_load():
+                # Results keep flowing from the surviving worker the whole time
+                while keep_streaming:
+                    async for _ in busy.stream(HISTORY):
+                        pass
+
+            load = asyncio.create_task(steady_load())
+            deltas = victim.stream(HISTORY)
+            await deltas.__anext__()
+            pool._job_worker[victim.job_id].process.kill()
+            killed_at = time.monotonic()
+            with pytest.raises(RemoteGenerationError):
+                async for _ in deltas:
+                    pass
+            detected_after = time.monotonic() - killed_at
+            assert not load.done()  # Still under load when the dead worker was noticed
+            keep_streaming = False
+            await asyncio.wait_for(load, 10)
+            await busy.close()
+            await victim.close()
+            return detected_after
+        finally:
+            pool.stop()
+
+    detected_after = asyncio.run(asyncio.wait_for(scenario(), 30))
+    assert detected_after < 3.0
+
+
+def streamed_tokens(pool: GenerationPool) -> float:
+    registry = MetricsRegistry.merged(pool.metrics_snapshots())
+    return sum(counter.value for _, counter in registry.counter("llm_stream_tokens_total", "").children())
+
+
+def test_worker_metrics_are_kept_across_a_replacement(mock_provider, monkeypatch):
+    monkeypatch.setenv("WORKER_METRICS_SECONDS", "0.05")  # Read by the spawned workers
+
+    async def wait_for_tokens(pool: GenerationPool, minimum: float) -> float:
+        for _ in range(100):
+            if streamed_tokens(pool) >= minimum:
+                break
+            await asyncio.sleep(0.05)
+        return streamed_tokens(pool)
+
+    async def scenario():
+        pool = GenerationPool(1)
+        pool.start()
+        try:
+            client = await pool.open("mock", "mock-model")
+            reply = "".join([delta async for delta in client.stream(HISTORY)])
+            await client.close()
+            tokens = await wait_for_tokens(pool, 1)
+            assert tokens >= len(reply.split())
+
+            worker = pool._workers[0]
+            worker.process.kill()
+            for _ in range(100):
+                if pool._workers[0] is not worker:
+                    break
+                await asyncio.sleep(0.05)
+            assert pool._workers[0] is not worker
+            assert streamed_tokens(pool) == tokens  # The replaced worker's counts are still there
+        finally:
+            pool.stop()
+
+    asyncio.run(asyncio.wait_for(scenario(), 30))
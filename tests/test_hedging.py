@@ -0,0 +1,72 @@
+"""Hedged streams: which time to first token ends up in the policy's window."""
+
+import asyncio
+
+from LLMConnect.hedging import HEDGES_FIRED, HEDGES_WON, HedgeBudget, HedgePolicy, hedged_stream
+
+
+async def tokens(first_after: float, text: str):
+    await asyncio.sleep(first_after)
+    yield text
+
+
+def collect(primary_after: float, hedge_after: float, policy: HedgePolicy) -> list:
+    async def run():
+        stream = hedged_stream(tokens(primary_after, "primary"), [lambda: tokens(hedge_after, "hedge")], policy)
+        return [content async for content in stream]
+    return asyncio.run(run())
+
+
+def test_primary_win_records_its_ttft():
+    policy = HedgePolicy(initial_delay=0.05, min_delay=0.01)
+    assert collect(0.01, 0.01, policy) == ["primary"]
+    assert len(policy.tracker) == 1
+
+
+def test_hedge_win_records_a_lower_bound_for_the_primary():
+    policy = HedgePolicy(initial_delay=0.05, min_delay=0.01, name="lower-bound")
+    assert collect(1.0, 0.01, policy) == ["hedge"]
+    assert policy.hedges_won == 1
+    assert HEDGES_FIRED.labels("lower-bound").value == HEDGES_WON.labels("lower-bound").value == 1
+    assert len(policy.tracker) == 1
+    assert policy.tracker.percentile(50) >= 0.05  # At least the hedge delay, not the hedge's own TTFT
+
+
+def test_slow_primaries_beaten_by_hedges_do_not_lower_the_delay():
+    policy = HedgePolicy(percentile=95, initial_delay=0.1, min_delay=0.001, min_samples=5, window=5,
+                         budget=HedgeBudget(ratio=1.0, burst=100))
+    for _ in range(5):
+        collect(0.1, 1.0, policy)
+    delay = policy.hedge_delay()
+
+    # Half of the primaries are now slow, and lose to a fast hedge
+    for primary_after in [1.0, 0.02] * 5:
+        collect(primary_after, 0.01, policy)
+
+    assert policy.hedge_delay() >= 0.9 * delay
+
+
+def test_hedges_get_the_callers_timeout():
+    from LLMConnect.api_client_factory import APIClientFactory, Provider
+
+    timeouts = []
+
+    class Target:
+        model = "hedge-model"
+
+        async def _stream_content(self, data, timeout=None):
+            timeouts.append(timeout)
+            yield "hedge"
+
+    async def run():
+        client = APIClientFactory.create_async_client(Provider("mock"), hedge_policy=HedgePolicy(initial_delay=0.01))
+        client._hedge_targets = [Target()]
+        client._stream_content = lambda data, timeout=None: tokens(1.0, "primary")
+        try:
+            return [content async for content in client.stream([{"role": "user", "content": "hi"}], timeout=7.0)]
+        finally:
+            client._hedge_targets = []
+            await client.close()
+
+    assert asyncio.run(run()) == ["hedge"]
+    assert timeouts == [7.0]
@@ -0,0 +1,20 @@
+"""send_message under event-loop lag: a 503 the chat form can show, no new chat created."""
+
+from fastapi.testclient import TestClient
+
+import main
+
+client = TestClient(main.app)
+
+
+def test_shed_message_says_when_to_retry(monkeypatch):
+    monkeypatch.setattr(main.loop_monitor, "admit", lambda: False)
+    monkeypatch.setattr(main.loop_monitor, "lag", 1.0)
+    count = len(main.chats)
+
+    response = client.post("/chat/new/send-message", data={"message": "hi", "provider": "mock", "model": "mock-model"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "4"
+    assert "retry in 4 s" in response.text
+    assert len(main.chats) == count
@@ -0,0 +1,28 @@
+"""Registry snapshots, as sent by the generation workers, added up for /metrics."""
+
+import pickle
+
+from LLMConnect.metrics import MetricsRegistry
+
+
+def registry(tokens: float, *latencies: float) -> MetricsRegistry:
+    registry = MetricsRegistry()
+    registry.counter("tokens_total", "Tokens", ("model",)).labels("m1").inc(tokens)
+    histogram = registry.histogram("ttft_seconds", "TTFT", ("model",), buckets=(0.1, 1.0)).labels("m1")
+    for latency in latencies:
+        histogram.observe(latency)
+    return registry
+
+
+def test_snapshots_add_up():
+    web, worker = registry(0), registry(5, 0.05, 2.0)
+    worker.counter("hedges_total", "Hedges").inc()
+    snapshot = pickle.loads(pickle.dumps(worker.snapshot()))  # As it crosses the result pipe
+
+    merged = MetricsRegistry.merged([web.snapshot(), snapshot, registry(2, 0.5).snapshot()])
+
+    assert merged.counter("tokens_total", "").labels("m1").value == 7
+    assert merged.histogram("ttft_seconds", "").labels("m1").snapshot() == ([1, 1, 1], 2.55, 3)
+    exposition = merged.render_prometheus()
+    assert 'ttft_seconds_bucket{model="m1",le="1"} 2' in exposition
+    assert "hedges_total 1" in exposition
@@ -0,0 +1,12 @@
+"""Provider registration: the local mock provider is opt-in."""
+
+from LLMConnect.api_client_factory import Provider, load_provider_configs
+
+
+def test_mock_provider_needs_the_env_flag(monkeypatch):
+    monkeypatch.delenv("HFC_ENABLE_MOCK", raising=False)
+    configs = load_provider_configs()
+    assert Provider.MOCK not in configs and Provider.GROQ in configs
+
+    monkeypatch.setenv("HFC_ENABLE_MOCK", "1")
+    assert load_provider_configs()[Provider.MOCK].base_url.startswith("http://127.0.0.1")
@@ -0,0 +1,50 @@
+"""The relay broker itself: slow subscribers and socket cleanup."""
+
+import asyncio
+import json
+import os
+
+from relay import StreamRelay
+
+
+def test_a_stuck_subscriber_is_dropped_not_buffered(tmp_path):
+    path = str(tmp_path / "relay.sock")
+
+    async def run():
+        relay = StreamRelay(path, max_buffer=16 * 1024)
+        await relay.start()
+        try:
+            # Subscribes, then never reads again
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(json.dumps({"op": "sub", "ch": "slow"}).encode() + b"\n")
+            await writer.drain()
+            await asyncio.sleep(0.1)
+
+            delta = "x" * 8192
+            for _ in range(300):  # Far more than the socket buffers and max_buffer together
+                relay.publish("slow", delta)
+                await asyncio.sleep(0)
+            await asyncio.sleep(0.2)
+
+            received = 0
+            while chunk := await asyncio.wait_for(reader.read(1 << 16), 5):
+                received += len(chunk)
+            assert received < 300 * len(delta)  # Cut off: the connection ended early
+            writer.close()
+        finally:
+            await relay.stop()
+
+    asyncio.run(run())
+
+
+def test_stop_tolerates_a_removed_socket(tmp_path):
+    path = str(tmp_path / "relay.sock")
+
+    async def run():
+        relay = StreamRelay(path)
+        await relay.start()
+        assert relay.is_broker
+        os.unlink(path)
+        await relay.stop()
+
+    asyncio.run(run())
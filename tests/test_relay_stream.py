@@ -0,0 +1,86 @@
+"""A bot-stream served by another worker than the generation, through the stream relay."""
+
+import asyncio
+import json
+import time
+
+import main
+from relay import StreamRelay
+
+
+def add_streaming_chat(conv_id: str) -> dict:
+    """A chat whose generation runs "in another worker": streaming, fresh heartbeat, not in `generating`."""
+    assistant = {"role": "assistant", "content": "", "status": "streaming", "heartbeat": time.time()}
+    main.chats[conv_id] = {
+        "id": conv_id, "title": "t", "provider": "mock", "model": "mock-model",
+        "messages": [{"role": "system", "content": "s"}, {"role": "user", "content": "hi"}, assistant],
+    }
+    return assistant
+
+
+async def follow(conv_id: str) -> list:
+    events = []
+    async for event in main.relay_bot_response_stream(conv_id):
+        name, data = event.strip().split("\n")
+        events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def run_with_relay(tmp_path, scenario):
+    async def run():
+        main.stream_relay = StreamRelay(str(tmp_path / "relay.sock"))
+        await main.stream_relay.start()
+        try:
+            return await asyncio.wait_for(scenario(main.stream_relay), 10)
+        finally:
+            await main.stream_relay.stop()
+            main.stream_relay = None
+    return asyncio.run(run())
+
+
+def finish(relay: StreamRelay, conv_id: str, assistant: dict, content: str):
+    assistant["content"] = content
+    assistant["status"] = "complete"
+    relay.end(conv_id, "complete", content)
+
+
+def test_subscribed_before_the_generation_started(tmp_path):
+    # The broker has never seen the channel: the bot-stream must wait, not end empty
+    assistant = add_streaming_chat("relay-early")
+
+    async def scenario(relay):
+        follower = asyncio.create_task(follow("relay-early"))
+        await asyncio.sleep(0.6)
+        assert not follower.done()
+        relay.publish("relay-early", "")  # What run_chatbot_logic sends when it starts
+        await asyncio.sleep(0.4)  # Resubscribed by now, before any delta
+        relay.publish("relay-early", "Hello")
+        relay.publish("relay-early", " world")
+        await asyncio.sleep(0.1)
+        finish(relay, "relay-early", assistant, "Hello world")
+        return await follower
+
+    events = run_with_relay(tmp_path, scenario)
+    done = events[-1][1]
+    assert events[-1][0] == "done"
+    assert done["content"] == "Hello world" and done["message_status"] == "complete"
+    assert events[-2] == ("token", "Hello world")
+
+
+def test_subscribed_between_start_and_first_delta(tmp_path):
+    assistant = add_streaming_chat("relay-start")
+
+    async def scenario(relay):
+        relay.publish("relay-start", "")
+        await asyncio.sleep(0.1)
+        follower = asyncio.create_task(follow("relay-start"))
+        await asyncio.sleep(0.3)
+        assert not follower.done()
+        relay.publish("relay-start", "partial")
+        await asyncio.sleep(0.3)
+        finish(relay, "relay-start", assistant, "partial answer")
+        return await follower
+
+    events = run_with_relay(tmp_path, scenario)
+    assert ("token", "partial") in events
+    assert events[-1][0] == "done" and events[-1][1]["content"] == "partial answer"
@@ -0,0 +1,15 @@
+"""Server-side markdown rendering of messages that contain math."""
+
+import rendering
+
+
+def test_math_is_restored_verbatim():
+    body, math = rendering._render("a $x_1$ *b* and $$y<z$$ `$c$`")
+    assert math
+    assert body == "<p>a $x_1$ <em>b</em> and $$y&lt;z$$ <code>$c$</code></p>\n"
+
+
+def test_text_that_looks_like_a_placeholder_is_left_alone():
+    for text in ["MATHPH5X and $x$", "\ue0005\ue000 $x$", "\ue0000\ue000 $x$"]:
+        body, _ = rendering._render(text)
+        assert body == f"<p>{text}</p>\n"
@@ -0,0 +1,76 @@
+"""Full-text search: BM25 ranking, prefix matching and the background build."""
+
+import asyncio
+import threading
+
+from search_index import TITLE, SearchIndex, snippet
+
+
+def chat(title: str, *contents: str) -> dict:
+    return {"title": title, "messages": [{"role": "system", "content": "s"}]
+            + [{"role": "user", "content": content} for content in contents]}
+
+
+def built(chats: dict) -> SearchIndex:
+    index = SearchIndex()
+    index.rebuild(chats.items())
+    return index
+
+
+def test_rarer_and_denser_matches_rank_first():
+    index = built({
+        "once": chat("t1", "kafka consumer lag, and some other words to make this longer"),
+        "twice": chat("t2", "kafka kafka"),
+        "none": chat("t3", "postgres vacuum"),
+    })
+    assert [hit.conv_id for hit in index.search("kafka")] == ["twice", "once"]
+
+
+def test_title_matches_are_boosted():
+    index = built({"body": chat("notes", "rust lifetimes"), "title": chat("rust", "notes")})
+    hits = index.search("rust")
+    assert hits[0].conv_id == "title" and hits[0].msg_index == TITLE
+
+
+def test_last_word_is_a_prefix_and_every_word_must_match():
+    index = built({"a": chat("t", "streaming responses"), "b": chat("t", "streaming only")})
+    assert {hit.conv_id for hit in index.search("stream")} == {"a", "b"}
+    assert [hit.conv_id for hit in index.search("streaming resp")] == ["a"]
+    assert index.search("stream resp") == []  # Only the last word is a prefix
+
+
+def test_streaming_messages_are_not_indexed():
+    index = built({"a": {"title": "t", "messages": [{"role": "assistant", "content": "partial", "status": "streaming"}]}})
+    assert index.search("partial") == []
+
+
+def test_snippet_highlights_and_escapes():
+    assert str(snippet("<b> kafka consumers", "kafka cons")) == "&lt;b&gt; <mark>kafka</mark> <mark>consumers</mark>"
+
+
+class GatedIndex(SearchIndex):
+    """Its builds (which run on fresh instances of the class) wait for `release`."""
+    release = threading.Event()
+
+    def rebuild(self, chats):
+        self.release.wait(5)
+        super().rebuild(chats)
+
+
+def test_build_runs_off_the_loop_and_applies_updates_made_meanwhile():
+    chats = {"old": chat("t", "alpha")}
+    index = GatedIndex()
+
+    async def run():
+        build = asyncio.create_task(index.build(chats))
+        await asyncio.sleep(0.05)
+        assert not index.ready and index.search("alpha") == []  # The loop is free meanwhile
+        chats["new"] = chat("t", "beta")
+        index.index_conversation("new", chats["new"])
+        GatedIndex.release.set()
+        await build
+
+    asyncio.run(run())
+    assert index.ready
+    assert [hit.conv_id for hit in index.search("alpha")] == ["old"]
+    assert [hit.conv_id for hit in index.search("beta")] == ["new"]
@@ -0,0 +1,94 @@
+"""State backends: full flushes and the incremental checkpoints of running generations."""
+
+import os
+
+from storage import JSONStateBackend, SQLiteStateBackend
+
+
+def chat(conv_id: str, content: str, status: str = "streaming") -> dict:
+    return {"id": conv_id, "title": "t", "messages": [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": content, "status": status,
+         "rendered": {"hash": "h", "html": "<p>cached</p>", "math": False}},
+    ]}
+
+
+def test_json_checkpoint_is_journaled_and_replayed(tmp_path):
+    path = str(tmp_path / "db.json")
+    backend = JSONStateBackend(path)
+    chats = {"a": chat("a", ""), "b": chat("b", "other")}
+    backend.flush(chats, {})
+    size = os.path.getsize(path)
+
+    chats["a"]["messages"][1]["content"] = "partial"
+    backend.checkpoint(chats, ["a"])()
+
+    assert os.path.getsize(path) == size  # Only the journal grew
+    loaded, _ = JSONStateBackend(path).load()
+    assert loaded["a"]["messages"][1]["content"] == "partial"
+    assert loaded["b"]["messages"][1]["content"] == "other"
+
+
+def test_json_flush_supersedes_the_journal(tmp_path):
+    path = str(tmp_path / "db.json")
+    backend = JSONStateBackend(path)
+    chats = {"a": chat("a", "")}
+    backend.flush(chats, {})
+    backend.checkpoint(chats, ["a"])()
+    late = backend.checkpoint(dict(chats, a=chat("a", "stale")), ["a"])
+
+    chats["a"] = chat("a", "done", "complete")
+    backend.flush(chats, {})
+    late()  # Prepared before the flush: dropped
+
+    loaded, _ = JSONStateBackend(path).load()
+    assert loaded["a"]["messages"][1]["content"] == "done"
+    assert not os.path.exists(path + ".journal")
+
+
+def test_cached_html_is_not_persisted(tmp_path):
+    path = str(tmp_path / "db.json")
+    JSONStateBackend(path).flush({"a": chat("a", "x", "complete")}, {})
+    loaded, _ = JSONStateBackend(path).load()
+    assert "rendered" not in loaded["a"]["messages"][1]
+
+
+def test_sqlite_checkpoint_skips_chats_a_flush_wrote_since(tmp_path):
+    path = str(tmp_path / "db.sqlite3")
+    backend = SQLiteStateBackend(path, import_json=None)
+    chats = {"a": chat("a", ""), "b": chat("b", "")}
+    late = backend.checkpoint(dict(chats, a=chat("a", "stale"), b=chat("b", "partial")), ["a", "b"])
+
+    chats["a"] = chat("a", "done", "complete")
+    backend.mark_dirty("a")
+    backend.flush(chats, {})
+    late()
+
+    loaded, _ = SQLiteStateBackend(path, import_json=None).load()
+    assert loaded["a"]["messages"][1]["content"] == "done"
+    assert loaded["b"]["messages"][1]["content"] == "partial"
+    assert "rendered" not in loaded["b"]["messages"][1]
+
+
+def test_sqlite_changes_are_other_workers_writes_and_deletions(tmp_path):
+    path = str(tmp_path / "db.sqlite3")
+    one, two = SQLiteStateBackend(path, import_json=None), SQLiteStateBackend(path, import_json=None)
+    one.load()
+    two.load()
+    chats = {"a": chat("a", "x", "complete"), "b": chat("b", "y", "complete")}
+    one.mark_dirty("a")
+    one.mark_dirty("b")
+    one.flush(chats, {"f": {"name": "Work"}})
+
+    assert one.changes() == []  # Its own writes
+    seen = two.changes()
+    assert sorted((kind, record_id) for kind, record_id, _ in seen) == [("chat", "a"), ("chat", "b"), ("folder", "f")]
+    assert two.changes() == []  # Only what is new since the last call
+
+    del chats["a"]
+    one.mark_removed("a")
+    one.flush(chats, {})
+    assert sorted(two.changes()) == [("chat", "a", None), ("folder", "f", None)]  # Tombstones
+
+    loaded, folders = SQLiteStateBackend(path, import_json=None).load()
+    assert list(loaded) == ["b"] and folders == {}
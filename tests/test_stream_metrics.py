@@ -0,0 +1,48 @@
+"""Per-stream upstream metrics, recorded from the raw SSE lines by StreamingMetricsMiddleware."""
+
+import asyncio
+
+from LLMConnect.metrics import MetricsRegistry
+from LLMConnect.middlewares import StreamingMetricsMiddleware
+from LLMConnect.models import HTTPRequest
+
+
+def delta(content: str) -> bytes:
+    return b'data: {"choices": [{"delta": {"content": "%s"}}]}' % content.encode()
+
+
+async def stream(middleware: StreamingMetricsMiddleware, lines, error=None) -> HTTPRequest:
+    request = HTTPRequest("POST", "http://llm.example/v1/chat/completions", body=b'{"model": "m1", "stream": true}')
+    await middleware.process_request(request)
+    for line in lines:
+        await middleware.process_chunk(request, line)
+    await middleware.process_stream_end(request, 0.5, error)
+    return request
+
+
+def test_tokens_ttft_and_finish_reason_are_recorded_per_host_and_model():
+    metrics = StreamingMetricsMiddleware(MetricsRegistry())
+    asyncio.run(stream(metrics, [
+        b'data: {"choices": [{"delta": {"role": "assistant", "content": ""}}]}',
+        delta("Hel"), delta("lo"), delta("!"),
+        b'data: {"choices": [{"delta": {}, "finish_reason": "stop"}]}',
+        b'data: [DONE]',
+    ]))
+
+    labels = ("llm.example", "m1")
+    assert metrics.tokens_total.labels(*labels).value == 3  # The empty role delta is no token
+    assert metrics.ttft_seconds.labels(*labels).count == 1
+    assert metrics.inter_token_seconds.labels(*labels).count == 2
+    assert metrics.streams_total.labels(*labels, "stop").value == 1
+
+
+def test_reported_usage_wins_over_counted_events():
+    metrics = StreamingMetricsMiddleware(MetricsRegistry())
+    asyncio.run(stream(metrics, [delta("a b c"), b'data: {"usage": {"completion_tokens": 7}}']))
+    assert metrics.tokens_total.labels("llm.example", "m1").value == 7
+
+
+def test_cancelled_stream_is_counted_as_such():
+    metrics = StreamingMetricsMiddleware(MetricsRegistry())
+    asyncio.run(stream(metrics, [delta("a")], asyncio.CancelledError()))
+    assert metrics.streams_total.labels("llm.example", "m1", "cancelled").value == 1
@@ -0,0 +1,71 @@
+"""SyncHTTPClient: one background loop for every call, pooled connections, streams as they arrive."""
+
+import json
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from LLMConnect import base
+from LLMConnect.base import SyncHTTPClient
+from LLMConnect.mock_server import MockConfig, MockServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = MockServer(port=0, config=MockConfig(ttft=0.0, tps=20, tokens=10)).start()
+    yield server
+    server.shutdown()
+
+
+def completion(server, client: SyncHTTPClient, stream: bool = False):
+    body = json.dumps({"model": "mock-model", "stream": stream, "messages": [{"role": "user", "content": "hi"}]})
+    call = client.stream_request if stream else client.request
+    return call("POST", server.base_url + "/chat/completions", {"Content-Type": "application/json"}, body.encode())
+
+
+def sync_loop_threads() -> list:
+    return [t for t in threading.enumerate() if t.name == "llmconnect-sync-loop"]
+
+
+def test_calls_share_one_loop_and_one_connection(server):
+    with SyncHTTPClient() as client, SyncHTTPClient() as other:
+        first = client.request("GET", server.base_url + "/models")
+        loop = base._sync_loop_instance
+        pooled = client._executor.connection_pool._connections
+        [connection] = [c for connections in pooled.values() for c in connections]
+        sock = connection.sock
+        second = other.request("GET", server.base_url + "/models")
+        third = client.request("GET", server.base_url + "/models")
+        assert first.status_code == second.status_code == third.status_code == 200
+        assert base._sync_loop_instance is loop and len(sync_loop_threads()) == 1
+        assert [c.sock for connections in pooled.values() for c in connections] == [sock]  # Kept alive, reused
+
+
+def test_stream_chunks_arrive_before_the_stream_ends(server):
+    with SyncHTTPClient() as client:
+        started = time.monotonic()
+        arrivals = [time.monotonic() - started for _ in completion(server, client, stream=True)]
+    assert len(arrivals) > 1
+    assert arrivals[0] < arrivals[-1] - 0.2  # 10 tokens at 20/s: the first one isn't held back
+
+
+def test_a_forked_child_starts_its_own_loop(server):
+    with SyncHTTPClient() as client:
+        client.request("GET", server.base_url + "/models")
+    assert base._sync_loop_instance is not None
+
+    pid = os.fork()
+    if pid == 0:  # The parent's loop and I/O threads don't exist here: using them would hang
+        code = 1
+        signal.alarm(10)
+        try:
+            if base._sync_loop_instance is None:
+                with SyncHTTPClient() as client:
+                    code = 0 if client.request("GET", server.base_url + "/models", timeout=5).status_code == 200 else 2
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0